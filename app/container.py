@@ -2,20 +2,37 @@
 from pathlib import Path
 
 from ..domain.services import MapService, StateService
+from ..domain.clock import SystemClock
 from ..infra.sqlite_repo import SQLiteStateRepository
 from ..infra.map_json_provider import JsonMapProvider
 from ..app_pipeline.pipeline import Pipeline
 from ..app_pipeline.stages import NormalizeStage, AuditStage
 from ..infra.hooks import HookBus
-from ..infra.assets import load_assets
+from ..infra.assets import AssetStore
 from ..infra.html_renderer import build_map_html
+from ..infra.map_rasterizer import pillow_available
+from ..infra.card_renderer import CardRenderer
+from ..infra.render_cache import RenderCache
+from ..infra.progress_accumulator import ProgressAccumulator
+from ..infra.render_farm import MapSource, RenderFarm
+from ..infra.image_output import OutputPolicy
 from ..infra.sqlite_player_repo import SQLitePlayerRepository
-from ..infra.character_provider import CharacterProvider
+from ..infra.character_catalog import CharacterCatalog
+from ..infra.notifier import CapacityNotifier
+from ..infra.map_render_cache import MapRenderCache
+from ..infra.memprof import MemoryProfiler
+from ..infra.metrics import Metrics
+from ..infra.sql_trace import SqlTracer
 from ..domain.services_gacha import GachaService
 from ..domain import services_resources as _res_mod
 from ..domain.services_team import TeamService  # 新增
 from ..domain.services_alliance import AllianceService
-from ..domain.services_battle import BattleService  # 新增
+from ..domain.services_planner import UpgradePlanner
+from ..domain.services_battle import (  # 新增
+    BattleService,
+    FEATURE_KEY,
+    skill_keyword_counts,
+)
 from ..domain.services_base import BaseService  # 新增
 from ..domain.services_alliance_siege import AllianceSiegeService  # 新增
 
@@ -48,12 +65,36 @@ class Container:
         self.assets = assets
         self.res_service = res_service
         self.chars = chars
+        self.gacha_service = chars  # main 里按这个名字取
         self.team_service = team_service
         self.alliance_service = alliance_service
         self.battle_service = battle_service  # 新增
         self.base_service = base_service
         self.siege_service = siege_service  # 新增
         self.build_map_html = None
+        self.reload_map = None
+        self.render_map_png = None  # 本地光栅化（配置 map_renderer=pillow 且装了 Pillow 时才有）
+        self.card_renderer = None
+        self.render_farm = None
+        self.output_policy = OutputPolicy()
+        self.notifier = None
+        self.catalog = None
+        self.clock = SystemClock()
+        self.planner = UpgradePlanner()
+        self.map_cache = MapRenderCache()
+        self.metrics = Metrics()  # 默认关闭
+        self.sql_tracer = None  # 配置了 sql_slow_ms 才有
+        self.memprof = MemoryProfiler()  # 默认关闭
+        self.map_epoch = 0  # 地图/素材重载时 +1
+
+    def map_version(self):
+        """地图渲染缓存版本：战线进度版本 + 地图/素材版本"""
+        self.assets.refresh()  # 只 stat，不读图；图片换了会让 version 变化
+        return (
+            self.state_service.progress_version(),
+            self.map_epoch,
+            self.assets.version,
+        )
 
 
 def _data_root(context) -> Path:
@@ -97,35 +138,55 @@ def _resolve_picture_dir() -> Path:
     return Path(__file__).resolve().parents[1] / "picture"
 
 
-def build_container(context, config=None, llm_provider_id: str = None) -> Container:
+def _resolve_font() -> Path:
+    return Path(__file__).resolve().parents[1] / "fonts" / "LXGWWenKaiMono-Regular.ttf"
+
+
+def build_container(
+    context, config=None, llm_provider_id: str = None, clock=None
+) -> Container:
+    """clock：可注入 domain.clock.SimulatedClock 快进时间（压测/模拟）；默认真实时钟"""
     data_root = _data_root(context)
+    clock = clock or SystemClock()
+    # 内存剖析要在建容器之前开，常驻数据（目录、素材、缓存）才算得进去
+    memprof = MemoryProfiler((config or {}).get("memprof_enabled", False))
 
     # 固定落在 data/plugin_data/astrbot_plugin_slg
-    player_repo = SQLitePlayerRepository(db_path=data_root / "players.sqlite3")
-    res_service = ResourceService(player_repo)
+    player_repo = SQLitePlayerRepository(db_path=data_root / "players.sqlite3", clock=clock)
+    res_service = ResourceService(player_repo, clock)
     team_service = TeamService(player_repo)
-    ally_service = AllianceService(player_repo)  # ← 新增
+    ally_service = AllianceService(player_repo, clock)  # ← 新增
 
     state_repo = SQLiteStateRepository(db_path=data_root / "state.sqlite3")
     map_provider = JsonMapProvider(_resolve_map_json())
     map_service = MapService(map_provider)
-    state_service = StateService(state_repo)
+    state_service = StateService(state_repo, ProgressAccumulator(state_repo))
 
     pipeline = Pipeline(stages=[NormalizeStage(), AuditStage()])
     hookbus = HookBus()
 
-    picture_dir = _resolve_picture_dir()
-    assets = load_assets(picture_dir, map_service.list_cities())
+    # 素材懒加载：第一次渲染地图才读图；asset_cache 存缩放后的素材，按内容哈希命名，重启复用
+    assets = AssetStore(
+        _resolve_picture_dir(), map_service.list_cities, data_root / "asset_cache"
+    )
+    if (config or {}).get("assets_warmup", False):
+        assets.warm_up()
 
     # 角色池
-    pool = CharacterProvider(_resolve_char_json()).load_all()
-    chars = GachaService(player_repo, res_service, pool)
+    # 角色目录：抽卡/战斗共用一份，解析结果与技能特征缓存到 character_catalog.pkl
+    catalog = CharacterCatalog(
+        _resolve_char_json(),
+        data_root / "character_catalog.pkl",
+        derive=skill_keyword_counts,
+        derive_key=FEATURE_KEY,
+    )
+    chars = GachaService(player_repo, res_service, catalog, clock=clock)
 
     battle_service = BattleService(
-        player_repo, pool, context, llm_provider_id
+        player_repo, catalog, context, llm_provider_id
     )  # ← 新增，并传递 llm_provider_id
-    base_service = BaseService(player_repo, map_service)  # ← 新增
-    siege_service = AllianceSiegeService(player_repo, map_service)  # ← 新增
+    base_service = BaseService(player_repo, map_service, clock)  # ← 新增
+    siege_service = AllianceSiegeService(player_repo, map_service, clock)  # ← 新增
 
     c = Container(
         map_service,
@@ -141,8 +202,97 @@ def build_container(context, config=None, llm_provider_id: str = None) -> Contai
         base_service,
         siege_service,
     )
-    c.build_map_html = lambda: build_map_html(
-        map_service.graph(), state_service.get_line_progress, assets
+    c.catalog = catalog
+    c.clock = clock
+    c.memprof = memprof
+    # 计时统计（metrics_enabled）：给服务方法、SQL 连接、LLM 调用挂计时；关闭时什么都不挂
+    c.metrics = Metrics((config or {}).get("metrics_enabled", False))
+    for repo in (player_repo, state_repo):
+        c.metrics.instrument_repo(repo)
+    for name, svc in (
+        ("res", res_service),
+        ("team", team_service),
+        ("alliance", ally_service),
+        ("gacha", chars),
+        ("battle", battle_service),
+        ("base", base_service),
+        ("siege", siege_service),
+        ("state", state_service),
+        ("planner", c.planner),
+    ):
+        c.metrics.instrument(svc, "service", name)
+    c.metrics.instrument(battle_service._llm, "llm", "llm", methods=("chat_json",))
+    # SQL 追踪（sql_slow_ms > 0）：按命令统计语句条数，慢查询连同 EXPLAIN QUERY PLAN 打日志
+    slow_ms = float((config or {}).get("sql_slow_ms", 0) or 0)
+    if slow_ms > 0:
+        c.sql_tracer = SqlTracer(slow_ms=slow_ms)
+        for repo in (player_repo, state_repo):
+            c.sql_tracer.attach(repo)
+    c.notifier = CapacityNotifier(player_repo, res_service, clock)
+    # 卡片渲染结果按内容哈希落盘，容量有上限（LRU 淘汰），同样的卡片不重画
+    cache_mb = int((config or {}).get("render_cache_mb", 64) or 0)
+    card_cache = (
+        RenderCache(
+            data_root / "render_cache", max_bytes=cache_mb * 1024 * 1024, ext=".img"
+        )
+        if cache_mb > 0
+        else None
+    )
+    c.card_renderer = CardRenderer(_resolve_picture_dir(), _resolve_font(), card_cache)
+    # 输出格式/尺寸：全局配置 + 按平台覆盖
+    cfg = config or {}
+    c.output_policy = OutputPolicy(
+        fmt=cfg.get("image_format", "png"),
+        quality=int(cfg.get("image_quality", 85)),
+        card_width=int(cfg.get("card_width", 0) or 0),
+        map_width=int(cfg.get("map_width", 0) or 0),
+        overrides=cfg.get("image_platform_overrides") or (),
+    )
+    # 图片渲染走独立进程池，排队满了由调用方退回文字；render_workers=0 则用进程内线程
+    # 地图单独一条通道，渲染进程自己读地图和素材（asset_cache 与主进程共用）
+    c.render_farm = RenderFarm(
+        c.card_renderer,
+        map_font_path=(config or {}).get("map_font_path") or _resolve_font(),
+        workers=int((config or {}).get("render_workers", 2)),
+        max_pending=int((config or {}).get("render_queue", 8)),
+        memprof=memprof.enabled,
+        map_source=MapSource(map_provider, _resolve_picture_dir(), data_root / "asset_cache"),
+        map_workers=int((config or {}).get("render_map_workers", 1)),
+        map_max_pending=int((config or {}).get("render_map_queue", 4)),
     )
+
+    def _build_map_html():
+        # 整张图的进度一次取完，渲染期间不再逐条查库
+        prog = state_service.all_line_progress()
+        return build_map_html(
+            map_service.graph(),
+            lambda city, gate: prog.get((city, gate), (0, 0)),
+            c.assets.get(),
+        )
+
+    def _reload_map():
+        map_service.reload()
+        c.assets.invalidate()
+        c.map_epoch += 1
+        c.map_cache.invalidate()
+
+    c.build_map_html = _build_map_html
+    c.reload_map = _reload_map
+
+    # 地图光栅化后端：html（远程 html_render，默认）| pillow（本地绘制）
+    if (config or {}).get("map_renderer", "html") == "pillow":
+        if pillow_available():
+
+            async def _render_map_png(spec=None) -> bytes:
+                # 素材由渲染进程按 (epoch, 素材版本) 自己加载，这里只 stat 维护版本
+                prog = state_service.all_line_progress()
+                c.assets.refresh()
+                return await c.render_farm.map_image(
+                    (c.map_epoch, c.assets.version), prog, spec
+                )
+
+            c.render_map_png = _render_map_png
+        else:
+            print("[SLG] map_renderer=pillow 但未安装 Pillow，地图回退到 html_render")
     print(f"[SLG] data_root = {data_root}")
     return c
@@ -0,0 +1,40 @@
+# domain/clock.py
+from __future__ import annotations
+import time
+from typing import Callable, List, Optional
+
+
+class SystemClock:
+    """真实时钟（默认）"""
+
+    def now(self) -> int:
+        return int(time.time())
+
+
+class SimulatedClock:
+    """
+    可控时钟：只有 advance()/set() 才会走，用于压测和快进模拟（几周的结算、攻城窗口、每日迁城限制）。
+    on_change 注册的回调在时间变化后同步调用（如满仓提醒据此立刻重算到期项）；
+    回调在调用 advance 的线程里执行，和事件循环不在同一线程时由回调自己负责切线程。
+    """
+
+    def __init__(self, start: Optional[int] = None):
+        self._t = int(time.time() if start is None else start)
+        self._listeners: List[Callable[[int], None]] = []
+
+    def now(self) -> int:
+        return self._t
+
+    def set(self, ts: int) -> int:
+        if ts < self._t:
+            raise ValueError(f"时钟不能倒退：{ts} < {self._t}")
+        self._t = int(ts)
+        for fn in list(self._listeners):
+            fn(self._t)
+        return self._t
+
+    def advance(self, seconds: int = 0, minutes: int = 0, hours: int = 0, days: int = 0) -> int:
+        return self.set(self._t + seconds + minutes * 60 + hours * 3600 + days * 86400)
+
+    def on_change(self, fn: Callable[[int], None]):
+        self._listeners.append(fn)
@@ -20,6 +20,12 @@ RESOURCE_CN = {"grain": "粮食", "gold": "金钱", "stone": "石头", "troops":
 MAX_LEVEL = 10
 MINUTE = 60
 
+# 抽卡稀有度：按档位定出率（档内均匀），顺序即从高到低；character.json 未写 rarity 的按最低档
+RARITY_WEIGHTS = {"SSR": 5, "SR": 25, "R": 70}
+DEFAULT_RARITY = "R"
+# 保底：连续这么多抽没出最高档，下一抽必出（最高档还有剩余时）
+PITY_THRESHOLD = 20
+
 
 # 抽卡结果状态
 class DrawResultStatus(Enum):
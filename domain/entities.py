@@ -35,6 +35,7 @@ class Character:
     title: str
     background: str
     skills: List[Skill]
+    rarity: str = "R"
 
 
 # —— 玩家 —— #
@@ -53,3 +54,4 @@ class Player:
     quarry_level: int
     barracks_level: int
     draw_count: int = 0  # ← 新增：累计抽卡次数
+    pity: int = 0  # 距上次出最高稀有度的抽数
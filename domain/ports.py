@@ -1,8 +1,13 @@
 # domain/ports.py
-from typing import Protocol, Optional, Set
+from typing import Dict, Iterable, Protocol, Optional, Set, Tuple
 from .entities import MapGraph, Player
 
 
+class ClockPort(Protocol):
+    # 当前 epoch 秒；服务与仓库都经它取时间，压测时换成 domain.clock.SimulatedClock 快进
+    def now(self) -> int: ...
+
+
 class MapProviderPort(Protocol):
     def load(self) -> MapGraph: ...
 
@@ -11,9 +16,30 @@ class StateRepositoryPort(Protocol):
     def init_schema(self) -> None: ...
     def get(self, key: str) -> Optional[str]: ...
     def set(self, key: str, val: str) -> None: ...
+    # 战线进度：(milestone, progress)
+    def get_line(self, city: str, gate: str) -> Optional[Tuple[int, int]]: ...
+    def all_lines(self) -> Dict[Tuple[str, str], Tuple[int, int]]: ...
+    def set_line(
+        self, city: str, gate: str, milestone: int, progress: int
+    ) -> None: ...
+    def set_lines(self, rows: Iterable[Tuple[str, str, int, int]]) -> None: ...
     def close(self) -> None: ...
 
 
+# 战线 (city, gate)
+LineKey = Tuple[str, str]
+
+
+class LineProgressPort(Protocol):
+    # 战线推进的读写缓冲：推进先落在内存里，由实现决定何时批量写回 StateRepositoryPort
+    version: int  # 任何进度变化都 +1（含未落库的）
+    def get(self, key: LineKey) -> Optional[Tuple[int, int]]: ...
+    def pending(self) -> Dict[LineKey, Tuple[int, int]]: ...
+    def set(self, key: LineKey, milestone: int, progress: int) -> None: ...
+    def push(self, key: LineKey, delta: int) -> Tuple[int, int]: ...
+    def flush(self) -> None: ...
+
+
 class PlayerRepositoryPort(Protocol):
     def init_schema(self) -> None: ...
     def get_player(self, user_id: str) -> Optional[Player]: ...
@@ -22,11 +48,21 @@ class PlayerRepositoryPort(Protocol):
     def list_owned_char_names(self, user_id: str) -> Set[str]: ...
     def has_char(self, user_id: str, name: str) -> bool: ...
     def add_char(self, user_id: str, name: str, level: int = 1) -> None: ...
+    def apply_draws(
+        self, p: Player, names: Iterable[str], owned_bits: Optional[int] = None
+    ) -> None: ...
+    def ensure_char_index(self, names: Iterable[str]) -> Dict[str, int]: ...
+    def get_owned_bits(self, user_id: str) -> int: ...
     def get_char_level(self, user_id: str, name: str): ...
     def set_char_level(self, user_id: str, name: str, level: int): ...
     # 队伍相关
     def ensure_teams(self, user_id: str, team_count: int, slots: int): ...
     def list_team_slots(self, user_id: str, team_no: int): ...
+    def list_team_members(self, user_id: str, team_no: int | None = None): ...
+    def team_level_sums(
+        self, user_ids: Iterable[str], team_no: int = 1
+    ) -> Dict[str, int]: ...
+    def list_team_soldiers(self, user_id: str) -> Dict[int, int]: ...
     def set_team_slot(
         self, user_id: str, team_no: int, slot_idx: int, char_name: str | None
     ): ...
@@ -46,3 +82,8 @@ class PlayerRepositoryPort(Protocol):
     def count_alliance_members(self, alliance_id: int) -> int: ...
     def list_alliances(self): ...
     def list_alliance_members(self, alliance_id: int): ...
+    # —— 满仓提醒 —
+    def set_notify_sub(
+        self, user_id: str, session: Optional[str], enabled: bool
+    ): ...
+    def list_notify_subs(self): ...
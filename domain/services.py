@@ -1,13 +1,17 @@
 # domain/services.py
 from typing import Dict, List, Tuple, Optional
-from .ports import MapProviderPort, StateRepositoryPort
+from .ports import LineProgressPort, MapProviderPort, StateRepositoryPort
 from .entities import City, MapGraph, Gate, MILESTONES
 
 
 class MapService:
     def __init__(self, provider: MapProviderPort):
+        self._provider = provider
         self._graph: MapGraph = provider.load()
 
+    def reload(self):
+        self._graph = self._provider.load()
+
     # -- 基础 --
     def list_provinces(self) -> List[str]:
         ps = sorted({c.province for c in self._graph.cities.values()})
@@ -38,9 +42,11 @@ class MapService:
 
 
 class StateService:
-    def __init__(self, repo: StateRepositoryPort):
+    def __init__(self, repo: StateRepositoryPort, progress: LineProgressPort):
+        """progress：战线推进的合并写（infra.progress_accumulator.ProgressAccumulator）"""
         self._repo = repo
         self._repo.init_schema()
+        self._acc = progress
 
     # KV 通用
     def get(self, key: str):
@@ -50,34 +56,43 @@ class StateService:
         self._repo.set(key, val)
 
     # 战线进度：里程碑索引(0..2)与当前百分比(0..100)
-    def get_line_progress(self, city: str, gate: Gate) -> Tuple[int, int]:
-        idx = self._repo.get(f"line:{city}:{gate}:milestone")
-        prog = self._repo.get(f"line:{city}:{gate}:progress")
+    @staticmethod
+    def _clamp(mi, pr) -> Tuple[int, int]:
         try:
-            mi = int(idx) if idx is not None else 0
+            mi = int(mi)
         except Exception:
             mi = 0
         try:
-            pr = int(prog) if prog is not None else 0
+            pr = int(pr)
         except Exception:
             pr = 0
         mi = max(0, min(mi, len(MILESTONES) - 1))
         pr = max(0, min(pr, 100))
         return mi, pr
 
+    def get_line_progress(self, city: str, gate: Gate) -> Tuple[int, int]:
+        row = self._acc.get((city, gate)) or self._repo.get_line(city, gate)
+        return self._clamp(*row) if row else (0, 0)
+
+    def all_line_progress(self) -> Dict[Tuple[str, str], Tuple[int, int]]:
+        """所有战线进度，一次查询；渲染整张地图时用它代替逐条 get_line_progress"""
+        rows = self._repo.all_lines()
+        rows.update(self._acc.pending())  # 内存里尚未落库的更新优先
+        return {k: self._clamp(*v) for k, v in rows.items()}
+
     def set_line_progress(
         self, city: str, gate: Gate, milestone_idx: int, progress: int
     ):
-        milestone_idx = max(0, min(milestone_idx, len(MILESTONES) - 1))
-        progress = max(0, min(progress, 100))
-        self._repo.set(f"line:{city}:{gate}:milestone", str(milestone_idx))
-        self._repo.set(f"line:{city}:{gate}:progress", str(progress))
-
-    def push_progress(self, city: str, gate: Gate, delta: int = 0):
-        mi, pr = self.get_line_progress(city, gate)
-        pr += delta
-        while pr >= 100 and mi < len(MILESTONES) - 1:
-            pr -= 100
-            mi += 1
-        pr = min(pr, 100)
-        self.set_line_progress(city, gate, mi, pr)
+        milestone_idx, progress = self._clamp(milestone_idx, progress)
+        self._acc.set((city, gate), milestone_idx, progress)
+
+    def push_progress(self, city: str, gate: Gate, delta: int = 0) -> Tuple[int, int]:
+        """原子推进并返回推进后的 (里程碑, 进度)；落库由累加器合并完成"""
+        return self._acc.push((city, gate), delta)
+
+    def progress_version(self) -> int:
+        """任一战线进度变化即递增；用作地图渲染缓存的版本号"""
+        return self._acc.version
+
+    def flush(self):
+        self._acc.flush()
@@ -1,15 +1,16 @@
-import time
-from typing import Tuple, List, Dict
-from .ports import PlayerRepositoryPort
+from typing import Tuple, List, Dict, Optional
+from .clock import SystemClock
+from .ports import ClockPort, PlayerRepositoryPort
 from .constants import ALLIANCE_MAX_MEMBERS
 
 
 class AllianceService:
-    def __init__(self, repo: PlayerRepositoryPort):
+    def __init__(self, repo: PlayerRepositoryPort, clock: Optional[ClockPort] = None):
         self._repo = repo
+        self._clock = clock or SystemClock()
 
     def _now(self) -> int:
-        return int(time.time())
+        return self._clock.now()
 
     # 创建同盟：创建者自动成为领袖并加入
     def create(self, user_id: str, name: str) -> Tuple[bool, str]:
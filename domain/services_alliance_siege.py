@@ -2,9 +2,10 @@
 from __future__ import annotations
 import time
 import collections
-from typing import List, Tuple
+from typing import List, Optional, Tuple
+from .clock import SystemClock
 from .constants import SIEGE_WINDOW_MINUTES, SIEGE_EDGE_MINUTES, SIEGE_CITY_REQUIRE
-from .ports import PlayerRepositoryPort
+from .ports import ClockPort, PlayerRepositoryPort
 
 
 class AllianceSiegeService:
@@ -13,11 +14,13 @@ class AllianceSiegeService:
       - repo: PlayerRepositoryPort + 上面新加的攻城方法
       - map_service: 需要 graph()，且图有城市与邻接；优先使用 g.neighbors(name)。
       - 读队伍：repo.list_team_slots(uid, team_no) + repo.get_char_level(uid, name)
+      - clock：可选，默认真实时钟；集结 ETA、开战/结算窗口都按它算
     """
 
-    def __init__(self, repo: PlayerRepositoryPort, map_service):
+    def __init__(self, repo: PlayerRepositoryPort, map_service, clock: Optional[ClockPort] = None):
         self._repo = repo
         self._map = map_service
+        self._clock = clock or SystemClock()
 
     # -------- 图相关 --------
     def _neighbors(self, city: str) -> List[str]:
@@ -87,14 +90,7 @@ class AllianceSiegeService:
 
     # -------- 参战产出 --------
     def _team1_level_sum(self, uid: str) -> int:
-        slots = self._repo.list_team_slots(uid, 1)
-        s = 0
-        for _, name in slots:
-            if not name:
-                continue
-            lv = self._repo.get_char_level(uid, name) or 1
-            s += lv
-        return s
+        return self._repo.team_level_sums([uid], 1).get(uid, 0)
 
     # -------- 发起/集结/状态 --------
     def schedule_siege(
@@ -139,7 +135,7 @@ class AllianceSiegeService:
             return False, f"从 {src} 到 {dst} 没有连通路径"
 
         hops = max(0, len(path) - 1)
-        eta = int(time.time()) + hops * SIEGE_EDGE_MINUTES * 60
+        eta = self._clock.now() + hops * SIEGE_EDGE_MINUTES * 60
         self._repo.add_siege_participant(act["id"], uid, src, path, hops, eta)
         return (
             True,
@@ -153,7 +149,7 @@ class AllianceSiegeService:
         act = self._repo.get_active_siege_by_alliance(a["id"])
         if not act:
             return False, "当前没有攻城活动"
-        now = int(time.time())
+        now = self._clock.now()
         start_at = int(act["start_at"])
         end_at = start_at + SIEGE_WINDOW_MINUTES * 60
 
@@ -175,6 +171,8 @@ class AllianceSiegeService:
 
         # 进行中或已到期：累计贡献
         parts = self._repo.list_siege_participants(act["id"])
+        # 各参战者队伍1等级和一次查完
+        lv_sums = self._repo.team_level_sums([p["user_id"] for p in parts], 1)
         total_pts = 0
         det_lines = []
         for p in parts:
@@ -187,7 +185,7 @@ class AllianceSiegeService:
                 t_end = min(now, end_at)
                 contrib_min = max(0, int((t_end - arrive) // 60))
             # 产出/分钟 = 队伍1等级和
-            lv_sum = self._team1_level_sum(p["user_id"])
+            lv_sum = lv_sums.get(p["user_id"], 0)
             pts = lv_sum * contrib_min
             total_pts += pts
             det_lines.append(
@@ -2,7 +2,10 @@
 from __future__ import annotations
 import random
 import time
-from typing import Tuple
+from typing import Optional, Tuple
+
+from .clock import SystemClock
+from .ports import ClockPort
 
 ALLOWED_PROVINCES = {"益", "扬", "冀", "兖"}
 
@@ -13,11 +16,13 @@ class BaseService:
       - repo：需要 get_base/set_base/get_last_move_at/set_last_move_at
       - map_service：需要 graph()，且 graph().cities 是 {name: City}，
                      City 需有 name, province, x, y 属性（与你地图里用的 City 定义一致）
+      - clock：可选，默认真实时钟；“每天一次迁城”按它判断
     """
 
-    def __init__(self, repo, map_service):
+    def __init__(self, repo, map_service, clock: Optional[ClockPort] = None):
         self._repo = repo
         self._map = map_service
+        self._clock = clock or SystemClock()
 
     def _candidate_cities(self):
         g = self._map.graph()
@@ -46,8 +51,6 @@ class BaseService:
 
     @staticmethod
     def _same_local_day(ts1: int, ts2: int) -> bool:
-        import time
-
         d1 = time.localtime(ts1)
         d2 = time.localtime(ts2)
         return (d1.tm_year, d1.tm_yday) == (d2.tm_year, d2.tm_yday)
@@ -55,7 +58,7 @@ class BaseService:
     def migrate(self, user_id: str, target_city_name: str) -> Tuple[bool, str]:
         # 限制：每天一次
         last = self._repo.get_last_move_at(user_id)
-        now = int(time.time())
+        now = self._clock.now()
         if last and self._same_local_day(last, now):
             return False, "今天已经迁过城了，明天再来"
 
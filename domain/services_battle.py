@@ -1,7 +1,8 @@
 # domain/services_battle.py
 from __future__ import annotations
 import json
-from typing import Dict, Any, List
+import hashlib
+from typing import Dict, Any, List, Optional, Sequence, Tuple
 from ..infra.astr_llm import AstrLLM
 from ..domain.entities import Character  # 新增
 
@@ -114,6 +115,8 @@ TIE_USER_TMPL = '五个微场景裁决，只输出 JSON：{{"votes":[("A"|"B"|"
 def _text(s: Any) -> str:
     if isinstance(s, str):
         return s
+    if hasattr(s, "name") and hasattr(s, "description"):  # entities.Skill
+        return f"{s.name} {s.description}"
     if isinstance(s, dict):
         buf = []
         for k in (
@@ -137,19 +140,33 @@ def _text(s: Any) -> str:
 
 
 
-def _extract_features(members: List[Character]) -> Dict[str, float]:
+# 关键词表的指纹：角色目录缓存里存了按它算好的计数，表一改缓存即失效
+FEATURE_KEY = hashlib.sha1(
+    json.dumps(KW, ensure_ascii=False, sort_keys=True).encode("utf-8")
+).hexdigest()[:12]
+
+
+def skill_keyword_counts(role: Character) -> Tuple[int, ...]:
+    """单个角色的 (有效技能数, 各类关键词命中数...)，顺序同 KW；可预先算好缓存"""
     counts = dict.fromkeys(KW, 0)
     total = 0
-    for role in members:
-        skills = role.skills or []
-        for s in skills:
-            t = _text(s).lower()
-            if not t:
-                continue
-            total += 1
-            for key, lst in KW.items():
-                counts[key] += sum(1 for kw in lst if kw.lower() in t)
-    total = max(1, total)
+    for s in role.skills or []:
+        t = _text(s).lower()
+        if not t:
+            continue
+        total += 1
+        for key, lst in KW.items():
+            counts[key] += sum(1 for kw in lst if kw.lower() in t)
+    return (total, *counts.values())
+
+
+def _extract_features(
+    members: List[Character], precomputed: Optional[Sequence[Tuple[int, ...]]] = None
+) -> Dict[str, float]:
+    vecs = precomputed if precomputed is not None else [skill_keyword_counts(m) for m in members]
+    sums = [sum(col) for col in zip(*vecs)] if vecs else [0] * (len(KW) + 1)
+    total = max(1, sums[0])
+    counts = dict(zip(KW, sums[1:]))
 
     def norm(v):
         return round(min(1.0, v / max(3, total)), 3)
@@ -226,15 +243,18 @@ class BattleService:
     不使用环境，简单、可控、够测。
     """
 
-    def __init__(
-        self, repo, chars_pool: List[Character], context, llm_provider_id: str = None
-    ):
+    def __init__(self, repo, catalog, context, llm_provider_id: str = None):
         self._repo = repo
-        self._chars = {c.name: c for c in chars_pool if hasattr(c, "name")}
+        self._catalog = catalog  # infra.character_catalog.CharacterCatalog
         self._llm = AstrLLM(context, llm_provider_id)
 
     def _members(self, names: List[str]) -> List[Character]:
-        return [self._chars[n] for n in names if n in self._chars]
+        return [c for c in (self._catalog.get(n) for n in names) if c is not None]
+
+    def _features(self, names: List[str]) -> Dict[str, float]:
+        # 目录里已按 skill_keyword_counts 预算好每个角色的计数，这里只求和
+        vecs = [v for v in (self._catalog.features(n) for n in names) if v is not None]
+        return _extract_features(self._members(names), vecs)
 
     async def simulate(self, attacker_uid: str, defender_uid: str) -> Dict[str, Any]:
         # 读双方队伍1与“当前兵力”（不是上限）
@@ -253,8 +273,9 @@ class BattleService:
                 {"side": "B", "members": B, "soldiers": soldiersB},
             ]
         }
-        featA = _extract_features(self._members(A))
-        featB = _extract_features(self._members(B))
+        self._catalog.refresh()
+        featA = self._features(A)
+        featB = self._features(B)
 
         assess_user = ASSESS_USER_TMPL.format(
             teams=json.dumps(teams, ensure_ascii=False),
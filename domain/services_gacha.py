@@ -1,10 +1,11 @@
 # domain/services_gacha.py
-import time
 import random
-from typing import Dict, List, Tuple
-from .ports import PlayerRepositoryPort
+from collections import OrderedDict
+from typing import Callable, Dict, List, Optional, Sequence, Tuple
+from .clock import SystemClock
+from .ports import ClockPort, PlayerRepositoryPort
 from .entities import Player, Character
-from .constants import DrawResultStatus
+from .constants import DrawResultStatus, PITY_THRESHOLD, RARITY_WEIGHTS
 from .services_resources import ResourceService
 
 
@@ -28,24 +29,237 @@ def cost_for_draw_index(n: int) -> Dict[str, int]:
     }
 
 
+_RES = ("gold", "grain", "stone", "troops")
+# 第 15 抽之后费用恒定；前缀和只需要存到这里，之后按常数线性外推
+_FLAT_FROM = 15
+_PREFIX: List[Dict[str, int]] = [dict.fromkeys(_RES, 0)]
+for _n in range(1, _FLAT_FROM + 1):
+    _c = cost_for_draw_index(_n)
+    _PREFIX.append({k: _PREFIX[-1][k] + _c[k] for k in _RES})
+_FLAT = cost_for_draw_index(_FLAT_FROM)
+
+
+def cumulative_cost(n: int) -> Dict[str, int]:
+    """第 1..n 抽的累计费用"""
+    if n <= _FLAT_FROM:
+        return dict(_PREFIX[max(0, n)])
+    base = _PREFIX[_FLAT_FROM]
+    return {k: base[k] + (n - _FLAT_FROM) * _FLAT[k] for k in _RES}
+
+
+def range_cost(start: int, k: int) -> Dict[str, int]:
+    """从第 start 抽起连抽 k 次的总费用"""
+    hi, lo = cumulative_cost(start + k - 1), cumulative_cost(start - 1)
+    return {r: hi[r] - lo[r] for r in _RES}
+
+
+def affordable_draws(start: int, balance: Dict[str, int], limit: int) -> int:
+    """余额够连抽几次（不超过 limit）；累计费用单调，二分即可"""
+    lo, hi = 0, max(0, limit)
+    while lo < hi:
+        mid = (lo + hi + 1) // 2
+        c = range_cost(start, mid)
+        if all(balance[r] >= c[r] for r in _RES):
+            lo = mid
+        else:
+            hi = mid - 1
+    return lo
+
+
+class AliasTable:
+    """Vose 别名表：O(n) 构建，O(1) 按权重采样下标"""
+
+    def __init__(self, weights: Sequence[float], rng: random.Random):
+        self._rng = rng
+        n = len(weights)
+        total = float(sum(weights))
+        self._n = n
+        self._prob = [0.0] * n
+        self._alias = [0] * n
+        scaled = [w * n / total for w in weights]
+        small = [i for i, w in enumerate(scaled) if w < 1.0]
+        large = [i for i, w in enumerate(scaled) if w >= 1.0]
+        while small and large:
+            s, g = small.pop(), large.pop()
+            self._prob[s], self._alias[s] = scaled[s], g
+            scaled[g] -= 1.0 - scaled[s]
+            (small if scaled[g] < 1.0 else large).append(g)
+        for i in small + large:  # 浮点误差剩下的都是满格
+            self._prob[i] = 1.0
+
+    def sample(self) -> int:
+        i = self._rng.randrange(self._n)
+        return i if self._rng.random() < self._prob[i] else self._alias[i]
+
+
+class RarityPool:
+    """
+    某玩家的剩余卡池：按稀有度分桶，先用别名表选档（档位定出率），再在档内均匀取一张。
+    取出/删除都用 swap-remove，O(1)；只有某档被抽空时才重建档位别名表（档位数很少）。
+    items 可以是 Character，也可以是角色目录下标（配合 rarity_of）。
+    """
+
+    def __init__(
+        self,
+        items: Sequence,
+        rng: random.Random,
+        weights: Dict[str, int] = RARITY_WEIGHTS,
+        rarity_of: Callable = lambda c: c.rarity,
+    ):
+        self._rng = rng
+        self._weights = weights
+        self._tiers: Dict[str, List] = {t: [] for t in weights}
+        self._pos: Dict = {}  # 条目 -> (档位, 档内下标)
+        for c in items:
+            lst = self._tiers.setdefault(rarity_of(c), [])
+            self._pos[c] = (rarity_of(c), len(lst))
+            lst.append(c)
+        self._size = len(items)
+        self._rebuild()
+
+    def _rebuild(self):
+        self._live = [t for t, lst in self._tiers.items() if lst]
+        self._alias = (
+            AliasTable([self._weights.get(t, 1) for t in self._live], self._rng)
+            if self._live
+            else None
+        )
+
+    def __len__(self) -> int:
+        return self._size
+
+    def has(self, tier: str) -> bool:
+        return bool(self._tiers.get(tier))
+
+    def _take(self, tier: str, i: int):
+        lst = self._tiers[tier]
+        last = lst.pop()
+        if i < len(lst):
+            ch, lst[i] = lst[i], last
+            self._pos[last] = (tier, i)
+        else:
+            ch = last
+        del self._pos[ch]
+        self._size -= 1
+        if not lst:
+            self._rebuild()
+        return ch
+
+    def pick(self, tier: Optional[str] = None):
+        """返回 (档位, 条目)"""
+        if tier is None or not self.has(tier):
+            tier = self._live[self._alias.sample()]
+        return tier, self._take(tier, self._rng.randrange(len(self._tiers[tier])))
+
+    def remove(self, item) -> bool:
+        """删掉指定条目（玩家从别处得到了这个角色）；不在池里返回 False"""
+        at = self._pos.get(item)
+        if at is None:
+            return False
+        self._take(*at)
+        return True
+
+
+TOP_RARITY = next(iter(RARITY_WEIGHTS))
+_BYTE_BITS = [tuple(b for b in range(8) if v >> b & 1) for v in range(256)]
+
+
 class GachaService:
     cost_for_draw_index = staticmethod(
         cost_for_draw_index
     )  # 类内部挂个同名静态代理方便 main 调用
 
     def __init__(
-        self, repo: PlayerRepositoryPort, res: ResourceService, pool: List[Character]
+        self,
+        repo: PlayerRepositoryPort,
+        res: ResourceService,
+        catalog,
+        rng: Optional[random.Random] = None,
+        clock: Optional[ClockPort] = None,
+        max_pools: int = 1024,
     ):
         self._repo = repo
         self._res = res
-        self._pool = pool
+        self._clock = clock or SystemClock()
+        self._catalog = catalog  # infra.character_catalog.CharacterCatalog，与战斗共用
+        self._rng = rng or random.Random()
+        self._catalog_version = None
+        # 玩家剩余卡池的 LRU：uid -> (构建/更新时的拥有位图, RarityPool)；角色目录换版本时清空
+        self._pools: "OrderedDict[str, Tuple[int, RarityPool]]" = OrderedDict()
+        self._max_pools = max_pools
+        self._sync()
+
+    def _sync(self):
+        """角色目录热重载后重建卡池位图"""
+        self._catalog.refresh()
+        if self._catalog_version == self._catalog.version:
+            return
+        names = self._catalog.names()
+        # 卡池里每个角色一个稳定下标；玩家拥有情况是同下标的位图
+        idx = self._repo.ensure_char_index(names)
+        self._by_idx: Dict[int, int] = {idx[n]: i for i, n in enumerate(names)}  # 位 → 目录下标
+        self._bit_of: List[int] = [idx[n] for n in names]  # 目录下标 → 位
+        mask = 0
+        for i in self._by_idx:
+            mask |= 1 << i
+        self._pool_mask = mask
+        self._pools.clear()
+        self._catalog_version = self._catalog.version
 
     def _now(self) -> int:
-        return int(time.time())
+        return self._clock.now()
+
+    def _indices(self, bits: int) -> List[int]:
+        """位图里各位对应的目录下标"""
+        out = []
+        # 按字节扫：大整数逐位取最低位是 O(n²/64)，逐字节查表是 O(n)
+        for bi, byte in enumerate(bits.to_bytes((bits.bit_length() + 7) // 8, "little")):
+            if byte:
+                base = bi * 8
+                out.extend(self._by_idx[base + b] for b in _BYTE_BITS[byte])
+        return out
+
+    def _remaining(self, owned_bits: int) -> List[int]:
+        """未拥有角色的目录下标"""
+        return self._indices(self._pool_mask & ~owned_bits)
 
-    def _pick_one(self, remains: List[Character]) -> Character:
-        # 均匀随机；以后你要加权我再给你做概率厨艺
-        return random.choice(remains)
+    def _pool_for(self, user_id: str, owned: int) -> RarityPool:
+        """
+        玩家的剩余卡池：缓存命中且拥有位图只多不少时，只把新得到的角色从池里删掉（O(新增数)）；
+        否则（首次、被淘汰、有角色被移除）按位图重建一次。
+        """
+        hit = self._pools.get(user_id)
+        if hit is not None and hit[0] & ~owned == 0:
+            bits, pool = hit
+            if owned != bits:
+                for i in self._indices(self._pool_mask & owned & ~bits):
+                    pool.remove(i)
+            self._pools[user_id] = (owned, pool)
+            self._pools.move_to_end(user_id)
+            return pool
+        rarities = self._catalog.rarities()
+        pool = RarityPool(self._remaining(owned), self._rng, rarity_of=rarities.__getitem__)
+        self._pools[user_id] = (owned, pool)
+        self._pools.move_to_end(user_id)
+        if len(self._pools) > self._max_pools:
+            self._pools.popitem(last=False)
+        return pool
+
+    def collected(self, user_id: str) -> Tuple[int, int]:
+        """(已收集, 卡池总数)"""
+        self._sync()
+        bits = self._repo.get_owned_bits(user_id)
+        return bin(bits & self._pool_mask).count("1"), len(self._by_idx)
+
+    def _pick_many(self, p: Player, pool: RarityPool, n: int) -> List[int]:
+        """按稀有度加权、不放回地抽 n 张（从 pool 里取走）；保底计数随之推进。返回目录下标"""
+        got = []
+        for _ in range(n):
+            forced = TOP_RARITY if p.pity + 1 >= PITY_THRESHOLD else None
+            tier, i = pool.pick(forced)
+            p.pity = 0 if tier == TOP_RARITY else p.pity + 1
+            got.append(i)
+        return got
 
     def draw(
         self, p: Player, count: int
@@ -53,63 +267,55 @@ class GachaService:
         """
         返回：获得的角色列表、实际消耗汇总、成功抽取次数、抽卡结果状态
         会自动结算资源并扣费；不够则提前停。
+        能抽几次由累计费用前缀和一次算出，剩余卡池按玩家缓存、增量维护，结果在一个事务里落库。
         """
         # 全图鉴判断
-        owned = self._repo.list_owned_char_names(p.user_id)
-        remains = [c for c in self._pool if c.name not in owned]
-        if not remains:
+        self._sync()
+        owned = self._repo.get_owned_bits(p.user_id)
+        pool = self._pool_for(p.user_id, owned)
+        remaining = len(pool)
+        if not remaining:
             return (
                 [],
-                {"gold": 0, "grain": 0, "stone": 0, "troops": 0},
+                dict.fromkeys(_RES, 0),
                 0,
                 DrawResultStatus.ALL_CHARACTERS_COLLECTED,
             )
 
-        got: List[Character] = []
-        spent = {"gold": 0, "grain": 0, "stone": 0, "troops": 0}
-        status = DrawResultStatus.SUCCESS
-
         # 先懒结算资源
         p = self._res.settle(p)
 
-        for i in range(count):
-            # 再次检查是否还有可抽
-            owned = self._repo.list_owned_char_names(p.user_id)
-            remains = [c for c in self._pool if c.name not in owned]
-            if not remains:
-                status = DrawResultStatus.ALL_CHARACTERS_COLLECTED
-                break
-
-            draw_index = p.draw_count + 1  # 下一个抽的序号（从1开始）
-            cost = cost_for_draw_index(draw_index)
-
-            # 余额是否足够
-            enough = (
-                p.gold >= cost["gold"]
-                and p.grain >= cost["grain"]
-                and p.stone >= cost["stone"]
-                and p.troops >= cost["troops"]
-            )
-            if not enough:
-                status = DrawResultStatus.NOT_ENOUGH_RESOURCES
-                break
+        start = p.draw_count + 1  # 下一个抽的序号（从1开始）
+        balance = {"gold": p.gold, "grain": p.grain, "stone": p.stone, "troops": p.troops}
+        n = min(count, remaining, affordable_draws(start, balance, count))
 
-            # 扣费
-            p.gold -= cost["gold"]
-            p.grain -= cost["grain"]
-            p.stone -= cost["stone"]
-            p.troops -= cost["troops"]
-
-            for k in spent:
-                spent[k] += cost[k]
-
-            # 发卡
-            ch = self._pick_one(remains)
-            self._repo.add_char(p.user_id, ch.name, level=1)
-            got.append(ch)
+        # 与逐抽语义一致：先看还有没有可抽，再看钱够不够
+        status = DrawResultStatus.SUCCESS
+        if n < count:
+            status = (
+                DrawResultStatus.ALL_CHARACTERS_COLLECTED
+                if n == remaining
+                else DrawResultStatus.NOT_ENOUGH_RESOURCES
+            )
+        if n == 0:
+            return [], dict.fromkeys(_RES, 0), 0, status
 
-            # 计数 +1 并落库
-            p.draw_count += 1
-            self._repo.upsert_player(p)
+        spent = range_cost(start, n)
+        p.gold -= spent["gold"]
+        p.grain -= spent["grain"]
+        p.stone -= spent["stone"]
+        p.troops -= spent["troops"]
+        p.draw_count += n
 
-        return got, spent, len(got), status
+        # 发卡：不放回地按稀有度加权抽 n 个；抽中的已从缓存的卡池里取走，位图跟着更新
+        picked = self._pick_many(p, pool, n)
+        got = [self._catalog.at(i) for i in picked]
+        try:
+            self._repo.apply_draws(p, [c.name for c in got], owned)
+        except Exception:
+            self._pools.pop(p.user_id, None)  # 没落库：卡池与库不一致，下次重建
+            raise
+        for i in picked:
+            owned |= 1 << self._bit_of[i]
+        self._pools[p.user_id] = (owned, pool)
+        return got, spent, n, status
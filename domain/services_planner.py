@@ -0,0 +1,329 @@
+# domain/services_planner.py
+from __future__ import annotations
+import heapq
+import threading
+from collections import OrderedDict
+from dataclasses import dataclass
+from functools import lru_cache
+from typing import Dict, List, Optional, Sequence, Tuple
+
+from .constants import (
+    BUILDING_TO_RESOURCE,
+    CAPACITY_PER_LEVEL,
+    MAX_LEVEL,
+    PRODUCTION_PER_MIN,
+    UPGRADE_RESOURCE_COST,
+    UPGRADE_STONE_COST,
+)
+from .entities import Player
+
+# 状态向量的顺序：建筑 i 产出资源 i
+BUILDINGS = ("farm", "bank", "quarry", "barracks")
+RESOURCES = tuple(BUILDING_TO_RESOURCE[b] for b in BUILDINGS)  # grain, gold, stone, troops
+_STONE = RESOURCES.index("stone")
+
+Vec = Tuple[int, int, int, int]
+
+
+@dataclass(frozen=True)
+class PlanStep:
+    building: str
+    level: int  # 升到的等级
+    wait_min: int  # 距上一步还要等多少分钟
+    at_min: int  # 从现在算起第几分钟可以升
+
+
+@dataclass(frozen=True)
+class UpgradePlan:
+    steps: Tuple[PlanStep, ...]
+    total_min: int
+    explored: int  # 搜索展开的状态数（调试/统计用）
+    exact: bool = True  # False：状态太多没搜完，给的是贪心上界
+
+
+@lru_cache(maxsize=None)
+def step_cost(i: int, level: int) -> Vec:
+    """建筑 i 升到 level 的成本向量：固定石头 + 自身资源（采石场两份都是石头）"""
+    cost = [0, 0, 0, 0]
+    cost[_STONE] += UPGRADE_STONE_COST[BUILDINGS[i]][level]
+    cost[i] += UPGRADE_RESOURCE_COST[RESOURCES[i]][level]
+    return tuple(cost)
+
+
+@lru_cache(maxsize=None)
+def level_rates(levels: Vec) -> Tuple[Vec, Vec]:
+    """某组等级下的 (每分钟产出, 上限)；按等级元组缓存，搜索里反复用到"""
+    prod = tuple(PRODUCTION_PER_MIN[r][lv] for r, lv in zip(RESOURCES, levels))
+    cap = tuple(CAPACITY_PER_LEVEL[r][lv] for r, lv in zip(RESOURCES, levels))
+    return prod, cap
+
+
+def advance(bal: Sequence[int], prod: Sequence[int], cap: Sequence[int], minutes: int) -> Vec:
+    # 已超上限的（比如刚降级或 GM 发放）保持原值，与 ResourceService._apply_cap 一致
+    return tuple(b if b >= c else min(c, b + p * minutes) for b, p, c in zip(bal, prod, cap))
+
+
+def _quantize(bal: Sequence[int], prod: Sequence[int], cap: Sequence[int]) -> Vec:
+    """余额向下取整到整分钟产出（满仓的按上限）：同一分钟内的余额共用一份规划，最多晚报 1 分钟"""
+    return tuple(
+        c if b >= c else (b - b % p if p > 0 else b) for b, p, c in zip(bal, prod, cap)
+    )
+
+
+def remaining_cost(levels: Vec, goal: Vec) -> Vec:
+    """从 levels 升到 goal 还要花的资源总量"""
+    rem = [0, 0, 0, 0]
+    for i in range(len(BUILDINGS)):
+        for lvl in range(levels[i] + 1, goal[i] + 1):
+            for k, c in enumerate(step_cost(i, lvl)):
+                rem[k] += c
+    return tuple(rem)
+
+
+@lru_cache(maxsize=4096)
+def _chain_min(i: int, level: int, goal: int, bal: int) -> int:
+    """
+    只看建筑 i 自己这条线：石头管够，只用自身资源从 level 逐级升到 goal 的最短分钟数。
+    别的建筑不影响资源 i 的产出，所以这是整体用时的下界。
+    """
+    t = 0
+    for lvl in range(level + 1, goal + 1):
+        prod, _ = level_rates_one(i, lvl - 1)
+        need = UPGRADE_RESOURCE_COST[RESOURCES[i]][lvl] + (
+            UPGRADE_STONE_COST[BUILDINGS[i]][lvl] if i == _STONE else 0
+        )
+        if need > bal:
+            w = -(-(need - bal) // prod) if prod > 0 else 0
+            t += w
+            bal += w * prod
+        bal -= need
+    return t
+
+
+def level_rates_one(i: int, level: int) -> Tuple[int, int]:
+    r = RESOURCES[i]
+    return PRODUCTION_PER_MIN[r][level], CAPACITY_PER_LEVEL[r][level]
+
+
+class UpgradePlanner:
+    """
+    建筑升级路线规划：给定当前等级/余额和目标等级，求最早全部达标的升级顺序。
+      - 转移 = 挑一座未达标的建筑，等到攒够就立刻升（产出与上限随等级单调，晚升不会更快）；
+        等待时间是闭式解 ceil(缺口/产出)，攒不满（成本超过仓库上限）的分支直接剪掉；
+      - quick_plan：贪心推演，每步升“自身资源缺口最大”（按当前产出折成分钟）的那座，
+        第一步逐个试（一步前瞻），至多 4 次线性推演；/slg 一键 只用它；
+      - plan：quick_plan 当上界，先做一遍每个等级元组只留最早状态的搜索收紧上界，
+        再按下界做 A* 求精确最短。下界 = 各建筑单线升满的最短用时与“剩余总成本按目标产出攒齐”的较大者；
+        每个等级元组保留一组互不支配的 (时刻, 余额)（更早到、且等到同一时刻余额各项不少才算支配）；
+        第一遍的状态数不超过等级元组数；精确那遍展开超过 max_expand 个状态就停，
+        给出目前最好的方案（UpgradePlan.exact=False）；
+      - 结果按 (等级, 目标, 余额取整到整分钟产出) 做 LRU：产出/上限由等级决定，满仓玩家的键不随时间变化。
+    plan 较重，main 用 asyncio.to_thread 调；缓存加锁。
+    """
+
+    def __init__(self, max_cache: int = 256, max_expand: int = 2000):
+        self._max_cache = max_cache
+        self._max_expand = max_expand
+        self._memo: "OrderedDict[Tuple, Optional[UpgradePlan]]" = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    @staticmethod
+    def player_state(p: Player) -> Tuple[Vec, Vec]:
+        levels = (p.farm_level, p.bank_level, p.quarry_level, p.barracks_level)
+        bal = tuple(int(getattr(p, r, 0) or 0) for r in RESOURCES)
+        return tuple(int(x or 1) for x in levels), bal
+
+    def plan_for(self, p: Player, target: int) -> Optional[UpgradePlan]:
+        """p 应已 settle 过"""
+        levels, bal = self.player_state(p)
+        return self.plan(levels, bal, target)
+
+    def quick_plan_for(self, p: Player, target: int) -> Optional[UpgradePlan]:
+        """p 应已 settle 过"""
+        levels, bal = self.player_state(p)
+        return self.quick_plan(levels, bal, target)
+
+    def plan(self, levels: Vec, bal: Vec, target: int) -> Optional[UpgradePlan]:
+        """所有建筑升到 target 级的最短用时方案；做不到返回 None"""
+        target = max(1, min(MAX_LEVEL, int(target)))
+        levels = tuple(levels)
+        prod, cap = level_rates(levels)
+        bal = _quantize(bal, prod, cap)
+        key = (levels, target, bal)
+        with self._lock:
+            if key in self._memo:
+                self._memo.move_to_end(key)
+                self.hits += 1
+                return self._memo[key]
+            self.misses += 1
+        res = self._search(levels, bal, target)
+        with self._lock:
+            self._memo[key] = res
+            if len(self._memo) > self._max_cache:
+                self._memo.popitem(last=False)
+        return res
+
+    def quick_plan(self, levels: Vec, bal: Vec, target: int) -> Optional[UpgradePlan]:
+        """近似方案：第一步逐个试，之后贪心推演，取总用时最短的；不进缓存"""
+        target = max(1, min(MAX_LEVEL, int(target)))
+        levels, bal = tuple(levels), tuple(bal)
+        goal = tuple(max(lv, target) for lv in levels)
+        if levels == goal:
+            return UpgradePlan((), 0, 0)
+        rem = remaining_cost(levels, goal)
+        best: Optional[UpgradePlan] = None
+        for i in range(len(BUILDINGS)):
+            first = self._step(levels, bal, i, goal)
+            if first is None:
+                continue
+            w, nlv, nb = first
+            rest = self._greedy(nlv, nb, goal, w, _sub(rem, step_cost(i, nlv[i])))
+            if rest is None:
+                continue
+            if best is None or rest[1] < best.total_min:
+                steps = (PlanStep(BUILDINGS[i], nlv[i], w, w),) + rest[0]
+                best = UpgradePlan(steps, rest[1], len(BUILDINGS), exact=False)
+        return best
+
+    @staticmethod
+    def _step(lv: Vec, b: Vec, i: int, goal: Vec) -> Optional[Tuple[int, Vec, Vec]]:
+        """等到能升建筑 i 就升：(等待分钟, 新等级, 新余额)；已达标或攒不满返回 None"""
+        if lv[i] >= goal[i]:
+            return None
+        prod, cap = level_rates(lv)
+        need = step_cost(i, lv[i] + 1)
+        # 闭式等待时间；成本只涉及石头和自身资源，其余分量为 0 直接跳过
+        w = 0
+        for k in (_STONE, i):
+            gap = need[k] - b[k]
+            if gap > 0:
+                if need[k] > cap[k] or prod[k] <= 0:
+                    return None
+                w = max(w, -(-gap // prod[k]))
+        nb = advance(b, prod, cap, w) if w else b
+        return w, lv[:i] + (lv[i] + 1,) + lv[i + 1 :], _sub(nb, need)
+
+    def _greedy(
+        self, lv: Vec, b: Vec, goal: Vec, t: int, rem: Vec
+    ) -> Optional[Tuple[Tuple[PlanStep, ...], int]]:
+        """每步升自身资源缺口（按当前产出折成分钟）最大的那座，一样大取等得短的"""
+        steps = []
+        while lv != goal:
+            prod, _ = level_rates(lv)
+            best = None
+            for i in range(len(BUILDINGS)):
+                r = self._step(lv, b, i, goal)
+                if r is None:
+                    continue
+                k = (-(rem[i] - b[i]) / prod[i] if prod[i] > 0 else 0.0, r[0])
+                if best is None or k < best[0]:
+                    best = (k, i, r)
+            if best is None:
+                return None
+            _, i, (w, lv, b) = best
+            rem = _sub(rem, step_cost(i, lv[i]))
+            t += w
+            steps.append(PlanStep(BUILDINGS[i], lv[i], w, t))
+        return tuple(steps), t
+
+    def _search(self, levels: Vec, bal: Vec, target: int) -> Optional[UpgradePlan]:
+        goal = tuple(max(lv, target) for lv in levels)
+        best = self.quick_plan(levels, bal, target)
+        if best is None or not best.steps:
+            return best
+        gprod, _ = level_rates(goal)
+
+        def lower(lv: Vec, b: Vec, rem: Vec) -> int:
+            chains = max(_chain_min(i, lv[i], goal[i], b[i]) for i in range(len(BUILDINGS)))
+            totals = max(
+                [-(-(rk - bk) // pk) for rk, bk, pk in zip(rem, b, gprod) if rk > bk and pk > 0],
+                default=0,
+            )
+            return max(chains, totals)
+
+        # 先用“每个等级元组只留最早一个状态”的快速搜索收紧上界，再在上界内做精确搜索
+        explored = 0
+        for pareto in (False, True):
+            res, n, complete = self._astar(levels, bal, goal, best.total_min, lower, pareto)
+            explored += n
+            if res is not None:
+                best = res
+            if pareto:
+                return UpgradePlan(best.steps, best.total_min, explored, exact=complete)
+        return best  # 不会走到
+
+    def _astar(self, levels: Vec, bal: Vec, goal: Vec, bound: int, lower, pareto: bool):
+        """
+        在 bound 以内找更快的路线：(方案或 None, 展开数, 是否搜完)。
+        pareto=False：每个等级元组只留第一个弹出的状态（按时刻排序，快但可能错过最优）；
+        pareto=True：按下界排序，保留互不支配的状态，搜完即精确。
+        """
+        rem0 = remaining_cost(levels, goal)
+        # labels[i] = (父标签, 建筑下标, 升到的等级, 等待分钟, 时刻)
+        labels: List[Tuple[int, int, int, int, int]] = [(-1, -1, 0, 0, 0)]
+        front: Dict[Vec, List[Tuple[int, Vec]]] = {}
+        # (排序键, 时刻, -余额总量, 标签, 等级, 余额, 剩余成本)
+        heap = [(0, 0, -sum(bal), 0, levels, bal, rem0)]
+        expanded = 0
+        while heap:
+            _, t, _, lid, lv, b, rem = heapq.heappop(heap)
+            if pareto:
+                if self._dominated(front, lv, t, b):
+                    continue
+                front.setdefault(lv, []).append((t, b))
+            elif lv in front:
+                continue
+            else:
+                front[lv] = [(t, b)]
+            expanded += 1
+            if lv == goal:
+                return UpgradePlan(self._path(labels, lid), t, expanded), expanded, True
+            if pareto and expanded > self._max_expand:
+                return None, expanded, False
+            for i in range(len(BUILDINGS)):
+                st = self._step(lv, b, i, goal)
+                if st is None:
+                    continue
+                w, nlv, nb = st
+                nt = t + w
+                nrem = _sub(rem, step_cost(i, nlv[i]))
+                if pareto:
+                    # 下界只用于精确那遍；单状态那遍按下界剪枝会改变“先到”的是谁，反而变差
+                    nf = nt + lower(nlv, nb, nrem)
+                    if nf >= bound or self._dominated(front, nlv, nt, nb):
+                        continue
+                else:
+                    nf = nt
+                    if nt >= bound or nlv in front:
+                        continue
+                labels.append((lid, i, nlv[i], w, nt))
+                heapq.heappush(heap, (nf, nt, -sum(nb), len(labels) - 1, nlv, nb, nrem))
+        # 上界以内没有更快的路线
+        return None, expanded, True
+
+    @staticmethod
+    def _dominated(front: Dict[Vec, List[Tuple[int, Vec]]], lv: Vec, t: int, b: Vec) -> bool:
+        """同等级下已有更早（或同时）到达、等到 t 时余额各项都不少的状态"""
+        seen = front.get(lv)
+        if not seen:
+            return False
+        prod, cap = level_rates(lv)
+        for t0, b0 in seen:
+            if t0 <= t and all(x >= y for x, y in zip(advance(b0, prod, cap, t - t0), b)):
+                return True
+        return False
+
+    @staticmethod
+    def _path(labels, lid: int) -> Tuple[PlanStep, ...]:
+        out = []
+        while lid > 0:
+            parent, i, level, w, at = labels[lid]
+            out.append(PlanStep(BUILDINGS[i], level, w, at))
+            lid = parent
+        return tuple(reversed(out))
+
+
+def _sub(a: Sequence[int], b: Sequence[int]) -> Vec:
+    return tuple(x - y for x, y in zip(a, b))
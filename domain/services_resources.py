@@ -1,8 +1,8 @@
 # domain/services_resources.py
-import time
-from typing import Dict
+from typing import Dict, Optional, Tuple
+from .clock import SystemClock
 from .entities import Player
-from .ports import PlayerRepositoryPort
+from .ports import ClockPort, PlayerRepositoryPort
 from .constants import (
     PRODUCTION_PER_MIN,
     CAPACITY_PER_LEVEL,
@@ -25,13 +25,14 @@ def _fmt_cost(stone_cost: int, res_type: str, res_cost: int) -> str:
 
 
 class ResourceService:
-    def __init__(self, repo: PlayerRepositoryPort):
+    def __init__(self, repo: PlayerRepositoryPort, clock: Optional[ClockPort] = None):
         self._repo = repo
+        self._clock = clock or SystemClock()
         self._repo.init_schema()
 
     # --- 基础 ---
     def _now(self) -> int:
-        return int(time.time())
+        return self._clock.now()
 
     def get_or_none(self, user_id: str):
         return self._repo.get_player(user_id)
@@ -149,6 +150,34 @@ class ResourceService:
             "cur": cur,
         }
 
+    # --- 满仓时间（闭式解） ---
+    def full_times(self, p: Player) -> Dict[str, int]:
+        """尚未满仓的各资源封顶时刻（epoch秒）；已满或不产出的资源不在结果里。
+        产出按整分钟线性累加，因此第 m 分钟满仓的 m = ceil((上限-当前)/每分钟产出)。
+        """
+        lv = self._levels(p)
+        base = p.last_tick or self._now()
+        out: Dict[str, int] = {}
+        for r in ("grain", "gold", "stone", "troops"):
+            cap = CAPACITY_PER_LEVEL[r][lv[r]]
+            cur = getattr(p, r, 0) or 0
+            prod = PRODUCTION_PER_MIN[r][lv[r]]
+            if cur >= cap or prod <= 0:
+                continue
+            out[r] = base + (-(-(cap - cur) // prod)) * MINUTE
+        return out
+
+    def full_at(
+        self, p: Player, after: Optional[int] = None
+    ) -> Optional[Tuple[int, str]]:
+        """最早封顶的 (时刻, 资源)；给了 after 则只看晚于 after 的。"""
+        cand = [
+            (ts, r)
+            for r, ts in self.full_times(p).items()
+            if after is None or ts > after
+        ]
+        return min(cand) if cand else None
+
     def upgrade(self, p: Player, building_name: str):
         """按固定表扣资源：需要 石头 + 建筑自身资源"""
         # 名称归一
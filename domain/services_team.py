@@ -36,35 +36,45 @@ class TeamService:
         self._repo.ensure_teams(user_id, TEAM_COUNT, TEAM_SLOTS)
 
     def calc_capacity(self, user_id: str, team_no: int) -> int:
-        slots = self._repo.list_team_slots(user_id, team_no)
+        rows = self._repo.list_team_members(user_id, team_no)
+        return self._capacity(rows)
+
+    @staticmethod
+    def _capacity(rows) -> int:
         cap = TEAM_BASE_TROOPS
-        for _, name in slots:
-            if not name:
-                continue
-            lv = self._repo.get_char_level(user_id, name) or 1
-            cap += lv * TROOPS_PER_LEVEL
+        for _, _, name, lv in rows:
+            if name:
+                cap += (lv or 1) * TROOPS_PER_LEVEL
         return cap
 
-    def show_team(self, user_id: str, team_no: int) -> Dict:
-        slots = self._repo.list_team_slots(user_id, team_no)
-        soldiers = self._repo.get_team_soldiers(user_id, team_no)
-        cap = self.calc_capacity(user_id, team_no)
-        members = []
-        for idx, name in slots:
-            if name:
-                lv = self._repo.get_char_level(user_id, name) or 1
-                members.append({"slot": idx, "name": name, "level": lv})
-            else:
-                members.append({"slot": idx, "name": None, "level": None})
+    def _team_info(self, team_no: int, rows, soldiers: int) -> Dict:
+        members = [
+            {"slot": idx, "name": name, "level": (lv or 1) if name else None}
+            for _, idx, name, lv in rows
+        ]
         return {
             "team_no": team_no,
             "soldiers": soldiers,
-            "capacity": cap,
+            "capacity": self._capacity(rows),
             "members": members,
         }
 
+    def show_team(self, user_id: str, team_no: int) -> Dict:
+        rows = self._repo.list_team_members(user_id, team_no)
+        soldiers = self._repo.get_team_soldiers(user_id, team_no)
+        return self._team_info(team_no, rows, soldiers)
+
     def list_teams(self, user_id: str) -> List[Dict]:
-        return [self.show_team(user_id, t) for t in range(1, TEAM_COUNT + 1)]
+        # 三支队伍的槽位+角色等级、兵力各一次查询
+        rows = self._repo.list_team_members(user_id)
+        soldiers = self._repo.list_team_soldiers(user_id)
+        by_team: Dict[int, list] = {t: [] for t in range(1, TEAM_COUNT + 1)}
+        for r in rows:
+            by_team.setdefault(r[0], []).append(r)
+        return [
+            self._team_info(t, by_team[t], soldiers.get(t, 0))
+            for t in range(1, TEAM_COUNT + 1)
+        ]
 
     def assign(
         self, user_id: str, char_name: str, team_no: int, slot_idx: Optional[int] = None
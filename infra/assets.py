@@ -1,8 +1,19 @@
 # infra/assets.py
 from __future__ import annotations
 import base64
+import hashlib
+import io
+import threading
 from pathlib import Path
-from typing import Dict, Iterable, Optional
+from typing import Callable, Dict, Iterable, List, Optional, Tuple
+
+from .html_renderer import (
+    CANVAS_W,
+    CANVAS_H,
+    ICON_SIZE_CAPITAL,
+    ICON_SIZE_NORMAL,
+    ICON_SIZE_PASS,
+)
 
 _MIME = {
     ".png": "image/png",
@@ -10,6 +21,14 @@ _MIME = {
     ".jpeg": "image/jpeg",
 }
 
+# 图标按显示尺寸的 2 倍出图，高分屏截图也不糊
+ICON_SCALE = 2
+ICON_BOX = max(ICON_SIZE_CAPITAL, ICON_SIZE_NORMAL) * ICON_SCALE
+PASS_BOX = ICON_SIZE_PASS * ICON_SCALE
+BG_JPEG_QUALITY = 80
+# 出图规则变了就改这个版本号，旧缓存自然失效
+PIPELINE_VERSION = "1"
+
 
 def _to_data_uri(p: Path) -> Optional[str]:
     suf = p.suffix.lower()
@@ -21,6 +40,100 @@ def _to_data_uri(p: Path) -> Optional[str]:
     return f"data:{mime};base64,{enc}"
 
 
+def _encode_uri(data: bytes, mime: str) -> str:
+    return f"data:{mime};base64,{base64.b64encode(data).decode('ascii')}"
+
+
+def _resize_icon(raw: bytes, box: int) -> Tuple[bytes, str]:
+    from PIL import Image
+
+    im = Image.open(io.BytesIO(raw)).convert("RGBA")
+    im.thumbnail((box, box), Image.LANCZOS)  # 等比缩进 box×box，与 SVG 的 meet 一致
+    buf = io.BytesIO()
+    im.save(buf, "PNG", optimize=True)
+    return buf.getvalue(), "image/png"
+
+
+def _resize_bg(raw: bytes, w: int, h: int) -> Tuple[bytes, str]:
+    from PIL import Image
+
+    im = Image.open(io.BytesIO(raw)).convert("RGB")
+    # SVG 里是 slice（铺满裁切）：按覆盖比例缩放，居中裁到画布比例；不放大
+    scale = min(1.0, max(w / im.width, h / im.height))
+    tw, th = max(1, round(im.width * scale)), max(1, round(im.height * scale))
+    if (tw, th) != im.size:
+        im = im.resize((tw, th), Image.LANCZOS)
+    k = min(1.0, tw / w, th / h)  # 源图比画布小时，取其中最大的画布比例区域
+    cw, ch = max(1, round(w * k)), max(1, round(h * k))
+    left, top = (tw - cw) // 2, (th - ch) // 2
+    im = im.crop((left, top, left + cw, top + ch))
+    buf = io.BytesIO()
+    im.save(buf, "JPEG", quality=BG_JPEG_QUALITY, optimize=True, progressive=True)
+    return buf.getvalue(), "image/jpeg"
+
+
+def variant_key(raw: bytes, kind: str) -> str:
+    """sha1(源文件内容 + 出图规格 + 流水线版本)：磁盘缓存文件名和 data URI 备忘的键"""
+    spec = {
+        "icon": f"icon:{ICON_BOX}",
+        "pass": f"icon:{PASS_BOX}",
+        "bg": f"bg:{CANVAS_W}x{CANVAS_H}:q{BG_JPEG_QUALITY}",
+    }[kind]
+    return hashlib.sha1(
+        raw + f"|{spec}|v{PIPELINE_VERSION}".encode("utf-8")
+    ).hexdigest()
+
+
+def build_variant(
+    src: Path, kind: str, cache_dir: Optional[Path], raw: Optional[bytes] = None
+) -> Optional[Tuple[bytes, str]]:
+    """
+    生成按显示尺寸缩放/重压缩后的图片字节 (bytes, mime)。
+    缓存文件名 = variant_key(源文件内容, 规格)，重启后直接复用；内容不变就不会重算。
+    raw 为已读好的源文件内容（省一次读盘）。没装 Pillow 或处理失败时返回 None，由调用方退回原图。
+    """
+    raw = src.read_bytes() if raw is None else raw
+    digest = variant_key(raw, kind)
+    ext, mime = (".jpg", "image/jpeg") if kind == "bg" else (".png", "image/png")
+    cached = cache_dir / f"{digest}{ext}" if cache_dir else None
+    if cached is not None and cached.exists():
+        return cached.read_bytes(), mime
+    try:
+        if kind == "bg":
+            data, mime = _resize_bg(raw, CANVAS_W, CANVAS_H)
+        else:
+            data, mime = _resize_icon(raw, ICON_BOX if kind == "icon" else PASS_BOX)
+    except Exception as e:  # 多半是没装 Pillow
+        print(f"[SLG] asset variant {src.name} skipped: {e}")
+        return None
+    if len(data) >= len(raw) and src.suffix.lower() in _MIME:
+        data, mime = raw, _MIME[src.suffix.lower()]  # 原图已经更小就用原图
+    if cached is not None:
+        try:
+            cache_dir.mkdir(parents=True, exist_ok=True)
+            tmp = cached.with_suffix(cached.suffix + ".tmp")
+            tmp.write_bytes(data)
+            tmp.replace(cached)
+        except Exception as e:
+            print(f"[SLG] asset cache write {cached} failed: {e}")
+    return data, mime
+
+
+def _asset_uri(
+    p: Path, kind: str, cache_dir: Optional[Path], memo: Optional[Dict] = None
+) -> Optional[str]:
+    # memo 以 variant_key 为键：同一份图多处引用、重载后内容没变，都不再缩放和编码，共享同一个字符串对象
+    raw = p.read_bytes()
+    key = variant_key(raw, kind)
+    if memo is not None and key in memo:
+        return memo[key]
+    v = build_variant(p, kind, cache_dir, raw)
+    uri = _to_data_uri(p) if v is None else _encode_uri(*v)
+    if memo is not None:
+        memo[key] = uri
+    return uri
+
+
 def _find_one(dir: Path, names: Iterable[str]) -> Optional[Path]:
     for n in names:
         p = dir / n
@@ -29,25 +142,34 @@ def _find_one(dir: Path, names: Iterable[str]) -> Optional[Path]:
     return None
 
 
-def load_assets(picture_dir: Path, city_names: Iterable[str]) -> Dict:
-    """从 picture/ 读取资源并转成 data URI"""
+def load_assets(
+    picture_dir: Path,
+    city_names: Iterable[str],
+    cache_dir: Optional[Path] = None,
+    memo: Optional[Dict] = None,
+) -> Dict:
+    """
+    从 picture/ 读取资源，按显示尺寸缩放后转成 data URI；cache_dir 为缩放结果的磁盘缓存。
+    memo 为跨次调用的 data URI 备忘（见 _asset_uri），重载前后传同一个即可复用；之后可用 prune_memo 收缩。
+    """
     picture_dir = picture_dir.resolve()
     assets = {"bg": None, "defaults": {}, "cities": {}}
+    memo = {} if memo is None else memo
 
     # 背景：bg.png 优先，其次 bg.jpg，或 background.*
     bgp = _find_one(
         picture_dir, ["bg.png", "bg.jpg", "background.png", "background.jpg"]
     )
     if bgp:
-        assets["bg"] = _to_data_uri(bgp)
+        assets["bg"] = _asset_uri(bgp, "bg", cache_dir, memo)
 
     # 类型兜底：优先 PNG，再 JPG
-    def _pick(*candidates):
+    def _pick(*candidates, kind="icon"):
         p = _find_one(picture_dir, candidates)
-        return _to_data_uri(p) if p else None
+        return _asset_uri(p, kind, cache_dir, memo) if p else None
 
     assets["defaults"]["CITY"] = _pick("CITY.png", "CITY.jpg")
-    assets["defaults"]["PASS"] = _pick("PASS.png", "PASS.jpg")
+    assets["defaults"]["PASS"] = _pick("PASS.png", "PASS.jpg", kind="pass")
     assets["defaults"]["RESOURCE"] = _pick(
         "RESOURCE.png", "RESOURCE.jpg", "default.png", "default.jpg"
     )
@@ -57,6 +179,95 @@ def load_assets(picture_dir: Path, city_names: Iterable[str]) -> Dict:
     for name in city_names:
         cand = _find_one(picture_dir, [f"{name}.png", f"{name}.jpg"])
         if cand:
-            assets["cities"][name] = _to_data_uri(cand)
+            assets["cities"][name] = _asset_uri(cand, "icon", cache_dir, memo)
 
     return assets
+
+
+def prune_memo(memo: Dict, assets: Dict) -> Dict:
+    """只留下 assets 里还在用的 data URI，换掉的旧图不会在备忘里越积越多"""
+    live = {id(assets["bg"])}
+    live.update(id(u) for u in assets["defaults"].values())
+    live.update(id(u) for u in assets["cities"].values())
+    return {k: u for k, u in memo.items() if id(u) in live}
+
+
+class AssetStore:
+    """
+    懒加载的素材仓库：
+      - 第一次 get() 才读图、缩放、编码（可选后台线程预热）；
+      - 之后每次 get() 只对 picture/ 目录和用到的文件做 stat，mtime 变了才整体重载；
+      - 每次重载 version +1，地图渲染缓存据此失效；
+      - 编码好的 data URI 按内容哈希留在 _memo 里，重载时没变的图直接复用，不再缩放和 base64。
+    """
+
+    def __init__(
+        self,
+        picture_dir: Path,
+        city_names: Callable[[], Iterable[str]],
+        cache_dir: Optional[Path] = None,
+    ):
+        self._dir = Path(picture_dir)
+        self._city_names = city_names
+        self._cache_dir = cache_dir
+        self._lock = threading.Lock()
+        self._assets: Optional[Dict] = None
+        self._stamp: Optional[Tuple] = None
+        self._memo: Dict[str, str] = {}
+        self.version = 0
+
+    def _snapshot(self) -> Tuple:
+        # 目录 mtime 覆盖增删文件；文件 mtime/size 覆盖原地替换
+        try:
+            entries: List[Tuple[str, int, int]] = []
+            for p in self._dir.iterdir():
+                if p.suffix.lower() in _MIME:
+                    st = p.stat()
+                    entries.append((p.name, st.st_mtime_ns, st.st_size))
+            return (self._dir.stat().st_mtime_ns, tuple(sorted(entries)))
+        except FileNotFoundError:
+            return ()
+
+    def refresh(self) -> bool:
+        """
+        检查文件是否变化；变了就丢弃已加载的素材（下次 get 重载）并让 version +1。返回是否变化。
+        没加载过也会记下快照：本地光栅化时素材只在渲染进程里加载，主进程靠这里维护 version。
+        """
+        stamp = self._snapshot()
+        if self._stamp is None:
+            self._stamp = stamp
+            return False
+        if stamp == self._stamp:
+            return False
+        with self._lock:
+            self._assets = None
+            self._stamp = stamp
+            self.version += 1
+        return True
+
+    def invalidate(self):
+        with self._lock:
+            self._assets = None
+            self.version += 1
+
+    def get(self) -> Dict:
+        self.refresh()
+        assets = self._assets
+        if assets is not None:
+            return assets
+        with self._lock:
+            if self._assets is None:
+                stamp = self._snapshot()
+                assets = load_assets(
+                    self._dir, self._city_names(), self._cache_dir, self._memo
+                )
+                self._memo = prune_memo(self._memo, assets)
+                self._assets = assets
+                self._stamp = stamp
+            return self._assets
+
+    def warm_up(self):
+        """后台线程预热，不阻塞插件构造"""
+        t = threading.Thread(target=self.get, name="slg-assets-warmup", daemon=True)
+        t.start()
+        return t
@@ -0,0 +1,152 @@
+# infra/card_renderer.py
+from __future__ import annotations
+import importlib.util
+import threading
+from pathlib import Path
+from typing import Dict, List, Optional, Sequence, Tuple
+
+from .card_templates import STROKE_COLOR, TEXT_COLOR, CardTemplate
+from .image_output import OutputSpec, encode
+from .render_cache import RenderCache
+
+
+class CardRenderer:
+    """
+    Pillow 卡片渲染器：背景图解码一次、字体对象按字号缓存，直接返回编码后的图片字节（格式见 image_output.OutputSpec）。
+    版式由 CardTemplate 描述：背景+标题+行标签预先画成一张底图（按模板与背景 mtime 缓存），
+    每次只在底图副本上画数值格子。
+    可选 RenderCache：以(模板, 数值, 背景 mtime, 字体)为键落盘，同样的卡片直接读盘返回。
+    """
+
+    def __init__(
+        self,
+        picture_dir: Path,
+        font_path: Optional[Path] = None,
+        cache: Optional[RenderCache] = None,
+    ):
+        self._picture_dir = Path(picture_dir)
+        self._font_path = Path(font_path) if font_path else None
+        self._lock = threading.Lock()
+        self._bgs: Dict[str, tuple] = {}  # name -> (mtime_ns, Image)
+        self._fonts: Dict[int, object] = {}
+        self._bases: Dict[CardTemplate, Tuple[int, object]] = {}  # tpl -> (bg mtime_ns, 底图)
+        self.cache = cache
+
+    @property
+    def picture_dir(self) -> Path:
+        return self._picture_dir
+
+    @property
+    def font_path(self) -> Optional[Path]:
+        return self._font_path
+
+    @staticmethod
+    def available() -> bool:
+        return importlib.util.find_spec("PIL") is not None
+
+    # ---- 缓存 ----
+    def background(self, name: str):
+        """解码后的 RGBA 背景（只读，调用方需 copy）；文件变了按 mtime 重新解码"""
+        from PIL import Image
+
+        p = self._picture_dir / name
+        mt = p.stat().st_mtime_ns  # 文件不存在直接抛 FileNotFoundError
+        with self._lock:
+            hit = self._bgs.get(name)
+            if hit and hit[0] == mt:
+                return hit[1]
+            im = Image.open(p).convert("RGBA")
+            im.load()
+            self._bgs[name] = (mt, im)
+            return im
+
+    def font(self, size: int):
+        from PIL import ImageFont
+
+        with self._lock:
+            f = self._fonts.get(size)
+            if f is None:
+                try:
+                    if self._font_path and self._font_path.exists():
+                        f = ImageFont.truetype(str(self._font_path), size)
+                    else:
+                        f = ImageFont.load_default()
+                except Exception:
+                    f = ImageFont.load_default()
+                self._fonts[size] = f
+            return f
+
+    def _base(self, tpl: CardTemplate):
+        """背景 + 标题 + 行标签的静态底图；背景文件变了随之重画"""
+        from PIL import ImageDraw
+
+        mt = (self._picture_dir / tpl.background).stat().st_mtime_ns
+        bg = self.background(tpl.background)
+        with self._lock:
+            hit = self._bases.get(tpl)
+            if hit and hit[0] == mt:
+                return hit[1]
+        img = bg.copy()
+        draw = ImageDraw.Draw(img)
+        draw.text(
+            (tpl.x0, tpl.y0), tpl.title, font=self.font(tpl.title_size),
+            fill=TEXT_COLOR, stroke_width=tpl.title_stroke, stroke_fill=STROKE_COLOR,
+        )
+        body_font = self.font(tpl.body_size)
+        for i, label in enumerate(tpl.labels):
+            draw.text(
+                (tpl.x0, tpl.row_y(i)), label, font=body_font,
+                fill=TEXT_COLOR, stroke_width=tpl.body_stroke, stroke_fill=STROKE_COLOR,
+            )
+        with self._lock:
+            self._bases[tpl] = (mt, img)
+        return img
+
+    # ---- 卡片 ----
+    def cache_key(
+        self, tpl: CardTemplate, cells: Sequence[Sequence[str]], spec: Optional[OutputSpec] = None
+    ) -> str:
+        """磁盘缓存键：模板 + 数值 + 输出规格 + 背景 mtime + 字体；背景不存在抛 FileNotFoundError"""
+        mt = (self._picture_dir / tpl.background).stat().st_mtime_ns
+        return RenderCache.key(tpl, cells, spec or OutputSpec(), mt, str(self._font_path))
+
+    def render(
+        self, tpl: CardTemplate, cells: Sequence[Sequence[str]], spec: Optional[OutputSpec] = None
+    ) -> bytes:
+        """cells[行][列]，行数不超过模板标签数；spec 决定输出格式/宽度（默认全彩 PNG 原尺寸）"""
+        from PIL import ImageDraw
+
+        key = None
+        if self.cache is not None:
+            key = self.cache_key(tpl, cells, spec)
+            hit = self.cache.get(key)
+            if hit is not None:
+                return hit
+
+        img = self._base(tpl).copy()
+        draw = ImageDraw.Draw(img)
+        body_font = self.font(tpl.body_size)
+        stroke = tpl.body_stroke
+
+        # 每列最大宽度，用于动态对齐
+        col_widths: List[int] = [0] * tpl.cols
+        for row in cells:
+            for i, item in enumerate(row):
+                bbox = draw.textbbox((0, 0), item, font=body_font)
+                col_widths[i] = max(col_widths[i], bbox[2] - bbox[0])
+        col_x = [tpl.x0 + tpl.col_start]
+        for i in range(1, tpl.cols):
+            col_x.append(col_x[i - 1] + col_widths[i - 1] + tpl.col_gap)
+
+        for r, row in enumerate(cells[: len(tpl.labels)]):
+            y = tpl.row_y(r)
+            for i, item in enumerate(row):
+                draw.text(
+                    (col_x[i], y), item, font=body_font,
+                    fill=TEXT_COLOR, stroke_width=stroke, stroke_fill=STROKE_COLOR,
+                )
+
+        data = encode(img, spec)
+        if key is not None:
+            self.cache.put(key, data)
+        return data
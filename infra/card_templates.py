@@ -0,0 +1,95 @@
+# infra/card_templates.py
+from __future__ import annotations
+from dataclasses import dataclass
+from typing import Dict, List, Sequence, Tuple
+
+TEXT_COLOR = (255, 255, 255)
+STROKE_COLOR = (0, 0, 0)
+
+
+@dataclass(frozen=True)
+class CardTemplate:
+    """
+    卡片版式：背景、标题、行标签都是静态的，只在第一次用到时画进底图；
+    每次请求只画 rows×cols 个数值格子，列宽按本次内容动态对齐。
+    """
+
+    name: str
+    background: str
+    title: str
+    labels: Tuple[str, ...]
+    cols: int
+    title_size: int = 80
+    body_size: int = 56
+    x0: int = 60
+    y0: int = 80
+    body_dy: int = 120  # 标题到第一行
+    line_gap: int = 80
+    col_start: int = 250  # 第一列相对 x0 的偏移
+    col_gap: int = 50
+    title_stroke: int = 5
+    body_stroke: int = 4
+
+    def row_y(self, i: int) -> int:
+        return self.y0 + self.body_dy + i * self.line_gap
+
+
+# 资源卡：数值与原先 main.slg_resource_status 里的版式一致
+RESOURCE_CARD = CardTemplate(
+    name="resource",
+    background="resourcebg.png",
+    title="资源状态",
+    labels=("建筑等级：", "产出/分钟：", "当前/上限："),
+    cols=4,
+)
+
+
+def team_card(team_nos: Sequence[int]) -> CardTemplate:
+    """队伍卡：每行一个队伍，三个槽位 + 兵力；字号调小以放下四列"""
+    return CardTemplate(
+        name="team",
+        background="resourcebg.png",
+        title="队伍编成",
+        labels=tuple(f"队伍{t}：" for t in team_nos),
+        cols=4,
+        body_size=40,
+        body_dy=110,
+        line_gap=64,
+        col_start=160,
+        col_gap=40,
+        body_stroke=3,
+    )
+
+
+def resource_cells(s: Dict) -> List[List[str]]:
+    """s 为 ResourceService.status() 的返回"""
+    lvb, prod, cap, cur = s["level_by_building"], s["prod_per_min"], s["cap"], s["cur"]
+    return [
+        [f"农田{lvb['farm']}", f"钱庄{lvb['bank']}", f"采石场{lvb['quarry']}", f"军营{lvb['barracks']}"],
+        [f"粮{prod['grain']}", f"金{prod['gold']}", f"石{prod['stone']}", f"兵{prod['troops']}"],
+        [
+            f"粮{cur['grain']}/{cap['grain']}",
+            f"金{cur['gold']}/{cap['gold']}",
+            f"石{cur['stone']}/{cap['stone']}",
+            f"兵{cur['troops']}/{cap['troops']}",
+        ],
+    ]
+
+
+def card_text(tpl: CardTemplate, cells: Sequence[Sequence[str]]) -> str:
+    """同一份版式的纯文字版（渲染繁忙或缺 Pillow 时用）"""
+    lines = [tpl.title]
+    lines += [label + "  ".join(row) for label, row in zip(tpl.labels, cells)]
+    return "\n".join(lines)
+
+
+def member_str(x: Dict) -> str:
+    return f"[{x['slot']}]{x['name']}Lv{x['level']}" if x["name"] else f"[{x['slot']}]空"
+
+
+def team_cells(infos: Sequence[Dict]) -> List[List[str]]:
+    """infos 为 TeamService.show_team() 返回值的列表"""
+    return [
+        [member_str(x) for x in info["members"]] + [f"兵 {info['soldiers']}/{info['capacity']}"]
+        for info in infos
+    ]
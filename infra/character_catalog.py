@@ -0,0 +1,197 @@
+# infra/character_catalog.py
+from __future__ import annotations
+import hashlib
+import pickle
+import threading
+import time
+from pathlib import Path
+from typing import Callable, Dict, Iterator, List, Optional, Tuple
+
+from ..domain.entities import Character
+from .character_provider import CharRow, CharacterProvider, row_to_character
+
+# 缓存格式变了就改这个版本号
+CATALOG_VERSION = "1"
+
+Derive = Callable[[Character], Tuple]
+
+
+def display_name(row: CharRow) -> str:
+    name, title, _, rarity, _ = row
+    return f"【{rarity}】{name}（{title}）" if title else f"【{rarity}】{name}"
+
+
+class CharacterCatalog:
+    """
+    全局共享的角色目录（抽卡、战斗等服务共用一份）：
+      - name → 下标、稀有度、展示文案、派生特征（derive 回调，如战斗的技能关键词计数）一次算好；
+      - 解析结果（纯元组行）连同派生数据 pickle 到 cache_path，JSON 的 mtime/size 不变直接读缓存，
+        mtime 变了但内容哈希相同也不重算；
+      - Character 对象按需构建并缓存（冻结 dataclass 构造较慢，几万角色全量构建要几百毫秒）；
+      - refresh() 按 min_interval 节流地检查 JSON，变了就整体重载，version +1。
+    """
+
+    def __init__(
+        self,
+        json_path: Path,
+        cache_path: Optional[Path] = None,
+        derive: Optional[Derive] = None,
+        derive_key: str = "",
+        min_interval: float = 2.0,
+    ):
+        self._path = Path(json_path)
+        self._cache_path = Path(cache_path) if cache_path else None
+        self._derive = derive
+        self._derive_key = derive_key
+        self._min_interval = min_interval
+        self._lock = threading.Lock()
+        self._checked_at = 0.0
+        self._stamp: Tuple = ()
+        self._failed_stamp: Optional[Tuple] = None  # 上次重载失败时的文件戳，同一版本只报一次
+        self._digest = ""
+        self.version = 0
+        self._rows: List[CharRow] = []
+        self._chars: List[Optional[Character]] = []
+        self._names: List[str] = []
+        self._rarities: List[str] = []
+        self._index: Dict[str, int] = {}
+        self._display: List[str] = []
+        self._features: List[Tuple] = []
+        self._load()
+
+    # ---- 加载 ----
+    def _file_stamp(self) -> Tuple:
+        st = self._path.stat()
+        return (st.st_mtime_ns, st.st_size)
+
+    def _cache_tag(self, digest: str) -> str:
+        return f"{CATALOG_VERSION}|{digest}|{self._derive_key}"
+
+    def _read_cache(self, stamp: Tuple, raw: Optional[bytes]) -> Optional[Dict]:
+        if self._cache_path is None or not self._cache_path.exists():
+            return None
+        try:
+            with self._cache_path.open("rb") as f:
+                data = pickle.load(f)
+        except Exception as e:
+            print(f"[SLG] character catalog cache unreadable, rebuilding: {e}")
+            return None
+        if data.get("stamp") == stamp and data.get("derive_key") == self._derive_key:
+            if data.get("version") == CATALOG_VERSION:
+                return data
+        if raw is not None and data.get("tag") == self._cache_tag(hashlib.sha1(raw).hexdigest()):
+            return data  # 只是被 touch 过
+        return None
+
+    def _write_cache(self, data: Dict):
+        if self._cache_path is None:
+            return
+        try:
+            self._cache_path.parent.mkdir(parents=True, exist_ok=True)
+            tmp = self._cache_path.with_suffix(self._cache_path.suffix + ".tmp")
+            with tmp.open("wb") as f:
+                pickle.dump(data, f, protocol=pickle.HIGHEST_PROTOCOL)
+            tmp.replace(self._cache_path)
+        except Exception as e:
+            print(f"[SLG] character catalog cache write failed: {e}")
+
+    def _build(self, stamp: Tuple, raw: bytes) -> Dict:
+        digest = hashlib.sha1(raw).hexdigest()
+        rows = CharacterProvider(self._path).load_rows()
+        derive = self._derive
+        return {
+            "version": CATALOG_VERSION,
+            "stamp": stamp,
+            "derive_key": self._derive_key,
+            "tag": self._cache_tag(digest),
+            "digest": digest,
+            "rows": rows,
+            "display": [display_name(r) for r in rows],
+            "features": [derive(row_to_character(r)) for r in rows] if derive else [],
+        }
+
+    def _load(self):
+        stamp = self._file_stamp()
+        data = self._read_cache(stamp, None)
+        if data is None:
+            raw = self._path.read_bytes()
+            data = self._read_cache(stamp, raw)
+            if data is None:
+                data = self._build(stamp, raw)
+            data["stamp"] = stamp
+            self._write_cache(data)
+        with self._lock:
+            self._rows = data["rows"]
+            self._chars = [None] * len(self._rows)
+            self._names = [r[0] for r in self._rows]
+            self._rarities = [r[3] for r in self._rows]
+            self._index = {n: i for i, n in enumerate(self._names)}
+            self._display = data["display"]
+            self._features = data["features"]
+            self._stamp = stamp
+            if data["digest"] != self._digest:
+                self.version += 1
+            self._digest = data["digest"]
+        self._checked_at = time.monotonic()
+
+    def refresh(self, force: bool = False) -> bool:
+        """JSON 变了就重载；返回是否重载。默认按 min_interval 节流，只做一次 stat"""
+        now = time.monotonic()
+        if not force and now - self._checked_at < self._min_interval:
+            return False
+        self._checked_at = now
+        try:
+            stamp = self._file_stamp()
+        except FileNotFoundError:
+            return False
+        if stamp == self._stamp and not force:
+            return False
+        old = self._digest
+        try:
+            self._load()
+        except Exception as e:
+            # 多半是编辑器还没写完或 JSON 写坏了：沿用旧目录（_stamp 不动，下次检查会再试）
+            self._checked_at = now
+            if stamp != self._failed_stamp:
+                self._failed_stamp = stamp
+                print(f"[SLG] character catalog reload failed, keeping previous version: {e!r}")
+            return False
+        self._failed_stamp = None
+        return self._digest != old
+
+    # ---- 查询 ----
+    def __len__(self) -> int:
+        return len(self._rows)
+
+    def __iter__(self) -> Iterator[Character]:
+        return (self.at(i) for i in range(len(self._rows)))
+
+    def all(self) -> List[Character]:
+        return list(self)
+
+    def names(self) -> List[str]:
+        return self._names
+
+    def rarities(self) -> List[str]:
+        return self._rarities
+
+    def index_of(self, name: str) -> Optional[int]:
+        return self._index.get(name)
+
+    def at(self, i: int) -> Character:
+        c = self._chars[i]
+        if c is None:
+            c = self._chars[i] = row_to_character(self._rows[i])
+        return c
+
+    def get(self, name: str) -> Optional[Character]:
+        i = self._index.get(name)
+        return None if i is None else self.at(i)
+
+    def display(self, name: str) -> str:
+        i = self._index.get(name)
+        return name if i is None else self._display[i]
+
+    def features(self, name: str) -> Optional[Tuple]:
+        i = self._index.get(name)
+        return None if i is None or not self._features else self._features[i]
@@ -1,28 +1,50 @@
 # infra/character_provider.py
 import json
 from pathlib import Path
-from typing import List
+from typing import List, Tuple
+from ..domain.constants import DEFAULT_RARITY, RARITY_WEIGHTS
 from ..domain.entities import Character, Skill
 
+# 纯数据行：(name, title, background, rarity, ((技能名, 描述), ...))，便于缓存/跨进程传递
+CharRow = Tuple[str, str, str, str, Tuple[Tuple[str, str], ...]]
+
+
+def row_to_character(row: CharRow) -> Character:
+    name, title, background, rarity, skills = row
+    return Character(
+        name=name,
+        title=title,
+        background=background,
+        skills=[Skill(name=n, description=d) for n, d in skills],
+        rarity=rarity,
+    )
+
 
 class CharacterProvider:
     def __init__(self, json_path: Path):
         self._path = Path(json_path)
 
-    def load_all(self) -> List[Character]:
+    def load_rows(self) -> List[CharRow]:
         data = json.loads(self._path.read_text(encoding="utf-8"))
-        out: List[Character] = []
+        out: List[CharRow] = []
         for item in data:
-            skills = [
-                Skill(name=s["name"], description=s["description"])
-                for s in item.get("skills", [])
-            ]
+            skills = tuple(
+                (s["name"], s["description"]) for s in item.get("skills", [])
+            )
+            rarity = item.get("rarity", DEFAULT_RARITY)
+            if rarity not in RARITY_WEIGHTS:
+                print(f"[SLG] 角色 {item['name']} 的稀有度 {rarity} 未知，按 {DEFAULT_RARITY} 处理")
+                rarity = DEFAULT_RARITY
             out.append(
-                Character(
-                    name=item["name"],
-                    title=item.get("title", ""),
-                    background=item.get("background", ""),
-                    skills=skills,
+                (
+                    item["name"],
+                    item.get("title", ""),
+                    item.get("background", ""),
+                    rarity,
+                    skills,
                 )
             )
         return out
+
+    def load_all(self) -> List[Character]:
+        return [row_to_character(r) for r in self.load_rows()]
@@ -1,5 +1,6 @@
 # infra/html_renderer.py
-from typing import Dict, Tuple, Optional
+from dataclasses import dataclass
+from typing import Dict, List, Tuple, Optional
 from ..domain.entities import MapGraph, MILESTONES, City
 
 # ===== 画布与样式 =====
@@ -86,31 +87,49 @@ def _label_attrs(x: int, y: int, anchor: str):
     return x + LABEL_OFFSET, y + 5, "start", 0
 
 
-def build_map_html(graph: MapGraph, get_progress, assets: Dict):
-    layers_bg = []
-    layers_edges = []
-    layers_nodes = []  # 节点与文字最后渲染，确保最上层
-
-    # 背景
-    if assets.get("bg"):
-        layers_bg.append(
-            f'<image href="{assets["bg"]}" x="0" y="0" width="{CANVAS_W}" height="{CANVAS_H}" '
-            'preserveAspectRatio="xMidYMid slice" opacity="0.85"></image>'
-        )
-    else:
-        layers_bg.append(
-            f'<rect x="0" y="0" width="{CANVAS_W}" height="{CANVAS_H}" fill="#f7f7f3"></rect>'
-        )
+BAR_SEG_W, BAR_GAP, BAR_H = 12, 2, 7
+BAR_DY = 6  # 进度条相对线段中点上移；双向线路的反向条下移同样距离
 
-    # 省名标签（可关）
-    if SHOW_PROVINCE_LABELS:
-        for p, (px, py) in PROVINCE_LABEL_POS.items():
-            layers_bg.append(
-                f'<text x="{px}" y="{py}" font-size="{FONT_SIZE}" fill="rgba(0,0,0,0.55)" font-weight="600">{p}州</text>'
-            )
 
-    # 线路与进度条：用 graph.positions
+@dataclass(frozen=True)
+class EdgeGeom:
+    """一条画出来的线路；双向线路合并成一条，两端都有箭头"""
+
+    x1: int
+    y1: int
+    x2: int
+    y2: int
+    both: bool
+
+
+@dataclass(frozen=True)
+class BarGeom:
+    """一条战线 (city, gate) 的进度条左上角坐标"""
+
+    city: str
+    gate: str
+    x: int
+    y: int
+
+
+@dataclass(frozen=True)
+class NodeGeom:
+    name: str
+    x: int
+    y: int
+    size: int
+    icon: Optional[str]
+    label_x: int
+    label_y: int
+    label_anchor: str
+
+
+def _layout(graph: MapGraph, assets: Dict):
+    """只依赖地图与素材的几何：线路（去重反向边）、进度条位置、节点与文字"""
     POS = graph.positions
+    edges: List[EdgeGeom] = []
+    bars: List[BarGeom] = []
+    seen: Dict[Tuple[str, str], int] = {}  # (a, b) -> 已画出的 edges 下标
     for city, gates in graph.lines.items():
         if city not in POS:
             continue
@@ -119,80 +138,176 @@ def build_map_html(graph: MapGraph, get_progress, assets: Dict):
             if nb not in POS:
                 continue
             x2, y2 = POS[nb]
-            layers_edges.append(
-                f'<line x1="{x1}" y1="{y1}" x2="{x2}" y2="{y2}" '
-                f'stroke="{LINE_STROKE}" stroke-width="3" stroke-linecap="round" marker-end="url(#arrow)"></line>'
-            )
-            mx, my = (x1 + x2) // 2, (y1 + y2) // 2 - 6
-            mi, pr = get_progress(city, gate)
-            seg_w, gap, h = 12, 2, 7
-            start_x = mx - (3 * seg_w + 2 * gap) // 2
-            for i in range(3):
-                active = (i < mi) or (i == mi and pr >= 100)
-                fill = PROG_ON if active else PROG_OFF
-                w = seg_w if i < mi else (int(seg_w * pr / 100) if i == mi else seg_w)
-                layers_edges.append(
-                    f'<rect x="{start_x + i * (seg_w + gap)}" y="{my - h // 2}" width="{w}" height="{h}" rx="2" '
-                    f'fill="{fill}" stroke="#374151" stroke-width="0.6" />'
-                )
+            mx, my = (x1 + x2) // 2, (y1 + y2) // 2 - BAR_DY
+            start_x = mx - (3 * BAR_SEG_W + 2 * BAR_GAP) // 2
+            rev = seen.get((nb, city))
+            if rev is not None:
+                # 反向边已画：升级为双向箭头，进度条放到线下方
+                e = edges[rev]
+                edges[rev] = EdgeGeom(e.x1, e.y1, e.x2, e.y2, True)
+                bars.append(BarGeom(city, gate, start_x, my + 2 * BAR_DY))
+                continue
+            seen[(city, nb)] = len(edges)
+            edges.append(EdgeGeom(x1, y1, x2, y2, False))
+            bars.append(BarGeom(city, gate, start_x, my))
 
-    # 城市图标与文字：同样用 POS
+    nodes: List[NodeGeom] = []
     for name, city in graph.cities.items():
         if name not in POS:
             continue
         x, y = POS[name]
-        icon = _pick_icon(city, assets)
         size = (
             ICON_SIZE_CAPITAL
             if city.capital
             else (ICON_SIZE_PASS if city.ntype == "PASS" else ICON_SIZE_NORMAL)
         )
-        half = size // 2
+        lx, ly, anchor, _ = _label_attrs(x, y, LABEL_ANCHOR.get(name, "E"))
+        nodes.append(
+            NodeGeom(name, x, y, size, _pick_icon(city, assets), lx, ly, anchor)
+        )
+    return edges, bars, nodes
 
-        if icon:
-            layers_nodes.append(
-                f'<image href="{icon}" x="{x - half}" y="{y - half}" width="{size}" height="{size}" '
-                'clip-path="inset(0 round 8)" filter="url(#nodeGlow)"></image>'
+
+def _bar_svg(b: BarGeom, mi: int, pr: int) -> str:
+    out = []
+    for i in range(3):
+        active = (i < mi) or (i == mi and pr >= 100)
+        fill = PROG_ON if active else PROG_OFF
+        w = BAR_SEG_W if i < mi else (int(BAR_SEG_W * pr / 100) if i == mi else BAR_SEG_W)
+        out.append(
+            f'<rect x="{b.x + i * (BAR_SEG_W + BAR_GAP)}" y="{b.y - BAR_H // 2}" width="{w}" height="{BAR_H}" rx="2" '
+            f'fill="{fill}" stroke="#374151" stroke-width="0.6" />'
+        )
+    return "".join(out)
+
+
+class MapHtmlRenderer:
+    """
+    静态层（背景、省名、线路、图标、城名）在构造时拼好一次；
+    render() 只生成动态覆盖层：进度条与城市提示。
+    地图或素材变了就换一个新实例（见 build_map_html 的单条缓存）。
+    """
+
+    def __init__(self, graph: MapGraph, assets: Dict):
+        self.graph = graph
+        self.assets = assets
+        self.edges, self.bars, self.nodes = _layout(graph, assets)
+
+        layers_bg = []
+        if assets.get("bg"):
+            layers_bg.append(
+                f'<image href="{assets["bg"]}" x="0" y="0" width="{CANVAS_W}" height="{CANVAS_H}" '
+                'preserveAspectRatio="xMidYMid slice" opacity="0.85"></image>'
             )
         else:
-            # 极少走到：没有图标就放一个小方块，也不画圆
-            layers_nodes.append(
-                f'<rect x="{x - half}" y="{y - half}" width="{size}" height="{size}" rx="8" ry="8" '
-                'fill="#ffffff" stroke="#111827" stroke-width="1.2" filter="url(#nodeGlow)"></rect>'
+            layers_bg.append(
+                f'<rect x="0" y="0" width="{CANVAS_W}" height="{CANVAS_H}" fill="#f7f7f3"></rect>'
             )
+        # 省名标签（可关）
+        if SHOW_PROVINCE_LABELS:
+            for p, (px, py) in PROVINCE_LABEL_POS.items():
+                layers_bg.append(
+                    f'<text x="{px}" y="{py}" font-size="{FONT_SIZE}" fill="rgba(0,0,0,0.55)" font-weight="600">{p}州</text>'
+                )
 
-        lx, ly, anchor, _ = _label_attrs(x, y, LABEL_ANCHOR.get(name, "E"))
-        layers_nodes.append(
-            f'<text x="{lx}" y="{ly}" text-anchor="{anchor}" font-size="{FONT_SIZE}" '
-            'fill="#111827" font-weight="700" paint-order="stroke fill" '
-            'stroke="rgba(255,255,255,0.95)" stroke-width="3">'
-            f"{name}</text>"
-        )
+        layers_edges = []
+        for e in self.edges:
+            start = ' marker-start="url(#arrow)"' if e.both else ""
+            layers_edges.append(
+                f'<line x1="{e.x1}" y1="{e.y1}" x2="{e.x2}" y2="{e.y2}" '
+                f'stroke="{LINE_STROKE}" stroke-width="3" stroke-linecap="round"{start} marker-end="url(#arrow)"></line>'
+            )
 
-        flines = graph.lines.get(name, {})
-        tips = []
-        for g, nb in flines.items():
-            mi, pr = get_progress(name, g)
-            tips.append(f"{g}→{nb}：{MILESTONES[mi]} {pr}%")
-        tip = _city_title(city) + ("\\n" + "\\n".join(tips) if tips else "")
-        layers_nodes.append(f"<title>{tip}</title>")
+        # 同一张图标只在 <defs> 里内联一次，各城市用 <use> 引用
+        icon_ids: Dict[str, str] = {}
+        icon_defs = []
+        for n in self.nodes:
+            if n.icon and n.icon not in icon_ids:
+                icon_ids[n.icon] = f"icon{len(icon_ids)}"
+                icon_defs.append(
+                    f'<symbol id="{icon_ids[n.icon]}" viewBox="0 0 1 1">'
+                    f'<image href="{n.icon}" x="0" y="0" width="1" height="1"></image></symbol>'
+                )
+
+        layers_nodes = []  # 节点与文字最后渲染，确保最上层
+        for n in self.nodes:
+            half = n.size // 2
+            if n.icon:
+                layers_nodes.append(
+                    f'<use href="#{icon_ids[n.icon]}" x="{n.x - half}" y="{n.y - half}" width="{n.size}" height="{n.size}" '
+                    'clip-path="inset(0 round 8)" filter="url(#nodeGlow)"></use>'
+                )
+            else:
+                # 极少走到：没有图标就放一个小方块，也不画圆
+                layers_nodes.append(
+                    f'<rect x="{n.x - half}" y="{n.y - half}" width="{n.size}" height="{n.size}" rx="8" ry="8" '
+                    'fill="#ffffff" stroke="#111827" stroke-width="1.2" filter="url(#nodeGlow)"></rect>'
+                )
+            layers_nodes.append(
+                f'<text x="{n.label_x}" y="{n.label_y}" text-anchor="{n.label_anchor}" font-size="{FONT_SIZE}" '
+                'fill="#111827" font-weight="700" paint-order="stroke fill" '
+                'stroke="rgba(255,255,255,0.95)" stroke-width="3">'
+                f"{n.name}</text>"
+            )
+
+        # 提示文字的静态部分：城市标题 + 各门邻居
+        self._tips = [
+            (
+                _city_title(graph.cities[n.name]),
+                [(g, nb) for g, nb in graph.lines.get(n.name, {}).items()],
+                n.name,
+            )
+            for n in self.nodes
+        ]
 
-    html = f"""<!doctype html>
+        self._head = f"""<!doctype html>
 <meta charset="utf-8" />
 <div style="font-family: -apple-system,Segoe UI,Roboto,Helvetica,Arial;">
   <svg width="100%" viewBox="0 0 {CANVAS_W} {CANVAS_H}">
     <defs>
-      <marker id="arrow" markerWidth="12" markerHeight="10" refX="11" refY="5" orient="auto">
+      <marker id="arrow" markerWidth="12" markerHeight="10" refX="11" refY="5" orient="auto-start-reverse">
         <path d="M0,0 L12,5 L0,10 z" fill="{ARROW_FILL}"></path>
       </marker>
       <!-- 柔和高亮，不是画圆，而是给图标加白色内发光 -->
       <filter id="nodeGlow" x="-50%" y="-50%" width="200%" height="200%">
         <feDropShadow dx="0" dy="0" stdDeviation="2.3" flood-color="#ffffff" flood-opacity="0.95"/>
       </filter>
+      {"".join(icon_defs)}
     </defs>
     <g id="bg">{"".join(layers_bg)}</g>
     <g id="edges">{"".join(layers_edges)}</g>
-    <g id="nodes">{"".join(layers_nodes)}</g>
+    <g id="progress">"""
+        self._mid = f"""</g>
+    <g id="nodes">{"".join(layers_nodes)}"""
+        self._tail = """</g>
   </svg>
 </div>"""
-    return html
+
+    def render(self, get_progress) -> str:
+        bars = "".join(_bar_svg(b, *get_progress(b.city, b.gate)) for b in self.bars)
+        tips = []
+        for title, gates, name in self._tips:
+            lines = []
+            for g, nb in gates:
+                mi, pr = get_progress(name, g)
+                lines.append(f"{g}→{nb}：{MILESTONES[mi]} {pr}%")
+            tips.append(
+                "<title>" + title + ("\\n" + "\\n".join(lines) if lines else "") + "</title>"
+            )
+        return self._head + bars + self._mid + "".join(tips) + self._tail
+
+
+_static_cache: List = [None, None, None]  # [graph, assets, renderer]，按对象身份命中
+
+
+def get_map_renderer(graph: MapGraph, assets: Dict) -> MapHtmlRenderer:
+    """同一份地图与素材只构建一次静态层；重载后传入新对象即自动重建"""
+    g, a, r = _static_cache
+    if r is None or g is not graph or a is not assets:
+        r = MapHtmlRenderer(graph, assets)
+        _static_cache[:] = [graph, assets, r]
+    return r
+
+
+def build_map_html(graph: MapGraph, get_progress, assets: Dict):
+    return get_map_renderer(graph, assets).render(get_progress)
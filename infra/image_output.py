@@ -0,0 +1,99 @@
+# infra/image_output.py
+from __future__ import annotations
+import io
+from dataclasses import dataclass
+from typing import Dict, Iterable, Optional, Tuple
+
+FORMATS = ("png", "png8", "webp", "jpeg")
+
+
+@dataclass(frozen=True)
+class OutputSpec:
+    """
+    渲染结果的编码方式：
+      png  全彩 PNG（compress_level=3，比默认 6 快一倍，体积略大）
+      png8 256 色调色板 PNG（FASTOCTREE 量化），背景为照片时体积约为全彩的 1/5
+      webp / jpeg 有损，quality 生效
+    width>0 时等比缩到该宽度（只缩不放）。
+    """
+
+    fmt: str = "png"
+    quality: int = 85
+    width: int = 0
+
+    @property
+    def mime(self) -> str:
+        return {"png": "image/png", "png8": "image/png", "webp": "image/webp", "jpeg": "image/jpeg"}[self.fmt]
+
+
+def encode(img, spec: Optional[OutputSpec] = None) -> bytes:
+    """img 为 Pillow Image（RGB/RGBA）；按 spec 缩放并编码"""
+    from PIL import Image
+
+    spec = spec or OutputSpec()
+    if spec.width and img.width > spec.width:
+        h = max(1, round(img.height * spec.width / img.width))
+        img = img.resize((spec.width, h), Image.BILINEAR, reducing_gap=2.0)
+    if img.mode != "RGB":
+        img = img.convert("RGB")
+    buf = io.BytesIO()
+    if spec.fmt == "png8":
+        img.quantize(256, method=Image.Quantize.FASTOCTREE).save(buf, "PNG")
+    elif spec.fmt == "webp":
+        img.save(buf, "WEBP", quality=spec.quality)
+    elif spec.fmt == "jpeg":
+        img.save(buf, "JPEG", quality=spec.quality)
+    else:
+        img.save(buf, "PNG", compress_level=3)
+    return buf.getvalue()
+
+
+def _parse_override(item: str) -> Optional[Tuple[str, Dict]]:
+    # "平台名=格式[,质量[,卡片宽度[,地图宽度]]]"，如 "aiocqhttp=webp,80,1024,1600"
+    if "=" not in item:
+        return None
+    name, rest = item.split("=", 1)
+    parts = [x.strip() for x in rest.split(",")]
+    if not parts or parts[0].lower() not in FORMATS:
+        return None
+    out: Dict = {"fmt": parts[0].lower()}
+    for key, val in zip(("quality", "card_width", "map_width"), parts[1:]):
+        if val:
+            out[key] = int(val)
+    return name.strip(), out
+
+
+class OutputPolicy:
+    """按平台挑选卡片/地图的输出规格；未列出的平台用全局配置"""
+
+    def __init__(
+        self,
+        fmt: str = "png",
+        quality: int = 85,
+        card_width: int = 0,
+        map_width: int = 0,
+        overrides: Iterable[str] = (),
+    ):
+        fmt = fmt if fmt in FORMATS else "png"
+        self._default = {"fmt": fmt, "quality": quality, "card_width": card_width, "map_width": map_width}
+        self._by_platform: Dict[str, Dict] = {}
+        for item in overrides or ():
+            try:
+                parsed = _parse_override(str(item))
+            except ValueError:
+                parsed = None
+            if parsed is None:
+                print(f"[SLG] 忽略无法解析的图片输出配置：{item}")
+                continue
+            self._by_platform[parsed[0]] = {**self._default, **parsed[1]}
+
+    def _conf(self, platform: Optional[str]) -> Dict:
+        return self._by_platform.get(platform or "", self._default)
+
+    def card(self, platform: Optional[str] = None) -> OutputSpec:
+        c = self._conf(platform)
+        return OutputSpec(c["fmt"], c["quality"], c["card_width"])
+
+    def map(self, platform: Optional[str] = None) -> OutputSpec:
+        c = self._conf(platform)
+        return OutputSpec(c["fmt"], c["quality"], c["map_width"])
@@ -0,0 +1,197 @@
+# infra/map_rasterizer.py
+from __future__ import annotations
+import base64
+import importlib.util
+import io
+import math
+import threading
+from pathlib import Path
+from typing import Dict, Optional, Tuple
+
+from .image_output import OutputSpec, encode
+from .html_renderer import (
+    CANVAS_W,
+    CANVAS_H,
+    FONT_SIZE,
+    PROVINCE_LABEL_POS,
+    SHOW_PROVINCE_LABELS,
+    BAR_SEG_W,
+    BAR_GAP,
+    BAR_H,
+    MapHtmlRenderer,
+)
+
+# 与 html_renderer 的 SVG 样式一一对应（rgba 字符串换成 RGBA 元组）
+LINE_RGBA = (55, 65, 81, 178)
+PROG_ON_RGB = (0x58, 0xD1, 0x7A)
+PROG_OFF_RGB = (0xD1, 0xD5, 0xDB)
+BAR_STROKE = (0x37, 0x41, 0x51)
+BG_FALLBACK = (0xF7, 0xF7, 0xF3)
+ICON_RADIUS = 8
+# 箭头按 marker 路径 12×10 原尺寸画，尖端停在图标边缘（SVG 版尖端落在图标中心被遮住）
+ARROW_LEN, ARROW_HALF = 12, 5
+
+
+def pillow_available() -> bool:
+    # 只看装没装，不真的导入 PIL
+    return importlib.util.find_spec("PIL") is not None
+
+
+def _decode_data_uri(uri: str):
+    from PIL import Image
+
+    _, b64 = uri.split(",", 1)
+    return Image.open(io.BytesIO(base64.b64decode(b64))).convert("RGBA")
+
+
+class PillowMapRasterizer:
+    """
+    用 Pillow 绘图原语在本地把地图画成 PNG，替代远程 html_render。
+    几何直接取 MapHtmlRenderer 的 edges/bars/nodes，与 HTML 版保持一致；
+    静态部分拆成两张 RGBA 底图（背景+线路、图标+城名）按渲染器实例缓存，
+    每次只画进度条再合成。
+    """
+
+    def __init__(self, font_path: Optional[Path] = None, scale: float = 2.0):
+        self._font_path = Path(font_path) if font_path else None
+        self._scale = scale
+        self._lock = threading.Lock()
+        self._static: Optional[Tuple[MapHtmlRenderer, object, object]] = None
+        self._fonts: Dict[int, object] = {}
+
+    # ---- 工具 ----
+    def _s(self, v: float) -> int:
+        return int(round(v * self._scale))
+
+    def _font(self, size: int):
+        from PIL import ImageFont
+
+        px = self._s(size)
+        f = self._fonts.get(px)
+        if f is None:
+            try:
+                if self._font_path and self._font_path.exists():
+                    f = ImageFont.truetype(str(self._font_path), px)
+                else:
+                    f = ImageFont.load_default(px)
+            except Exception:
+                f = ImageFont.load_default()
+            self._fonts[px] = f
+        return f
+
+    # ---- 静态层 ----
+    def _build_static(self, r: MapHtmlRenderer):
+        from PIL import Image, ImageDraw
+
+        W, H = self._s(CANVAS_W), self._s(CANVAS_H)
+        under = Image.new("RGBA", (W, H), BG_FALLBACK + (255,))
+        bg = r.assets.get("bg")
+        if bg:
+            im = _decode_data_uri(bg)
+            # preserveAspectRatio="xMidYMid slice"：等比铺满后居中裁切，透明度 0.85
+            k = max(W / im.width, H / im.height)
+            im = im.resize((math.ceil(im.width * k), math.ceil(im.height * k)))
+            left, top = (im.width - W) // 2, (im.height - H) // 2
+            im = im.crop((left, top, left + W, top + H))
+            im.putalpha(int(255 * 0.85))
+            under.alpha_composite(im)
+
+        d = ImageDraw.Draw(under)
+        if SHOW_PROVINCE_LABELS:
+            f = self._font(FONT_SIZE)
+            for p, (px, py) in PROVINCE_LABEL_POS.items():
+                d.text(
+                    (self._s(px), self._s(py)), f"{p}州", font=f,
+                    fill=(0, 0, 0, 140), anchor="ls",
+                )
+
+        lines = Image.new("RGBA", (W, H), (0, 0, 0, 0))
+        ld = ImageDraw.Draw(lines)
+        half = {(n.x, n.y): n.size / 2 for n in r.nodes}
+        for e in r.edges:
+            p1, p2 = (self._s(e.x1), self._s(e.y1)), (self._s(e.x2), self._s(e.y2))
+            ld.line([p1, p2], fill=LINE_RGBA, width=self._s(3))
+            self._arrow(ld, p1, p2, self._s(half.get((e.x2, e.y2), 0)))
+            if e.both:
+                self._arrow(ld, p2, p1, self._s(half.get((e.x1, e.y1), 0)))
+        under.alpha_composite(lines)
+
+        over = Image.new("RGBA", (W, H), (0, 0, 0, 0))
+        od = ImageDraw.Draw(over)
+        icons: Dict[Tuple[str, int], object] = {}
+        font = self._font(FONT_SIZE)
+        for n in r.nodes:
+            size = self._s(n.size)
+            x0, y0 = self._s(n.x) - size // 2, self._s(n.y) - size // 2
+            if n.icon:
+                key = (n.icon, size)
+                im = icons.get(key)
+                if im is None:
+                    src = _decode_data_uri(n.icon)
+                    src.thumbnail((size, size))
+                    im = Image.new("RGBA", (size, size), (0, 0, 0, 0))
+                    im.paste(src, ((size - src.width) // 2, (size - src.height) // 2))
+                    mask = Image.new("L", (size, size), 0)
+                    ImageDraw.Draw(mask).rounded_rectangle(
+                        [0, 0, size - 1, size - 1], radius=self._s(ICON_RADIUS), fill=255
+                    )
+                    alpha = Image.new("L", (size, size), 0)
+                    alpha.paste(im.getchannel("A"), mask=mask)
+                    im.putalpha(alpha)
+                    icons[key] = im
+                over.alpha_composite(im, (x0, y0))
+            else:
+                od.rounded_rectangle(
+                    [x0, y0, x0 + size, y0 + size], radius=self._s(ICON_RADIUS),
+                    fill=(255, 255, 255, 255), outline=(17, 24, 39, 255), width=1,
+                )
+            anchor = {"start": "ls", "middle": "ms", "end": "rs"}[n.label_anchor]
+            od.text(
+                (self._s(n.label_x), self._s(n.label_y)), n.name, font=font,
+                fill=(17, 24, 39, 255), anchor=anchor,
+                stroke_width=max(1, self._s(1.5)), stroke_fill=(255, 255, 255, 242),
+            )
+        return under, over
+
+    def _arrow(self, d, p1, p2, inset: float):
+        dx, dy = p2[0] - p1[0], p2[1] - p1[1]
+        ln = math.hypot(dx, dy) or 1.0
+        ux, uy = dx / ln, dy / ln
+        tx, ty = p2[0] - ux * inset, p2[1] - uy * inset
+        L, Hh = self._s(ARROW_LEN), self._s(ARROW_HALF)
+        bx, by = tx - ux * L, ty - uy * L
+        d.polygon(
+            [(tx, ty), (bx - uy * Hh, by + ux * Hh), (bx + uy * Hh, by - ux * Hh)],
+            fill=LINE_RGBA,
+        )
+
+    def _layers(self, r: MapHtmlRenderer):
+        with self._lock:
+            if self._static is None or self._static[0] is not r:
+                under, over = self._build_static(r)
+                self._static = (r, under, over)
+            return self._static[1], self._static[2]
+
+    # ---- 对外 ----
+    def render(self, r: MapHtmlRenderer, get_progress, spec: Optional[OutputSpec] = None) -> bytes:
+        """spec.width 不在这里缩放：调用方按目标宽度选 scale，直接画到目标尺寸"""
+        from PIL import ImageDraw
+
+        under, over = self._layers(r)
+        img = under.copy()
+        d = ImageDraw.Draw(img)
+        for b in r.bars:
+            mi, pr = get_progress(b.city, b.gate)
+            for i in range(3):
+                active = (i < mi) or (i == mi and pr >= 100)
+                w = BAR_SEG_W if i < mi else (int(BAR_SEG_W * pr / 100) if i == mi else BAR_SEG_W)
+                x = b.x + i * (BAR_SEG_W + BAR_GAP)
+                y = b.y - BAR_H // 2
+                d.rounded_rectangle(
+                    [self._s(x), self._s(y), self._s(x + max(w, 0.5)), self._s(y + BAR_H)],
+                    radius=self._s(2),
+                    fill=PROG_ON_RGB if active else PROG_OFF_RGB,
+                    outline=BAR_STROKE, width=1,
+                )
+        img.alpha_composite(over)
+        return encode(img, spec)
@@ -0,0 +1,59 @@
+# infra/map_render_cache.py
+from __future__ import annotations
+import asyncio
+from typing import Any, Awaitable, Callable, Dict, Hashable, Optional, Tuple
+
+
+class MapRenderCache:
+    """
+    地图渲染结果缓存：按 (variant, version) 命中，version 由战线进度版本 + 地图/素材版本组成。
+    - 命中直接复用上次的图片 URL/字节，不再拼 HTML、不再请求 html_render；
+    - single-flight：同一 version 的并发请求只渲染一次，其余等待同一个 Future。
+    """
+
+    def __init__(self):
+        self._done: Dict[str, Tuple[Hashable, Any]] = {}  # variant -> (version, value)
+        self._inflight: Dict[str, Tuple[Hashable, asyncio.Future]] = {}
+        self.hits = 0
+        self.misses = 0
+
+    def peek(self, variant: str, version: Hashable) -> Optional[Any]:
+        cur = self._done.get(variant)
+        return cur[1] if cur and cur[0] == version else None
+
+    async def get(
+        self,
+        variant: str,
+        version: Hashable,
+        render: Callable[[], Awaitable[Any]],
+    ) -> Any:
+        cur = self._done.get(variant)
+        if cur and cur[0] == version:
+            self.hits += 1
+            return cur[1]
+
+        fl = self._inflight.get(variant)
+        if fl and fl[0] == version:
+            self.hits += 1
+            return await asyncio.shield(fl[1])
+
+        self.misses += 1
+        fut = asyncio.get_running_loop().create_future()
+        # 没人等时也要取走异常，避免 "exception was never retrieved"
+        fut.add_done_callback(lambda f: f.cancelled() or f.exception())
+        self._inflight[variant] = (version, fut)
+        try:
+            value = await render()
+        except BaseException as e:
+            fut.set_exception(e)
+            raise
+        else:
+            self._done[variant] = (version, value)
+            fut.set_result(value)
+            return value
+        finally:
+            if self._inflight.get(variant, (None, None))[1] is fut:
+                self._inflight.pop(variant, None)
+
+    def invalidate(self):
+        self._done.clear()
@@ -0,0 +1,186 @@
+# infra/memprof.py
+from __future__ import annotations
+import collections
+import linecache
+import threading
+import tracemalloc
+from contextlib import contextmanager
+from typing import Deque, Dict, Iterator, List, Optional, Tuple
+
+try:
+    import resource  # 非 Windows
+except ImportError:  # pragma: no cover
+    resource = None
+
+
+def rss_peak_kb() -> Optional[int]:
+    """进程常驻内存峰值（KB）；拿不到返回 None"""
+    if resource is None:
+        return None
+    v = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return v // 1024 if v > 1 << 32 else v  # macOS 单位是字节，Linux 是 KB
+
+
+class _Gate:
+    """tracemalloc 只有一份：scope 的重叠和被重置掉的峰值都按进程算，不分是哪个 MemoryProfiler"""
+
+    lock = threading.Lock()
+    active = 0  # 进行中的 scope 数
+    entered = 0  # 累计进入过的 scope 数，用来发现中途有别的 scope 插进来
+    high = 0  # scope 重置峰值前先折进这里，traced() 的峰值仍是整段的
+
+
+class MemoryProfiler:
+    """
+    可选的内存剖析（tracemalloc）：
+      - start() 之后，每条命令（main.py 的 @timed_command）记一次 Python 堆的
+        峰值增量（命令期间最高点 - 开始时）和留存增量（结束时 - 开始时）；
+      - top() 取一次快照，按分配位置列出占用最多的行；mark() 记基线，top(diff=True) 只看基线之后的增长；
+      - 渲染峰值由 RenderFarm 在工作进程里量（见 render_farm.stats()）。
+    tracemalloc 会让分配变慢一截，所以默认关闭；关闭时 scope() 直接放行。
+    tracemalloc 的峰值和当前值都是进程级的，只有一条命令独占时才量得准：
+    scope 之间有重叠（并发交错或嵌套）时，重叠到的每一条都不记，只计入 skipped。
+    并发压测里想要完整的每命令峰值，得把命令串行跑一遍（见 tools/bench.py 的 measure_serial）。
+    """
+
+    def __init__(self, enabled: bool = False, frames: int = 1, keep: int = 256):
+        self._frames = frames
+        self._keep = keep
+        self._lock = threading.Lock()
+        self._peak: Dict[str, Deque[int]] = collections.defaultdict(lambda: collections.deque(maxlen=keep))
+        self._retained: Dict[str, int] = collections.defaultdict(int)
+        self._n: Dict[str, int] = collections.defaultdict(int)
+        self._skipped: Dict[str, int] = collections.defaultdict(int)
+        self._baseline: Optional[tracemalloc.Snapshot] = None
+        self.started_here = False
+        if enabled:
+            self.start()
+
+    @property
+    def enabled(self) -> bool:
+        return tracemalloc.is_tracing()
+
+    def start(self):
+        if not tracemalloc.is_tracing():
+            tracemalloc.start(self._frames)
+            self.started_here = True
+
+    def stop(self):
+        # 只停自己开的，别人（python -X tracemalloc）开的不动
+        if self.started_here and tracemalloc.is_tracing():
+            tracemalloc.stop()
+        self.started_here = False
+        self._baseline = None
+
+    def reset(self):
+        with self._lock:
+            self._peak.clear()
+            self._retained.clear()
+            self._n.clear()
+            self._skipped.clear()
+        with _Gate.lock:
+            _Gate.high = 0
+            if tracemalloc.is_tracing():
+                tracemalloc.reset_peak()
+        self._baseline = None
+
+    @staticmethod
+    def traced() -> Tuple[int, int]:
+        """(当前, 进程级峰值) 字节，峰值从开启或最近一次 reset() 起算；未开启为 (0, 0)"""
+        if not tracemalloc.is_tracing():
+            return (0, 0)
+        cur, peak = tracemalloc.get_traced_memory()
+        return cur, max(peak, _Gate.high)
+
+    @contextmanager
+    def scope(self, label: str) -> Iterator[None]:
+        if not tracemalloc.is_tracing():
+            yield
+            return
+        with _Gate.lock:
+            _Gate.active += 1
+            _Gate.entered += 1
+            entered = _Gate.entered
+            # 只有独占时才重置峰值：别的 scope 进行中时重置会抹掉它已经到过的最高点
+            solo = _Gate.active == 1
+            if solo:
+                cur0, peak0 = tracemalloc.get_traced_memory()
+                _Gate.high = max(_Gate.high, peak0)
+                tracemalloc.reset_peak()
+        try:
+            yield
+        finally:
+            with _Gate.lock:
+                _Gate.active -= 1
+                # 期间没有别的 scope 进来过，峰值和留存才只属于这条命令
+                clean = solo and _Gate.entered == entered and tracemalloc.is_tracing()
+                if clean:
+                    cur1, peak = tracemalloc.get_traced_memory()
+            with self._lock:
+                if clean:
+                    self._peak[label].append(max(0, peak - cur0))
+                    self._retained[label] += cur1 - cur0
+                    self._n[label] += 1
+                else:
+                    self._skipped[label] += 1
+
+    def mark(self):
+        """记下基线快照，之后 top(diff=True) 只看增长"""
+        if tracemalloc.is_tracing():
+            self._baseline = tracemalloc.take_snapshot()
+
+    def top(self, n: int = 10, diff: bool = False) -> List[Dict]:
+        """占用最多的分配位置：[{where, kb, count, code}]；diff 时 kb/count 为相对基线的增量"""
+        if not tracemalloc.is_tracing():
+            return []
+        snap = tracemalloc.take_snapshot().filter_traces(
+            (
+                tracemalloc.Filter(False, tracemalloc.__file__),
+                tracemalloc.Filter(False, linecache.__file__),
+                tracemalloc.Filter(False, "<frozen importlib._bootstrap>"),
+            )
+        )
+        if diff and self._baseline is not None:
+            stats = snap.compare_to(self._baseline, "lineno")
+            rows = [(s.traceback[0], s.size_diff, s.count_diff) for s in stats]
+            rows.sort(key=lambda r: -r[1])
+        else:
+            rows = [(s.traceback[0], s.size, s.count) for s in snap.statistics("lineno")]
+        out = []
+        for frame, size, count in rows[:n]:
+            out.append(
+                {
+                    "where": f"{_short_path(frame.filename)}:{frame.lineno}",
+                    "kb": round(size / 1024, 1),
+                    "count": count,
+                    "code": linecache.getline(frame.filename, frame.lineno).strip()[:80],
+                }
+            )
+        return out
+
+    def stats(self) -> Dict[str, Dict[str, float]]:
+        """{命令: {n, skipped, peak_kb_p50, peak_kb_max, retained_kb}}；n 为独占时量到的次数，skipped 为因重叠没记的次数"""
+        with self._lock:
+            labels = set(self._n) | set(self._skipped)
+            items = [
+                (k, sorted(self._peak.get(k, ())), self._retained.get(k, 0), self._n.get(k, 0), self._skipped.get(k, 0))
+                for k in labels
+            ]
+        out = {}
+        for label, peaks, retained, n, skipped in items:
+            out[label] = {
+                "n": n,
+                "skipped": skipped,
+                "peak_kb_p50": round(peaks[len(peaks) // 2] / 1024, 1) if peaks else 0.0,
+                "peak_kb_max": round(peaks[-1] / 1024, 1) if peaks else 0.0,
+                "retained_kb": round(retained / 1024, 1),
+            }
+        return out
+
+
+def _short_path(path: str) -> str:
+    # 插件内的文件只留包内相对路径，其余留最后两级
+    parts = path.replace("\\", "/").split("/")
+    if "astrbot_plugin_slg" in parts:
+        return "/".join(parts[parts.index("astrbot_plugin_slg") + 1 :])
+    return "/".join(parts[-2:])
@@ -0,0 +1,237 @@
+# infra/metrics.py
+from __future__ import annotations
+import asyncio
+import contextlib
+import functools
+import threading
+import time
+from bisect import bisect_left
+from functools import lru_cache
+from typing import Callable, Dict, Iterable, List, Optional, Tuple
+
+from .sql_trace import traced
+
+# 桶上界（秒）：50µs 起每档翻倍到约 52s，够覆盖 SQL 到 LLM 的量级
+BUCKETS: Tuple[float, ...] = tuple(0.00005 * 2**k for k in range(21))
+
+KINDS = ("command", "service", "sql", "llm")
+KIND_CN = {"command": "命令", "service": "服务", "sql": "SQL", "llm": "LLM"}
+
+
+class Histogram:
+    """固定桶直方图；分位数取所在桶的上界（不超过实测最大值）"""
+
+    __slots__ = ("counts", "n", "total", "max")
+
+    def __init__(self):
+        self.counts = [0] * (len(BUCKETS) + 1)
+        self.n = 0
+        self.total = 0.0
+        self.max = 0.0
+
+    def observe(self, dt: float):
+        self.counts[bisect_left(BUCKETS, dt)] += 1
+        self.n += 1
+        self.total += dt
+        if dt > self.max:
+            self.max = dt
+
+    def quantile(self, q: float) -> float:
+        if not self.n:
+            return 0.0
+        want, acc = q * self.n, 0
+        for i, c in enumerate(self.counts):
+            acc += c
+            if acc >= want:
+                return min(BUCKETS[i], self.max) if i < len(BUCKETS) else self.max
+        return self.max
+
+
+@lru_cache(maxsize=2048)
+def sql_label(sql: str) -> str:
+    """语句归一成一行、截断；参数化 SQL 的文本是常量，基数有限"""
+    s = " ".join(sql.split())
+    return s if len(s) <= 80 else s[:77] + "..."
+
+
+class Metrics:
+    """
+    进程内计时汇总：按 (类别, 名称) 聚合成直方图。
+      - command：命令处理器（main.py 里的 @timed_command）；
+      - service：领域服务的公开方法（instrument 时给实例挂计时包装）；
+      - sql：仓库连接上的每条语句与提交（连接换成 sql_trace.TracedConnection）；
+      - llm：AstrLLM.chat_json。
+    未开启时什么都不挂，调用路径与原来完全一样；命令装饰器只多一次属性判断。
+    """
+
+    def __init__(self, enabled: bool = False):
+        self.enabled = bool(enabled)
+        self._lock = threading.Lock()
+        self._h: Dict[Tuple[str, str], Histogram] = {}
+        self.started_at = time.time()
+
+    def observe(self, kind: str, name: str, dt: float):
+        with self._lock:
+            h = self._h.get((kind, name))
+            if h is None:
+                h = self._h[(kind, name)] = Histogram()
+            h.observe(dt)
+
+    def reset(self):
+        with self._lock:
+            self._h.clear()
+        self.started_at = time.time()
+
+    # ---- 挂载 ----
+    def instrument(
+        self,
+        obj,
+        kind: str = "service",
+        prefix: Optional[str] = None,
+        methods: Optional[Iterable[str]] = None,
+    ):
+        """给实例的公开方法挂计时包装（实例属性覆盖类方法）；未开启时原样返回"""
+        if not self.enabled or obj is None or getattr(obj, "_slg_timed", False):
+            return obj
+        prefix = prefix or type(obj).__name__
+        names = methods or [
+            n
+            for n, v in vars(type(obj)).items()
+            if not n.startswith("_") and callable(v) and not isinstance(v, (staticmethod, classmethod, type))
+        ]
+        for n in names:
+            fn = getattr(obj, n, None)
+            if callable(fn):
+                setattr(obj, n, self._wrap(fn, kind, f"{prefix}.{n}"))
+        obj._slg_timed = True
+        return obj
+
+    def _wrap(self, fn: Callable, kind: str, name: str) -> Callable:
+        observe = self.observe
+        if asyncio.iscoroutinefunction(fn):
+
+            @functools.wraps(fn)
+            async def awrapper(*a, **kw):
+                t0 = time.perf_counter()
+                try:
+                    return await fn(*a, **kw)
+                finally:
+                    observe(kind, name, time.perf_counter() - t0)
+
+            return awrapper
+
+        @functools.wraps(fn)
+        def wrapper(*a, **kw):
+            t0 = time.perf_counter()
+            try:
+                return fn(*a, **kw)
+            finally:
+                observe(kind, name, time.perf_counter() - t0)
+
+        return wrapper
+
+    def instrument_repo(self, repo):
+        """仓库连接换成 TracedConnection 并按语句计时；未开启时不动"""
+        if self.enabled and repo is not None:
+            observe = self.observe
+            traced(repo).add_listener(lambda sql, _p, dt: observe("sql", sql_label(sql), dt))
+        return repo
+
+    # ---- 输出 ----
+    def snapshot(self) -> Dict[str, Dict[str, Dict[str, float]]]:
+        """{类别: {名称: {n, total_s, p50_ms, p95_ms, p99_ms, max_ms}}}"""
+        with self._lock:
+            items = list(self._h.items())
+        out: Dict[str, Dict[str, Dict[str, float]]] = {}
+        for (kind, name), h in items:
+            out.setdefault(kind, {})[name] = {
+                "n": h.n,
+                "total_s": round(h.total, 4),
+                "p50_ms": round(h.quantile(0.5) * 1000, 3),
+                "p95_ms": round(h.quantile(0.95) * 1000, 3),
+                "p99_ms": round(h.quantile(0.99) * 1000, 3),
+                "max_ms": round(h.max * 1000, 3),
+            }
+        return out
+
+    def report(self, top: int = 8) -> List[str]:
+        """给 /slg 性能 用的文字摘要：每个类别按总耗时取前 top 项"""
+        snap = self.snapshot()
+        mins = (time.time() - self.started_at) / 60
+        lines = [f"统计时长 {mins:.1f} 分钟"]
+        for kind in KINDS:
+            rows = sorted(snap.get(kind, {}).items(), key=lambda kv: -kv[1]["total_s"])
+            if not rows:
+                continue
+            lines.append(f"【{KIND_CN[kind]}】共 {len(rows)} 项，按总耗时")
+            for name, s in rows[:top]:
+                lines.append(
+                    f"  {name}  n={s['n']} p50={s['p50_ms']}ms p95={s['p95_ms']}ms max={s['max_ms']}ms 总计={s['total_s']:.2f}s"
+                )
+        return lines
+
+    def prometheus(self, extra: Optional[Dict[str, float]] = None) -> str:
+        """Prometheus 文本格式；extra 为附加的 gauge（如渲染队列）"""
+        with self._lock:
+            items = sorted((k, (list(h.counts), h.n, h.total)) for k, h in self._h.items())
+        out = [
+            "# HELP slg_latency_seconds SLG plugin latency by kind and name",
+            "# TYPE slg_latency_seconds histogram",
+        ]
+        for (kind, name), (counts, n, total) in items:
+            lbl = f'kind="{kind}",name="{_esc(name)}"'
+            acc = 0
+            for ub, c in zip(BUCKETS, counts):
+                acc += c
+                out.append(f'slg_latency_seconds_bucket{{{lbl},le="{ub:g}"}} {acc}')
+            out.append(f'slg_latency_seconds_bucket{{{lbl},le="+Inf"}} {n}')
+            out.append(f"slg_latency_seconds_sum{{{lbl}}} {total:.6f}")
+            out.append(f"slg_latency_seconds_count{{{lbl}}} {n}")
+        for k, v in sorted((extra or {}).items()):
+            out.append(f"# TYPE slg_{k} gauge")
+            out.append(f"slg_{k} {v}")
+        return "\n".join(out) + "\n"
+
+
+def _esc(s: str) -> str:
+    return s.replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+def timed_command(fn):
+    """
+    命令处理器的统计入口（放在 @xxx.command 下面）：计时、SQL 追踪、内存剖析。
+    处理器是异步生成器：三样都没开时直接返回原生成器，否则包一层统计到最后一条回复发出为止。
+    functools.wraps 保留 __wrapped__，AstrBot 按原签名解析参数。
+    """
+    name = fn.__name__
+
+    @functools.wraps(fn)
+    def wrapper(self, *a, **kw):
+        c = self.container
+        m, tracer, mem = c.metrics, c.sql_tracer, c.memprof
+        if not m.enabled and tracer is None and not mem.enabled:
+            return fn(self, *a, **kw)
+        return _timed_gen(
+            fn(self, *a, **kw),
+            name,
+            m if m.enabled else None,
+            tracer,
+            mem if mem.enabled else None,
+        )
+
+    return wrapper
+
+
+async def _timed_gen(gen, name: str, m: Optional[Metrics], tracer, mem):
+    t0 = time.perf_counter()
+    with contextlib.ExitStack() as stack:
+        if tracer is not None:
+            stack.enter_context(tracer.scope(name))
+        if mem is not None:
+            stack.enter_context(mem.scope(name))
+        try:
+            async for item in gen:
+                yield item
+        finally:
+            if m is not None:
+                m.observe("command", name, time.perf_counter() - t0)
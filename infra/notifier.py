@@ -0,0 +1,169 @@
+# infra/notifier.py
+from __future__ import annotations
+import asyncio
+import heapq
+from typing import Awaitable, Callable, Dict, List, Optional, Tuple
+
+from ..domain.clock import SystemClock
+from ..domain.constants import RESOURCE_CN
+from ..domain.entities import Player
+from ..domain.ports import ClockPort
+
+SendFn = Callable[[str, str], Awaitable[None]]
+
+
+class CapacityNotifier:
+    """
+    满仓提醒：每个订阅玩家只挂一个唤醒点（最早封顶的资源），到点推送一条消息。
+    - 满仓时间由 ResourceService.full_at 闭式算出，不轮询数据库；
+    - 只有等级/余额变化时（main 里在升级、抽卡、补兵等之后调 refresh）才重算；
+    - 过期的堆条目按 seq 懒删除；
+    - 时钟可注入：模拟时钟（有 on_change）快进时会立刻唤醒循环处理到期项，不必真等。
+    """
+
+    def __init__(self, repo, res_service, clock: Optional[ClockPort] = None):
+        self._repo = repo
+        self._res = res_service
+        self._clock = clock or SystemClock()
+        if hasattr(self._clock, "on_change"):
+            self._clock.on_change(self._on_clock)
+        self._send: Optional[SendFn] = None
+        self._subs: Dict[str, str] = {}  # uid -> session
+        self._heap: List[Tuple[int, int, str]] = []  # (due, seq, uid)
+        self._due: Dict[str, Tuple[int, int]] = {}  # uid -> (due, seq)
+        self._seq = 0
+        self._task: Optional[asyncio.Task] = None
+        self._wake: Optional[asyncio.Event] = None
+        self._loaded = False
+
+    def _now(self) -> int:
+        return self._clock.now()
+
+    def _on_clock(self, _now: int):
+        if self._wake is not None:
+            self._wake.set()
+
+    def bind_sender(self, send: SendFn):
+        self._send = send
+
+    # ---- 订阅 ----
+    def _load(self):
+        if self._loaded:
+            return
+        self._loaded = True
+        for uid, session in self._repo.list_notify_subs():
+            self._subs[uid] = session
+            p = self._repo.get_player(uid)
+            if p:
+                self._schedule(p)
+
+    def is_subscribed(self, uid: str) -> bool:
+        self._load()
+        return uid in self._subs
+
+    def subscribe(self, p: Player, session: str):
+        self._load()
+        self._repo.set_notify_sub(p.user_id, session, True)
+        self._subs[p.user_id] = session
+        self._schedule(p)
+        self.start()
+
+    def unsubscribe(self, uid: str):
+        self._load()
+        self._repo.set_notify_sub(uid, None, False)
+        self._subs.pop(uid, None)
+        self._due.pop(uid, None)
+
+    def refresh(self, p: Optional[Player]):
+        """等级或余额变化后调用；未订阅的玩家直接忽略。"""
+        if p is None:
+            return
+        self._load()
+        if p.user_id not in self._subs:
+            return
+        self._schedule(p)
+        self.start()
+
+    # ---- 调度 ----
+    def _schedule(self, p: Player, after: Optional[int] = None):
+        # 只挂“未来”的封顶点；此前已封顶的资源要么提醒过，要么玩家刚看过
+        nxt = self._res.full_at(p, after=self._now() if after is None else after)
+        if nxt is None:
+            self._due.pop(p.user_id, None)
+            return
+        due = nxt[0]
+        old = self._due.get(p.user_id)
+        if old and old[0] == due:
+            return
+        self._seq += 1
+        self._due[p.user_id] = (due, self._seq)
+        heapq.heappush(self._heap, (due, self._seq, p.user_id))
+        if self._wake is not None:
+            self._wake.set()
+
+    def next_due(self) -> Optional[int]:
+        while self._heap:
+            due, seq, uid = self._heap[0]
+            if self._due.get(uid) == (due, seq):
+                return due
+            heapq.heappop(self._heap)
+        return None
+
+    async def _fire_due(self):
+        now = self._now()
+        while self._heap and self._heap[0][0] <= now:
+            due, seq, uid = heapq.heappop(self._heap)
+            if self._due.get(uid) != (due, seq):
+                continue
+            self._due.pop(uid, None)
+            p = self._repo.get_player(uid)
+            if not p or uid not in self._subs:
+                continue
+            # 按最新快照确认：只提醒在 [due, now] 之间封顶的资源
+            times = self._res.full_times(p)
+            hit = sorted((r for r, ts in times.items() if due <= ts <= now), key=times.get)
+            if hit and self._send is not None:
+                names = "、".join(RESOURCE_CN[r] for r in hit)
+                try:
+                    await self._send(
+                        self._subs[uid],
+                        f"【SLG】{names} 已满仓，继续产出将被浪费。可用 /slg 升级 或 /slg 抽卡 消耗。",
+                    )
+                except Exception as e:
+                    print(f"[SLG] notify {uid} failed: {e}")
+            # 给下一个尚未封顶的资源挂唤醒点
+            self._schedule(p, after=now)
+
+    async def _run(self):
+        self._load()
+        while True:
+            self._wake.clear()
+            due = self.next_due()
+            timeout = None if due is None else max(0, due - self._now())
+            try:
+                await asyncio.wait_for(self._wake.wait(), timeout=timeout)
+            except asyncio.TimeoutError:
+                pass
+            try:
+                await self._fire_due()
+            except Exception as e:
+                print(f"[SLG] notifier loop error: {e}")
+
+    def start(self):
+        if self._task is not None and not self._task.done():
+            return
+        try:
+            loop = asyncio.get_running_loop()
+        except RuntimeError:
+            return  # 没有事件循环（如构造期），由插件的 initialize 再启动
+        self._wake = asyncio.Event()
+        self._task = loop.create_task(self._run())
+
+    async def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except (asyncio.CancelledError, Exception):
+                pass
+            self._task = None
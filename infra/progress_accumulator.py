@@ -0,0 +1,106 @@
+# infra/progress_accumulator.py
+import asyncio
+import threading
+import time
+from typing import Dict, Optional, Tuple
+
+from ..domain.entities import MILESTONES
+from ..domain.ports import LineKey, StateRepositoryPort
+
+
+class ProgressAccumulator:
+    """
+    战线推进的内存合并写（domain.ports.LineProgressPort 的实现）：
+      - 每条 (city, gate) 首次触碰时从库里读一次，之后在内存里加锁累加（含里程碑进位），不丢更新；
+      - 脏行攒到 flush_threshold 条或距上次落库超过 flush_interval 秒时，一个事务批量写回；
+      - 有事件循环时额外挂一个 call_later 定时落库，避免最后一批推进一直停在内存里；
+      - 写库失败时脏行原样保留，等下一次触发（或定时器）重试，不会丢。
+    """
+
+    def __init__(
+        self,
+        repo: StateRepositoryPort,
+        flush_interval: float = 2.0,
+        flush_threshold: int = 256,
+    ):
+        self._repo = repo
+        self._interval = flush_interval
+        self._threshold = flush_threshold
+        self._lock = threading.RLock()
+        self._live: Dict[LineKey, Tuple[int, int]] = {}
+        self._dirty: set = set()
+        self._last_flush = time.monotonic()
+        self._timer = None
+        self.version = 0  # 任何进度变化都 +1（含未落库的）
+
+    def _load(self, key: LineKey) -> Tuple[int, int]:
+        cur = self._live.get(key)
+        if cur is None:
+            cur = self._repo.get_line(*key) or (0, 0)
+            self._live[key] = cur
+        return cur
+
+    def get(self, key: LineKey) -> Optional[Tuple[int, int]]:
+        with self._lock:
+            return self._live.get(key)
+
+    def pending(self) -> Dict[LineKey, Tuple[int, int]]:
+        with self._lock:
+            return dict(self._live)
+
+    def set(self, key: LineKey, milestone: int, progress: int):
+        with self._lock:
+            self._live[key] = (milestone, progress)
+            self._mark(key)
+
+    def push(self, key: LineKey, delta: int) -> Tuple[int, int]:
+        with self._lock:
+            mi, pr = self._load(key)
+            pr += delta
+            while pr >= 100 and mi < len(MILESTONES) - 1:
+                pr -= 100
+                mi += 1
+            pr = max(0, min(pr, 100))
+            self._live[key] = (mi, pr)
+            self._mark(key)
+            return mi, pr
+
+    def _mark(self, key: LineKey):
+        self._dirty.add(key)
+        self.version += 1
+        if (
+            len(self._dirty) >= self._threshold
+            or time.monotonic() - self._last_flush >= self._interval
+        ):
+            self._auto_flush()
+        else:
+            self._arm()
+
+    def _arm(self):
+        if self._timer is not None:
+            return
+        try:
+            loop = asyncio.get_running_loop()
+        except RuntimeError:
+            return
+        self._timer = loop.call_later(self._interval, self._auto_flush)
+
+    def _auto_flush(self):
+        # 推进命令和定时器触发的落库：失败只打日志，脏行留着，重新挂定时器再试
+        try:
+            self.flush()
+        except Exception as e:
+            print(f"[SLG] 战线进度落库失败，{len(self._dirty)} 条稍后重试：{e}")
+            self._arm()
+
+    def flush(self):
+        with self._lock:
+            if self._timer is not None:
+                self._timer.cancel()
+                self._timer = None
+            self._last_flush = time.monotonic()
+            if not self._dirty:
+                return
+            rows = [(c, g, *self._live[(c, g)]) for c, g in self._dirty]
+            self._repo.set_lines(rows)  # 抛异常时 _dirty 不动，下次重试
+            self._dirty.clear()
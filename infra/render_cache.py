@@ -0,0 +1,119 @@
+# infra/render_cache.py
+from __future__ import annotations
+import hashlib
+import json
+import os
+import threading
+from collections import OrderedDict
+from pathlib import Path
+from typing import Dict, Optional
+
+
+class RenderCache:
+    """
+    按内容寻址的渲染结果磁盘缓存：
+      - 文件名 = sha256(渲染输入)，同样的输入直接读盘，不再重画；
+      - 总字节数/文件数超限时按最近使用顺序（LRU，命中会 touch mtime）淘汰；
+      - 启动时清掉残留的 .tmp，按 mtime 重建 LRU 顺序并先收缩一次。
+    """
+
+    def __init__(
+        self,
+        root: Path,
+        max_bytes: int = 64 * 1024 * 1024,
+        max_files: int = 2000,
+        ext: str = ".png",
+    ):
+        self._root = Path(root)
+        self._max_bytes = max_bytes
+        self._max_files = max_files
+        self._ext = ext
+        self._lock = threading.Lock()
+        self._lru: "OrderedDict[str, int]" = OrderedDict()  # key -> size，旧的在前
+        self._bytes = 0
+        self.hits = 0
+        self.misses = 0
+        self._scan()
+
+    @staticmethod
+    def key(*parts) -> str:
+        """渲染输入（模板、数值、背景版本等）→ 稳定的 sha256"""
+        raw = json.dumps(parts, ensure_ascii=False, sort_keys=True, default=str)
+        return hashlib.sha256(raw.encode("utf-8")).hexdigest()
+
+    def path(self, key: str) -> Path:
+        return self._root / f"{key}{self._ext}"
+
+    def _scan(self):
+        try:
+            self._root.mkdir(parents=True, exist_ok=True)
+            files = []
+            for p in self._root.iterdir():
+                if p.name.endswith(".tmp"):
+                    p.unlink(missing_ok=True)
+                elif p.suffix == self._ext:
+                    st = p.stat()
+                    files.append((st.st_mtime_ns, p.stem, st.st_size))
+        except OSError as e:
+            print(f"[SLG] render cache scan {self._root} failed: {e}")
+            return
+        for _, k, size in sorted(files):
+            self._lru[k] = size
+            self._bytes += size
+        with self._lock:
+            self._evict()
+
+    def get(self, key: str) -> Optional[bytes]:
+        with self._lock:
+            known = key in self._lru
+            if known:
+                self._lru.move_to_end(key)
+        p = self.path(key)
+        if known:
+            try:
+                data = p.read_bytes()
+                os.utime(p)  # 重启后按 mtime 恢复 LRU 顺序
+                self.hits += 1
+                return data
+            except FileNotFoundError:  # 被外部删了
+                with self._lock:
+                    self._bytes -= self._lru.pop(key, 0)
+        self.misses += 1
+        return None
+
+    def put(self, key: str, data: bytes) -> Path:
+        p = self.path(key)
+        tmp = p.with_name(p.name + f".{threading.get_ident()}.tmp")
+        try:
+            tmp.write_bytes(data)
+            tmp.replace(p)
+        except OSError as e:
+            print(f"[SLG] render cache write {p} failed: {e}")
+            tmp.unlink(missing_ok=True)
+            return p
+        with self._lock:
+            self._bytes += len(data) - self._lru.pop(key, 0)
+            self._lru[key] = len(data)
+            self._evict()
+        return p
+
+    def _evict(self):
+        # 调用方持锁
+        while self._lru and (
+            self._bytes > self._max_bytes or len(self._lru) > self._max_files
+        ):
+            k, size = self._lru.popitem(last=False)
+            self._bytes -= size
+            try:
+                self.path(k).unlink(missing_ok=True)
+            except OSError as e:
+                print(f"[SLG] render cache evict {k} failed: {e}")
+
+    def stats(self) -> Dict[str, int]:
+        with self._lock:
+            return {
+                "files": len(self._lru),
+                "bytes": self._bytes,
+                "hits": self.hits,
+                "misses": self.misses,
+            }
@@ -0,0 +1,286 @@
+# infra/render_farm.py
+from __future__ import annotations
+import asyncio
+import collections
+import multiprocessing
+import time
+import tracemalloc
+from concurrent.futures import Executor, ProcessPoolExecutor, ThreadPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from pathlib import Path
+from typing import Dict, NamedTuple, Optional, Sequence, Tuple
+
+from ..domain.ports import MapProviderPort
+from .assets import load_assets, prune_memo
+from .card_renderer import CardRenderer
+from .card_templates import RESOURCE_CARD, CardTemplate, resource_cells, team_card, team_cells
+from .html_renderer import CANVAS_W, MapHtmlRenderer
+from .image_output import OutputSpec
+from .map_rasterizer import PillowMapRasterizer
+from .memprof import rss_peak_kb
+
+
+class RenderBusy(RuntimeError):
+    """渲染队列已满；调用方应退回文字输出"""
+
+
+class MapSource(NamedTuple):
+    """地图渲染进程自己加载地图与素材用：只传一次（进程初始化参数），不随任务 pickle"""
+
+    provider: MapProviderPort
+    picture_dir: Path
+    asset_cache_dir: Optional[Path] = None
+
+
+# ---- 工作进程（模块级函数，便于 pickle） ----
+_W: Dict[str, object] = {}
+
+
+def _init_worker(
+    picture_dir: str,
+    font_path: Optional[str],
+    map_font_path: Optional[str],
+    memprof: bool = False,
+    map_source: Optional[MapSource] = None,
+):
+    _W.clear()
+    _W["cards"] = CardRenderer(Path(picture_dir), font_path)
+    _W["map_font"] = map_font_path
+    _W["map_source"] = map_source
+    # 只在工作进程里开：一个进程同时只渲染一张，峰值不会混进别的任务
+    _W["memprof"] = memprof
+    if memprof and not tracemalloc.is_tracing():
+        tracemalloc.start()
+
+
+def _mem_begin() -> int:
+    if not _W.get("memprof"):
+        return 0
+    tracemalloc.reset_peak()
+    return tracemalloc.get_traced_memory()[0]
+
+
+def _mem_peak(base: int) -> Tuple[int, int]:
+    """(本次 Python 堆峰值增量, 工作进程 RSS 高水位 KB)；Pillow 的像素缓冲不走 tracemalloc，只能看 RSS"""
+    if not _W.get("memprof"):
+        return (0, 0)
+    return tracemalloc.get_traced_memory()[1] - base, rss_peak_kb() or 0
+
+
+def _render_card(tpl: CardTemplate, cells, spec: Optional[OutputSpec]) -> Tuple[bytes, float, Tuple[int, int]]:
+    t0, m0 = time.perf_counter(), _mem_begin()
+    data = _W["cards"].render(tpl, cells, spec)
+    return data, time.perf_counter() - t0, _mem_peak(m0)
+
+
+def map_scale(spec: Optional[OutputSpec]) -> float:
+    """目标宽度换算成绘制倍率（默认 2 倍，只缩不放）"""
+    if spec is None or not spec.width:
+        return 2.0
+    return min(2.0, spec.width / CANVAS_W)
+
+
+def _render_map(key, prog, spec: Optional[OutputSpec]) -> Tuple[bytes, float, Tuple[int, int]]:
+    # key = (地图 epoch, 素材版本)：变了才在本进程重读地图、重载素材并构建几何；静态底图按绘制倍率各缓存一份
+    t0, m0 = time.perf_counter(), _mem_begin()
+    hit = _W.get("map")
+    if hit is None or hit[0] != key:
+        _W.pop("map", None)
+        src: MapSource = _W["map_source"]
+        graph = src.provider.load()
+        # 素材换了只重编码变了的那几张，其余的 data URI 从备忘里拿
+        memo = _W.get("asset_memo", {})
+        assets = load_assets(src.picture_dir, sorted(graph.cities), src.asset_cache_dir, memo)
+        _W["asset_memo"] = prune_memo(memo, assets)
+        hit = (key, MapHtmlRenderer(graph, assets))
+        _W["map"] = hit
+    rasters = _W.setdefault("raster", {})
+    scale = map_scale(spec)
+    if scale not in rasters:
+        rasters[scale] = PillowMapRasterizer(font_path=_W["map_font"], scale=scale)
+    data = rasters[scale].render(
+        hit[1], lambda city, gate: prog.get((city, gate), (0, 0)), spec
+    )
+    return data, time.perf_counter() - t0, _mem_peak(m0)
+
+
+class _Lane:
+    """一条渲染通道：独立的进程池与排队上限，卡片不会排在秒级的地图后面"""
+
+    def __init__(self, name: str, workers: int, max_pending: int):
+        self.name = name
+        self.workers = max(0, workers)
+        self.max_pending = max(1, max_pending)
+        self.pool: Optional[Executor] = None
+        self.pending = 0
+        self.peak = 0
+        self.rejected = 0
+        self.failed = 0
+
+    def stats(self) -> Dict:
+        return {
+            "workers": self.workers,
+            "pending": self.pending,
+            "peak": self.peak,
+            "rejected": self.rejected,
+            "failed": self.failed,
+        }
+
+
+class RenderFarm:
+    """
+    图片渲染调度：Pillow 卡片与本地地图光栅化都丢到独立进程池，不和命令分发抢 GIL。
+      - 卡片和地图各走一条通道（各自的进程池与排队上限）：地图一张要上秒，不能堵住毫秒级的卡片；
+      - 每条通道排队+执行中的任务数有上限，满了直接抛 RenderBusy，由 main 退回文字/html_render；
+      - 地图进程按 map_source 自己读地图、加载素材（命中 asset_cache 的缩放结果），
+        任务只带 (epoch, 素材版本) 与进度快照，不再每次 pickle 整份 data URI；
+      - workers=0 时退化为进程内线程池（调试或不便开子进程的环境）；
+      - 记录队列深度、拒绝次数，以及按任务类型的渲染耗时与端到端耗时；
+        memprof=True 时工作进程用 tracemalloc 量每次渲染的堆峰值（需在第一次渲染前打开）。
+    卡片的磁盘缓存（CardRenderer.cache）在主进程里查/写，命中时不占用工作进程。
+    """
+
+    def __init__(
+        self,
+        cards: CardRenderer,
+        map_font_path: Optional[Path] = None,
+        workers: int = 2,
+        max_pending: int = 8,
+        memprof: bool = False,
+        map_source: Optional[MapSource] = None,
+        map_workers: int = 1,
+        map_max_pending: int = 4,
+    ):
+        self._cards = cards
+        self.memprof = memprof
+        self._map_source = map_source
+        self._init_args = (
+            str(cards.picture_dir),
+            str(cards.font_path) if cards.font_path else None,
+            str(map_font_path) if map_font_path else None,
+        )
+        self._lanes = {
+            "card": _Lane("card", workers, max_pending),
+            # 不开子进程时地图也走进程内线程
+            "map": _Lane("map", map_workers if workers > 0 else 0, map_max_pending),
+        }
+        self._render_s = collections.defaultdict(lambda: collections.deque(maxlen=256))
+        self._total_s = collections.defaultdict(lambda: collections.deque(maxlen=256))
+        self._peak_b = collections.defaultdict(lambda: collections.deque(maxlen=256))
+        self.worker_rss_kb = 0  # memprof 时工作进程上报的 RSS 高水位
+
+    def _executor(self, lane: _Lane) -> Executor:
+        if lane.pool is None:
+            if lane.workers > 0:
+                # spawn：宿主进程里已有事件循环和若干线程，fork 出来的子进程不安全
+                lane.pool = ProcessPoolExecutor(
+                    max_workers=lane.workers,
+                    mp_context=multiprocessing.get_context("spawn"),
+                    initializer=_init_worker,
+                    initargs=self._init_args + (self.memprof, self._map_source),
+                )
+            else:
+                # 进程内线程与命令共用 tracemalloc，渲染占用算进命令自己的峰值里
+                if "cards" not in _W:
+                    _init_worker(*self._init_args, map_source=self._map_source)
+                lane.pool = ThreadPoolExecutor(
+                    max_workers=2 if lane.name == "card" else 1,
+                    thread_name_prefix=f"slg-render-{lane.name}",
+                )
+        return lane.pool
+
+    async def _submit(self, kind: str, fn, *args) -> bytes:
+        lane = self._lanes[kind]
+        if lane.pending >= lane.max_pending:
+            lane.rejected += 1
+            raise RenderBusy(f"渲染繁忙（{kind} 排队 {lane.pending}）")
+        lane.pending += 1
+        lane.peak = max(lane.peak, lane.pending)
+        t0 = time.perf_counter()
+        try:
+            loop = asyncio.get_running_loop()
+            data, dt, (peak, rss) = await loop.run_in_executor(self._executor(lane), fn, *args)
+        except BrokenProcessPool:
+            # 工作进程崩了：丢掉进程池，下次重建
+            lane.failed += 1
+            lane.pool = None
+            raise
+        except Exception:
+            lane.failed += 1
+            raise
+        finally:
+            lane.pending -= 1
+        self._render_s[kind].append(dt)
+        self._total_s[kind].append(time.perf_counter() - t0)
+        if peak:
+            self._peak_b[kind].append(peak)
+            self.worker_rss_kb = max(self.worker_rss_kb, rss)
+        return data
+
+    # ---- 对外 ----
+    async def card(
+        self,
+        tpl: CardTemplate,
+        cells: Sequence[Sequence[str]],
+        spec: Optional[OutputSpec] = None,
+    ) -> bytes:
+        cache = self._cards.cache
+        key = self._cards.cache_key(tpl, cells, spec) if cache is not None else None
+        if key is not None:
+            hit = cache.get(key)
+            if hit is not None:
+                return hit
+        data = await self._submit("card", _render_card, tpl, cells, spec)
+        if key is not None:
+            cache.put(key, data)
+        return data
+
+    async def resource_card(self, s: Dict, spec: Optional[OutputSpec] = None) -> bytes:
+        return await self.card(RESOURCE_CARD, resource_cells(s), spec)
+
+    async def team_card(self, infos: Sequence[Dict], spec: Optional[OutputSpec] = None) -> bytes:
+        return await self.card(
+            team_card(tuple(i["team_no"] for i in infos)), team_cells(infos), spec
+        )
+
+    async def map_image(self, key, prog: Dict, spec: Optional[OutputSpec] = None) -> bytes:
+        """key 为 (地图 epoch, 素材版本)；prog 为 {(city, gate): (milestone, progress)} 快照"""
+        if self._map_source is None:
+            raise RuntimeError("RenderFarm 未配置 map_source")
+        return await self._submit("map", _render_map, key, prog, spec)
+
+    def stats(self) -> Dict:
+        def pct(xs, q):
+            xs = sorted(xs)
+            return round(xs[min(len(xs) - 1, int(q * len(xs)))] * 1000, 2) if xs else 0.0
+
+        lanes = {name: lane.stats() for name, lane in self._lanes.items()}
+        # 顶层是各通道合计，通道明细在各任务类型下
+        out = {
+            k: sum(ls[k] for ls in lanes.values())
+            for k in ("workers", "pending", "peak", "rejected", "failed")
+        }
+        if self.worker_rss_kb:
+            out["worker_rss_kb"] = self.worker_rss_kb
+        used = {k for k, ls in lanes.items() if ls["rejected"] or ls["failed"]}
+        for kind in sorted(used | set(self._total_s)):
+            r, t = self._render_s[kind], self._total_s[kind]
+            out[kind] = {
+                **lanes[kind],
+                "n": len(t),
+                "render_p50": pct(r, 0.5),
+                "render_p95": pct(r, 0.95),
+                "total_p50": pct(t, 0.5),
+                "total_p95": pct(t, 0.95),
+            }
+            peaks = sorted(self._peak_b[kind])
+            if peaks:
+                out[kind]["mem_peak_kb_p50"] = round(peaks[len(peaks) // 2] / 1024, 1)
+                out[kind]["mem_peak_kb_max"] = round(peaks[-1] / 1024, 1)
+        return out
+
+    def shutdown(self):
+        for lane in self._lanes.values():
+            if lane.pool is not None:
+                lane.pool.shutdown(wait=False, cancel_futures=True)
+                lane.pool = None
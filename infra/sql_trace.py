@@ -0,0 +1,238 @@
+# infra/sql_trace.py
+from __future__ import annotations
+import contextvars
+import time
+from contextlib import contextmanager
+from dataclasses import dataclass, field
+from typing import Callable, Dict, Iterator, List, Optional
+
+# (sql, 参数, 耗时秒)
+StmtListener = Callable[[str, tuple, float], None]
+
+
+class TracedConnection:
+    """
+    sqlite3.Connection 的代理：execute/executemany/executescript/commit 计时后通知监听者，
+    其余属性原样转发（with 块、row_factory、set_trace_callback 等）。
+    只计语句执行（首步），游标上的 fetch 不计；with 块的隐式提交也不计。
+    计时统计（infra.metrics）与 SQL 追踪（SqlTracer）共用这一层。
+    """
+
+    def __init__(self, conn):
+        object.__setattr__(self, "_raw", conn)
+        object.__setattr__(self, "_listeners", [])
+
+    @property
+    def raw(self):
+        return self._raw
+
+    def add_listener(self, fn: StmtListener):
+        self._listeners.append(fn)
+
+    def _emit(self, sql: str, params, dt: float):
+        for fn in self._listeners:
+            fn(sql, params, dt)
+
+    def execute(self, sql, params=()):
+        t0 = time.perf_counter()
+        try:
+            return self._raw.execute(sql, params)
+        finally:
+            self._emit(sql, params, time.perf_counter() - t0)
+
+    def executemany(self, sql, seq):
+        t0 = time.perf_counter()
+        try:
+            return self._raw.executemany(sql, seq)
+        finally:
+            self._emit(sql, (), time.perf_counter() - t0)
+
+    def executescript(self, script):
+        t0 = time.perf_counter()
+        try:
+            return self._raw.executescript(script)
+        finally:
+            self._emit("<script>", (), time.perf_counter() - t0)
+
+    def commit(self):
+        t0 = time.perf_counter()
+        try:
+            return self._raw.commit()
+        finally:
+            self._emit("COMMIT", (), time.perf_counter() - t0)
+
+    def __enter__(self):
+        return self._raw.__enter__()
+
+    def __exit__(self, *exc):
+        return self._raw.__exit__(*exc)
+
+    def __getattr__(self, name):
+        return getattr(self._raw, name)
+
+    def __setattr__(self, name, value):
+        setattr(self._raw, name, value)
+
+
+def traced(repo) -> TracedConnection:
+    """把仓库的 _conn 换成 TracedConnection（已换过则原样返回）"""
+    conn = repo._conn
+    if not isinstance(conn, TracedConnection):
+        conn = TracedConnection(conn)
+        repo._conn = conn
+    return conn
+
+
+def _one_line(sql: str, width: int = 160) -> str:
+    s = " ".join(sql.split())
+    return s if len(s) <= width else s[: width - 3] + "..."
+
+
+@dataclass
+class QueryScope:
+    """一次命令（或一段代码）里执行的 SQL"""
+
+    label: str
+    count: int = 0
+    time_s: float = 0.0
+    statements: Optional[List[str]] = None  # capture=True 时记下每条语句
+
+
+@dataclass
+class ScopeStats:
+    n: int = 0
+    queries: int = 0
+    max_queries: int = 0
+    time_s: float = 0.0
+    counts: List[int] = field(default_factory=list)
+
+
+# 当前作用域；trace 回调在执行 SQL 的线程/任务里同步触发，asyncio.to_thread 会带上上下文
+_SCOPE: contextvars.ContextVar[Optional[QueryScope]] = contextvars.ContextVar(
+    "slg_sql_scope", default=None
+)
+
+
+class QueryBudgetExceeded(AssertionError):
+    """某段代码执行的 SQL 条数超出预算"""
+
+
+class SqlTracer:
+    """
+    SQL 追踪：
+      - 条数用 set_trace_callback 统计（能看到 executemany 的每一行和隐式 BEGIN/COMMIT），
+        记到当前 scope(label) 上，并按 label 汇总；
+      - 耗时由 TracedConnection 计；超过 slow_ms 的语句连同 EXPLAIN QUERY PLAN 交给 log。
+    一个连接只能有一个 trace 回调，所以每个连接只挂一个 SqlTracer。
+    """
+
+    def __init__(
+        self,
+        slow_ms: float = 50.0,
+        explain: bool = True,
+        log: Callable[[str], None] = print,
+        keep_counts: bool = False,
+    ):
+        self.slow_ms = slow_ms
+        self.explain = explain
+        self.log = log
+        self.keep_counts = keep_counts  # 保留每次的条数（压测算分位数用）
+        self.by_label: Dict[str, ScopeStats] = {}
+        self.slow: List[Dict] = []
+        self._conns: List[TracedConnection] = []
+
+    def attach(self, repo) -> TracedConnection:
+        conn = traced(repo)
+        conn.set_trace_callback(self._on_trace)
+        conn.add_listener(lambda sql, params, dt, c=conn: self._on_stmt(c, sql, params, dt))
+        self._conns.append(conn)
+        return conn
+
+    def detach(self):
+        for c in self._conns:
+            c.set_trace_callback(None)
+        self._conns.clear()
+
+    def _on_trace(self, stmt: str):
+        sc = _SCOPE.get()
+        if sc is not None:
+            sc.count += 1
+            if sc.statements is not None:
+                sc.statements.append(stmt)
+
+    def _on_stmt(self, conn: TracedConnection, sql: str, params, dt: float):
+        sc = _SCOPE.get()
+        if sc is not None:
+            sc.time_s += dt
+        if self.slow_ms is not None and dt * 1000 >= self.slow_ms:
+            self._log_slow(conn, sql, params, dt, sc)
+
+    def _log_slow(self, conn: TracedConnection, sql: str, params, dt: float, sc):
+        plan: List[str] = []
+        if self.explain and sql not in ("COMMIT", "<script>"):
+            try:
+                # 直接用底层连接，免得 EXPLAIN 自己也被追踪
+                rows = conn.raw.execute("EXPLAIN QUERY PLAN " + sql, params or ()).fetchall()
+                plan = [str(r[-1]) for r in rows]
+            except Exception as e:
+                plan = [f"(EXPLAIN 失败：{e})"]
+        rec = {
+            "label": sc.label if sc else None,
+            "ms": round(dt * 1000, 2),
+            "sql": _one_line(sql),
+            "plan": plan,
+        }
+        if len(self.slow) < 200:
+            self.slow.append(rec)
+        self.log(
+            f"[SLG] 慢查询 {rec['ms']}ms [{rec['label'] or '-'}] {rec['sql']}"
+            + "".join(f"\n    {p}" for p in plan)
+        )
+
+    @contextmanager
+    def scope(self, label: str, capture: bool = False) -> Iterator[QueryScope]:
+        sc = QueryScope(label, statements=[] if capture else None)
+        token = _SCOPE.set(sc)
+        try:
+            yield sc
+        finally:
+            _SCOPE.reset(token)
+            st = self.by_label.get(label)
+            if st is None:
+                st = self.by_label[label] = ScopeStats()
+            st.n += 1
+            st.queries += sc.count
+            st.max_queries = max(st.max_queries, sc.count)
+            st.time_s += sc.time_s
+            if self.keep_counts:
+                st.counts.append(sc.count)
+
+    def reset(self):
+        self.by_label.clear()
+        self.slow.clear()
+
+    def stats(self) -> Dict[str, Dict[str, float]]:
+        return {
+            label: {
+                "n": s.n,
+                "queries_mean": round(s.queries / s.n, 2) if s.n else 0.0,
+                "queries_max": s.max_queries,
+                "sql_ms_mean": round(s.time_s / s.n * 1000, 3) if s.n else 0.0,
+            }
+            for label, s in self.by_label.items()
+        }
+
+
+@contextmanager
+def assert_max_queries(tracer: SqlTracer, limit: int, label: str = "assert") -> Iterator[QueryScope]:
+    """
+    块内执行的 SQL 超过 limit 条就抛 QueryBudgetExceeded（列出执行过的语句）：
+
+        with assert_max_queries(tracer, 5, "资源"):
+            ...
+    """
+    with tracer.scope(label, capture=True) as sc:
+        yield sc
+    if sc.count > limit:
+        listing = "\n".join(f"  {i + 1}. {_one_line(s, 120)}" for i, s in enumerate(sc.statements or ()))
+        raise QueryBudgetExceeded(f"{label}：执行了 {sc.count} 条 SQL，预算 {limit}\n{listing}")
@@ -1,10 +1,10 @@
 # infra/sqlite_player_repo.py
 import sqlite3
-import time
 from pathlib import Path
-from typing import Optional
+from typing import Dict, Iterable, Optional
+from ..domain.clock import SystemClock
 from ..domain.entities import Player
-from ..domain.ports import PlayerRepositoryPort
+from ..domain.ports import ClockPort, PlayerRepositoryPort
 from dataclasses import fields  # 导入 fields 函数
 import json
 
@@ -17,6 +17,8 @@ CREATE TABLE IF NOT EXISTS players(
   grain INTEGER, gold INTEGER, stone INTEGER, troops INTEGER,
   farm_level INTEGER, bank_level INTEGER, quarry_level INTEGER, barracks_level INTEGER,
   draw_count INTEGER DEFAULT 0,
+  pity INTEGER DEFAULT 0,
+  owned_bits BLOB,
   base_city TEXT,
   base_x INTEGER,
   base_y INTEGER,
@@ -31,6 +33,13 @@ CREATE TABLE IF NOT EXISTS player_chars(
   PRIMARY KEY(user_id, name)
 );
 """
+# 角色 → 稳定的整数下标（只增不改），owned_bits 的第 idx 位表示拥有该角色
+DDL_CHAR_INDEX = """
+CREATE TABLE IF NOT EXISTS char_index(
+  name TEXT PRIMARY KEY,
+  idx INTEGER NOT NULL UNIQUE
+);
+"""
 
 DDL_TEAMS = """
 CREATE TABLE IF NOT EXISTS teams(
@@ -98,18 +107,29 @@ CREATE TABLE IF NOT EXISTS siege_participants(
 );
 """
 
+DDL_NOTIFY_SUBS = """
+CREATE TABLE IF NOT EXISTS notify_subs(
+  user_id TEXT PRIMARY KEY,
+  session TEXT,              -- unified_msg_origin，推送目标会话
+  enabled INTEGER DEFAULT 1
+);
+"""
+
 
 class SQLitePlayerRepository(PlayerRepositoryPort):
-    def __init__(self, db_path: Path):
+    def __init__(self, db_path: Path, clock: Optional[ClockPort] = None):
         self._db_path = Path(db_path)
+        self._clock = clock or SystemClock()
         self._db_path.parent.mkdir(parents=True, exist_ok=True)
         self._conn = sqlite3.connect(str(self._db_path))
         self._conn.row_factory = sqlite3.Row
         self._conn.execute("PRAGMA journal_mode=WAL;")
+        self._char_idx: Optional[Dict[str, int]] = None
 
     def init_schema(self) -> None:
         self._conn.execute(DDL_PLAYERS)
         self._conn.execute(DDL_CHARS)
+        self._conn.execute(DDL_CHAR_INDEX)
         self._conn.execute(DDL_TEAMS)
         self._conn.execute(DDL_TEAM_SLOTS)
         self._conn.execute(DDL_ALLIANCES)
@@ -119,6 +139,9 @@ class SQLitePlayerRepository(PlayerRepositoryPort):
         self._conn.execute(DDL_SIEGES)
         self._conn.execute(DDL_SIEGE_PARTS)
 
+        # 满仓提醒订阅
+        self._conn.execute(DDL_NOTIFY_SUBS)
+
         # players 表列迁移（之前已加过）
         cols = {
             r[1] for r in self._conn.execute("PRAGMA table_info(players)").fetchall()
@@ -127,6 +150,11 @@ class SQLitePlayerRepository(PlayerRepositoryPort):
             self._conn.execute(
                 "ALTER TABLE players ADD COLUMN draw_count INTEGER DEFAULT 0;"
             )
+        if "pity" not in cols:
+            self._conn.execute("ALTER TABLE players ADD COLUMN pity INTEGER DEFAULT 0;")
+        if "owned_bits" not in cols:
+            self._conn.execute("ALTER TABLE players ADD COLUMN owned_bits BLOB;")
+            self._migrate_owned_bits()
         if "base_city" not in cols:
             self._conn.execute("ALTER TABLE players ADD COLUMN base_city TEXT;")
         if "base_x" not in cols:
@@ -167,7 +195,7 @@ class SQLitePlayerRepository(PlayerRepositoryPort):
         return 0 if not r or r[0] is None else int(r[0])
 
     def set_last_move_at(self, user_id: str, ts: int | None = None):
-        ts = int(ts or time.time())
+        ts = int(ts or self._clock.now())
         self._conn.execute(
             "UPDATE players SET last_move_at=? WHERE user_id=?", (ts, user_id)
         )
@@ -180,6 +208,7 @@ class SQLitePlayerRepository(PlayerRepositoryPort):
             return None
         d = dict(row)
         d.setdefault("draw_count", 0)
+        d["pity"] = d.get("pity") or 0
         d.setdefault("base_city", None)
         d.setdefault("base_x", None)
         d.setdefault("base_y", None)
@@ -194,12 +223,16 @@ class SQLitePlayerRepository(PlayerRepositoryPort):
         return Player(**filtered_d)
 
     def upsert_player(self, p: Player) -> None:
+        self._upsert_player(p)
+        self._conn.commit()
+
+    def _upsert_player(self, p: Player) -> None:
         self._conn.execute(
             """
         INSERT INTO players(user_id,nickname,created_at,last_tick,grain,gold,stone,troops,
-                            farm_level,bank_level,quarry_level,barracks_level,draw_count,
+                            farm_level,bank_level,quarry_level,barracks_level,draw_count,pity,
                             base_city,base_x,base_y,last_move_at)
-        VALUES(?,?,?,?,?,?,?,?,?,?,?,?,?,?,?,?,?)
+        VALUES(?,?,?,?,?,?,?,?,?,?,?,?,?,?,?,?,?,?)
         ON CONFLICT(user_id) DO UPDATE SET
           nickname=excluded.nickname,
           last_tick=excluded.last_tick,
@@ -207,6 +240,7 @@ class SQLitePlayerRepository(PlayerRepositoryPort):
           farm_level=excluded.farm_level, bank_level=excluded.bank_level,
           quarry_level=excluded.quarry_level, barracks_level=excluded.barracks_level,
           draw_count=excluded.draw_count,
+          pity=excluded.pity,
           base_city=excluded.base_city,
           base_x=excluded.base_x,
           base_y=excluded.base_y,
@@ -226,15 +260,100 @@ class SQLitePlayerRepository(PlayerRepositoryPort):
                 p.quarry_level,
                 p.barracks_level,
                 p.draw_count,
+                getattr(p, "pity", 0),
                 getattr(p, "base_city", None),
                 getattr(p, "base_x", None),
                 getattr(p, "base_y", None),
                 getattr(p, "last_move_at", 0),
             ),
         )
-        self._conn.commit()
+
+    def apply_draws(
+        self, p: Player, names: Iterable[str], owned_bits: Optional[int] = None
+    ) -> None:
+        """
+        抽卡结果（玩家余额/抽数 + 新角色 + 位图）一个事务写入。
+        新角色用一条多行 INSERT；调用方刚读过位图就传 owned_bits，省掉再查一次。
+        """
+        names = list(names)
+        self.ensure_char_index(names)
+        with self._conn:
+            self._upsert_player(p)
+            if names:
+                self._conn.execute(
+                    "INSERT OR IGNORE INTO player_chars(user_id,name,level) VALUES "
+                    + ",".join(["(?,?,1)"] * len(names)),
+                    [x for n in names for x in (p.user_id, n)],
+                )
+            self._or_owned_bits(p.user_id, names, owned_bits)
 
     # === 角色收集/等级 ===
+    # player_chars 仍存等级；“拥有哪些角色”以 players.owned_bits 位图为准，两者同事务写入
+    @staticmethod
+    def _bits_to_blob(bits: int) -> bytes:
+        return bits.to_bytes((bits.bit_length() + 7) // 8, "little")
+
+    def _index(self) -> Dict[str, int]:
+        if self._char_idx is None:
+            self._char_idx = {
+                r[0]: r[1]
+                for r in self._conn.execute("SELECT name, idx FROM char_index")
+            }
+        return self._char_idx
+
+    def ensure_char_index(self, names: Iterable[str]) -> Dict[str, int]:
+        """给没编号的角色追加下标（已有的永不改动），返回完整映射"""
+        idx = self._index()
+        new = [n for n in dict.fromkeys(names) if n not in idx]
+        if new:
+            nxt = max(idx.values(), default=-1) + 1
+            rows = [(n, nxt + i) for i, n in enumerate(new)]
+            with self._conn:
+                self._conn.executemany(
+                    "INSERT INTO char_index(name, idx) VALUES(?,?)", rows
+                )
+            idx.update(rows)
+        return dict(idx)
+
+    def _migrate_owned_bits(self):
+        # 老库：按 player_chars 给每个玩家生成位图
+        names = [
+            r[0]
+            for r in self._conn.execute(
+                "SELECT DISTINCT name FROM player_chars ORDER BY name"
+            )
+        ]
+        idx = self.ensure_char_index(names)
+        bits: Dict[str, int] = {}
+        for uid, name in self._conn.execute("SELECT user_id, name FROM player_chars"):
+            bits[uid] = bits.get(uid, 0) | (1 << idx[name])
+        self._conn.executemany(
+            "UPDATE players SET owned_bits=? WHERE user_id=?",
+            [(self._bits_to_blob(b), uid) for uid, b in bits.items()],
+        )
+
+    def get_owned_bits(self, user_id: str) -> int:
+        r = self._conn.execute(
+            "SELECT owned_bits FROM players WHERE user_id=?", (user_id,)
+        ).fetchone()
+        return int.from_bytes(r[0], "little") if r and r[0] else 0
+
+    def _or_owned_bits(
+        self, user_id: str, names: Iterable[str], bits: Optional[int] = None
+    ) -> None:
+        # 调用方需先 ensure_char_index（它自带提交，不能嵌在外层事务里）
+        idx = self._index()
+        mask = 0
+        for n in names:
+            mask |= 1 << idx[n]
+        if bits is None:
+            bits = self.get_owned_bits(user_id)
+        bits |= mask
+        self._conn.execute(
+            "UPDATE players SET owned_bits=? WHERE user_id=?",
+            (self._bits_to_blob(bits), user_id),
+        )
+
     def list_owned_char_names(self, user_id: str):
         cur = self._conn.execute(
             "SELECT name FROM player_chars WHERE user_id=?", (user_id,)
@@ -242,18 +361,17 @@ class SQLitePlayerRepository(PlayerRepositoryPort):
         return [r[0] for r in cur.fetchall()]
 
     def has_char(self, user_id: str, name: str) -> bool:
-        cur = self._conn.execute(
-            "SELECT 1 FROM player_chars WHERE user_id=? AND name=? LIMIT 1",
-            (user_id, name),
-        )
-        return cur.fetchone() is not None
+        i = self._index().get(name)
+        return i is not None and bool(self.get_owned_bits(user_id) >> i & 1)
 
     def add_char(self, user_id: str, name: str, level: int = 1) -> None:
-        self._conn.execute(
-            "INSERT OR IGNORE INTO player_chars(user_id,name,level) VALUES(?,?,?)",
-            (user_id, name, level),
-        )
-        self._conn.commit()
+        self.ensure_char_index([name])
+        with self._conn:
+            self._conn.execute(
+                "INSERT OR IGNORE INTO player_chars(user_id,name,level) VALUES(?,?,?)",
+                (user_id, name, level),
+            )
+            self._or_owned_bits(user_id, [name])
 
     def get_char_level(self, user_id: str, name: str):
         cur = self._conn.execute(
@@ -271,18 +389,26 @@ class SQLitePlayerRepository(PlayerRepositoryPort):
 
     # === 队伍 ===
     def ensure_teams(self, user_id: str, team_count: int, slots: int):
-        # 创建 1..team_count 的 team 与 1..slots 的空位
-        for t in range(1, team_count + 1):
+        # 创建 1..team_count 的 team 与 1..slots 的空位；几乎每条命令都会调，已建好时只查一次
+        have = self._conn.execute(
+            "SELECT COUNT(1) FROM team_slots WHERE user_id=?", (user_id,)
+        ).fetchone()[0]
+        if have >= team_count * slots:
+            return
+        teams = [(user_id, t) for t in range(1, team_count + 1)]
+        cells = [(user_id, t, i) for t in range(1, team_count + 1) for i in range(1, slots + 1)]
+        with self._conn:
+            # 各一条多行 INSERT
             self._conn.execute(
-                "INSERT OR IGNORE INTO teams(user_id,team_no,soldiers) VALUES(?,?,0)",
-                (user_id, t),
+                "INSERT OR IGNORE INTO teams(user_id,team_no,soldiers) VALUES "
+                + ",".join(["(?,?,0)"] * len(teams)),
+                [x for row in teams for x in row],
+            )
+            self._conn.execute(
+                "INSERT OR IGNORE INTO team_slots(user_id,team_no,slot_idx,char_name) VALUES "
+                + ",".join(["(?,?,?,NULL)"] * len(cells)),
+                [x for row in cells for x in row],
             )
-            for s in range(1, slots + 1):
-                self._conn.execute(
-                    "INSERT OR IGNORE INTO team_slots(user_id,team_no,slot_idx,char_name) VALUES(?,?,?,NULL)",
-                    (user_id, t, s),
-                )
-        self._conn.commit()
 
     def list_team_slots(self, user_id: str, team_no: int):
         cur = self._conn.execute(
@@ -291,6 +417,45 @@ class SQLitePlayerRepository(PlayerRepositoryPort):
         )
         return [(int(r[0]), r[1]) for r in cur.fetchall()]
 
+    def list_team_members(self, user_id: str, team_no: int | None = None):
+        """[(team_no, slot_idx, char_name, level)]，角色等级一并 JOIN 出来（空位 level 为 None）"""
+        sql = (
+            "SELECT s.team_no, s.slot_idx, s.char_name, pc.level FROM team_slots s "
+            "LEFT JOIN player_chars pc ON pc.user_id=s.user_id AND pc.name=s.char_name "
+            "WHERE s.user_id=?"
+        )
+        args: tuple = (user_id,)
+        if team_no is not None:
+            sql += " AND s.team_no=?"
+            args += (team_no,)
+        cur = self._conn.execute(sql + " ORDER BY s.team_no, s.slot_idx", args)
+        return [
+            (int(r[0]), int(r[1]), r[2], None if r[3] is None else int(r[3]))
+            for r in cur.fetchall()
+        ]
+
+    def team_level_sums(self, user_ids: Iterable[str], team_no: int = 1) -> Dict[str, int]:
+        """多名玩家某支队伍的上阵角色等级和（没有等级记录的按 1 级），一次查完"""
+        uids = list(dict.fromkeys(user_ids))
+        out = dict.fromkeys(uids, 0)
+        for i in range(0, len(uids), 500):
+            chunk = uids[i : i + 500]
+            cur = self._conn.execute(
+                "SELECT s.user_id, SUM(COALESCE(pc.level, 1)) FROM team_slots s "
+                "LEFT JOIN player_chars pc ON pc.user_id=s.user_id AND pc.name=s.char_name "
+                f"WHERE s.team_no=? AND s.char_name IS NOT NULL AND s.user_id IN ({','.join('?' * len(chunk))}) "
+                "GROUP BY s.user_id",
+                (team_no, *chunk),
+            )
+            out.update((r[0], int(r[1])) for r in cur.fetchall())
+        return out
+
+    def list_team_soldiers(self, user_id: str) -> Dict[int, int]:
+        cur = self._conn.execute(
+            "SELECT team_no, soldiers FROM teams WHERE user_id=?", (user_id,)
+        )
+        return {int(r[0]): int(r[1]) for r in cur.fetchall()}
+
     def set_team_slot(
         self, user_id: str, team_no: int, slot_idx: int, char_name: str | None
     ):
@@ -416,7 +581,7 @@ class SQLitePlayerRepository(PlayerRepositoryPort):
                 city_level,
                 start_at,
                 created_by,
-                int(time.time()),
+                self._clock.now(),
                 "scheduled",
                 None,
             ),
@@ -476,7 +641,7 @@ class SQLitePlayerRepository(PlayerRepositoryPort):
                 json.dumps(path, ensure_ascii=False),
                 int(hops),
                 int(eta),
-                int(time.time()),
+                self._clock.now(),
             ),
         )
         self._conn.commit()
@@ -499,3 +664,19 @@ class SQLitePlayerRepository(PlayerRepositoryPort):
                 }
             )
         return out
+
+    # === 满仓提醒订阅 ===
+    def set_notify_sub(self, user_id: str, session: str | None, enabled: bool):
+        self._conn.execute(
+            "INSERT INTO notify_subs(user_id,session,enabled) VALUES(?,?,?) "
+            "ON CONFLICT(user_id) DO UPDATE SET "
+            "session=COALESCE(excluded.session, notify_subs.session), enabled=excluded.enabled",
+            (user_id, session, 1 if enabled else 0),
+        )
+        self._conn.commit()
+
+    def list_notify_subs(self):
+        cur = self._conn.execute(
+            "SELECT user_id, session FROM notify_subs WHERE enabled=1 AND session IS NOT NULL"
+        )
+        return [(r[0], r[1]) for r in cur.fetchall()]
@@ -1,7 +1,7 @@
 # infra/sqlite_repo.py
 import sqlite3
 from pathlib import Path
-from typing import Optional
+from typing import Dict, Iterable, Optional, Tuple
 from ..domain.ports import StateRepositoryPort
 
 
@@ -9,7 +9,8 @@ class SQLiteStateRepository(StateRepositoryPort):
     def __init__(self, db_path: Path):
         self._db_path = Path(db_path)
         self._db_path.parent.mkdir(parents=True, exist_ok=True)
-        self._conn = sqlite3.connect(str(self._db_path))
+        # 战线累加器可能在非事件循环线程里落库；写入由累加器加锁串行
+        self._conn = sqlite3.connect(str(self._db_path), check_same_thread=False)
         self._conn.execute("PRAGMA journal_mode=WAL;")
 
     def init_schema(self) -> None:
@@ -19,8 +20,45 @@ class SQLiteStateRepository(StateRepositoryPort):
             v TEXT
         );
         """)
+        self._conn.execute("""
+        CREATE TABLE IF NOT EXISTS line_progress (
+            city TEXT,
+            gate TEXT,
+            milestone INTEGER DEFAULT 0,
+            progress INTEGER DEFAULT 0,
+            version INTEGER DEFAULT 0,
+            PRIMARY KEY(city, gate)
+        );
+        """)
+        self._migrate_kv_lines()
         self._conn.commit()
 
+    def _migrate_kv_lines(self) -> None:
+        # 旧数据：kv 里的 line:{city}:{gate}:milestone / :progress 两行 -> line_progress 一行
+        rows = self._conn.execute(
+            "SELECT k, v FROM kv WHERE k LIKE 'line:%:milestone' OR k LIKE 'line:%:progress'"
+        ).fetchall()
+        if not rows:
+            return
+        merged: Dict[Tuple[str, str], Dict[str, int]] = {}
+        for k, v in rows:
+            try:
+                _, city, gate, field = k.split(":", 3)
+                merged.setdefault((city, gate), {})[field] = int(v)
+            except Exception:
+                continue
+        with self._conn:
+            self._conn.executemany(
+                "INSERT OR IGNORE INTO line_progress(city, gate, milestone, progress, version) "
+                "VALUES(?, ?, ?, ?, 1)",
+                [
+                    (city, gate, d.get("milestone", 0), d.get("progress", 0))
+                    for (city, gate), d in merged.items()
+                ],
+            )
+            self._conn.executemany("DELETE FROM kv WHERE k=?", [(r[0],) for r in rows])
+        print(f"[SLG] migrated {len(merged)} line progress rows from kv")
+
     def get(self, key: str) -> Optional[str]:
         cur = self._conn.execute("SELECT v FROM kv WHERE k=?", (key,))
         row = cur.fetchone()
@@ -33,6 +71,38 @@ class SQLiteStateRepository(StateRepositoryPort):
         )
         self._conn.commit()
 
+    # === 战线进度 ===
+    def get_line(self, city: str, gate: str) -> Optional[Tuple[int, int]]:
+        cur = self._conn.execute(
+            "SELECT milestone, progress FROM line_progress WHERE city=? AND gate=?",
+            (city, gate),
+        )
+        row = cur.fetchone()
+        return (int(row[0]), int(row[1])) if row else None
+
+    def all_lines(self) -> Dict[Tuple[str, str], Tuple[int, int]]:
+        cur = self._conn.execute("SELECT city, gate, milestone, progress FROM line_progress")
+        return {(r[0], r[1]): (int(r[2]), int(r[3])) for r in cur.fetchall()}
+
+    def set_line(self, city: str, gate: str, milestone: int, progress: int) -> None:
+        self._conn.execute(
+            "INSERT INTO line_progress(city, gate, milestone, progress, version) VALUES(?, ?, ?, ?, 1) "
+            "ON CONFLICT(city, gate) DO UPDATE SET milestone=excluded.milestone, "
+            "progress=excluded.progress, version=line_progress.version+1;",
+            (city, gate, milestone, progress),
+        )
+        self._conn.commit()
+
+    def set_lines(self, rows: Iterable[Tuple[str, str, int, int]]) -> None:
+        """批量写回 (city, gate, milestone, progress)，一个事务"""
+        with self._conn:
+            self._conn.executemany(
+                "INSERT INTO line_progress(city, gate, milestone, progress, version) VALUES(?, ?, ?, ?, 1) "
+                "ON CONFLICT(city, gate) DO UPDATE SET milestone=excluded.milestone, "
+                "progress=excluded.progress, version=line_progress.version+1;",
+                list(rows),
+            )
+
     def close(self) -> None:
         try:
             self._conn.close()
@@ -1,12 +1,16 @@
 # main.py
-from astrbot.api.event import filter, AstrMessageEvent
+from astrbot.api.event import filter, AstrMessageEvent, MessageChain
 from astrbot.api.star import Context, Star, register
+import astrbot.api.message_components as Comp
 from datetime import datetime, timedelta
+import asyncio
 import time
-import tempfile
-from pathlib import Path
 
 from .app.container import build_container
+from .infra.card_templates import RESOURCE_CARD, card_text, member_str, resource_cells
+from .infra.memprof import rss_peak_kb
+from .infra.metrics import timed_command
+from .infra.render_farm import RenderBusy
 from .domain.constants import (
     BUILDING_ALIASES,
     BUILDING_TO_RESOURCE,
@@ -15,7 +19,9 @@ from .domain.constants import (
     UPGRADE_STONE_COST,
     UPGRADE_RESOURCE_COST,
     MAX_LEVEL,
+    PITY_THRESHOLD,
 )
+from .domain.services_gacha import TOP_RARITY
 
 
 @register("astrbot_plugin_slg", "xunxiing", "SLG Map + Resource", "1.3.16", "https://github.com/xunxiing/astrbot_plugin_slg")
@@ -29,6 +35,21 @@ class HexPipelinePlugin(Star):
         self.pipe = self.container.pipeline
         self.hooks = self.container.hookbus
         self.res = self.container.res_service
+        self.notifier = self.container.notifier
+        self.notifier.bind_sender(self._push_text)
+        self.notifier.start()  # 构造期通常没有事件循环，这里起不来就等 initialize
+
+    async def initialize(self):
+        # AstrBot 在事件循环里加载完插件后调用：从 notify_subs 恢复的订阅靠这里保证有人提醒
+        self.notifier.start()
+
+    async def _push_text(self, session: str, text: str):
+        await self.context.send_message(session, MessageChain().message(text))
+
+    async def terminate(self):
+        await self.notifier.stop()
+        self.state_svc.flush()  # 战线推进的内存累加落库
+        self.container.render_farm.shutdown()
 
     # SLG 主命令组
     @filter.command_group("slg")
@@ -36,6 +57,7 @@ class HexPipelinePlugin(Star):
         pass
 
     @slg_group.command("加入", alias={"join"})
+    @timed_command
     async def slg_join(self, event: AstrMessageEvent):
         uid = str(event.get_sender_id())
         name = event.get_sender_name() or uid
@@ -44,12 +66,14 @@ class HexPipelinePlugin(Star):
         yield event.plain_result("已加入。四建筑默认1级，开始自动产出。")
 
     @slg_group.command("帮助", alias={"help", "？", "?"})
+    @timed_command
     async def slg_help(self, event: AstrMessageEvent):
         yield event.plain_result(
-            "用法：/slg 加入 | 资源 | 一键 | 升级 <农田/钱庄/采石场/军营> | 抽卡 <次数> | 基地 | 迁城 <城市名>"
+            "用法：/slg 加入 | 资源 | 一键 | 升级 <农田/钱庄/采石场/军营> | 抽卡 <次数> | 规划 [目标等级] | 基地 | 迁城 <城市名> | 提醒 [开/关]"
         )
 
     @slg_group.command("进军", alias={"攻打", "开战"})
+    @timed_command
     async def slg_march(self, event: AstrMessageEvent, target: str):
         uid = str(event.get_sender_id())
         event.get_sender_name() or uid
@@ -102,6 +126,7 @@ class HexPipelinePlugin(Star):
         pass
 
     @alliance_group.command("创建")
+    @timed_command
     async def alliance_create(self, event: AstrMessageEvent, name: str):
         uid = str(event.get_sender_id())
         name = event.get_sender_name() or uid
@@ -112,6 +137,7 @@ class HexPipelinePlugin(Star):
         yield event.plain_result(msg)
 
     @alliance_group.command("加入")
+    @timed_command
     async def alliance_join(self, event: AstrMessageEvent, name: str):
         uid = str(event.get_sender_id())
         name = event.get_sender_name() or uid
@@ -122,6 +148,7 @@ class HexPipelinePlugin(Star):
         yield event.plain_result(msg)
 
     @alliance_group.command("成员", alias={"成员列表"})
+    @timed_command
     async def alliance_members(self, event: AstrMessageEvent, name: str = None):
         uid = str(event.get_sender_id())
         name = event.get_sender_name() or uid
@@ -139,6 +166,7 @@ class HexPipelinePlugin(Star):
         yield event.plain_result("\n".join(lines))
 
     @slg_group.command("一键", alias={"daily", "一键日常"})
+    @timed_command
     async def slg_one_tap(self, event: AstrMessageEvent):
         """一键日常：结算→汇总→建议下一步。
         仅展示建议，不自动执行任何消耗性操作。
@@ -221,9 +249,12 @@ class HexPipelinePlugin(Star):
         elif cur1 < cap1 and p.troops > 0:
             suggestions.append("建议：/slg 补兵 1  # 队伍1未满编")
         elif affordable:
-            # 简单推荐第一条可升（更复杂的性价比可后续扩展）
-            first = affordable[0]
-            bname = first.split("→", 1)[0]
+            # 按贪心规划（全部建筑 +1 级）挑第一步，不跑完整搜索；第一步还要等的话退回第一条可升
+            bname = affordable[0].split("→", 1)[0]
+            target = min(MAX_LEVEL, max(int(v) for v in lvb.values()) + 1)
+            plan = self.container.planner.quick_plan_for(p, target)
+            if plan and plan.steps and plan.steps[0].wait_min == 0:
+                bname = cn_name[plan.steps[0].building]
             suggestions.append(f"建议：/slg 升级 {bname}")
         else:
             # 兜底：按缺口里最快的一项给等待提示
@@ -252,6 +283,7 @@ class HexPipelinePlugin(Star):
         yield event.plain_result("\n".join(lines))
 
     @alliance_group.command("列表", alias={"所有", "排行"})
+    @timed_command
     async def alliance_list_all(self, event: AstrMessageEvent):
         allys = self.container.alliance_service.list_all()
         if not allys:
@@ -265,12 +297,12 @@ class HexPipelinePlugin(Star):
         yield event.plain_result("\n".join(lines))
 
     @staticmethod
-    def _parse_time_local(s: str) -> int | None:
+    def _parse_time_local(s: str, now_ts: int) -> int | None:
         """
         支持两种格式：
           1) 'YYYY-MM-DD HH:MM'
           2) 'HH:MM'（今天该时刻，若已过则默认明天）
-        返回 epoch 秒；失败返回 None
+        now_ts 为当前 epoch 秒（取容器时钟）；返回 epoch 秒，失败返回 None
         """
         s = (s or "").strip()
         try:
@@ -278,15 +310,16 @@ class HexPipelinePlugin(Star):
                 dt = datetime.strptime(s, "%Y-%m-%d %H:%M")
             else:
                 hh, mm = s.split(":")
-                now = datetime.fromtimestamp(time.time())
+                now = datetime.fromtimestamp(now_ts)
                 dt = now.replace(hour=int(hh), minute=int(mm), second=0, microsecond=0)
-                if dt.timestamp() <= time.time():
+                if dt.timestamp() <= now_ts:
                     dt = dt + timedelta(days=1)
             return int(dt.timestamp())
         except Exception:
             return None
 
     @alliance_group.command("攻城")
+    @timed_command
     async def cmd_alliance_siege(self, event: AstrMessageEvent, city: str, when: str):
         """
         发起同盟攻城：slg 同盟 攻城 城市名 预定时间
@@ -294,13 +327,14 @@ class HexPipelinePlugin(Star):
         仅领袖可发起；一个同盟同一时间仅允许一个进行中的计划。
         """
         uid = str(event.get_sender_id())
-        start_at = HexPipelinePlugin._parse_time_local(when)
+        now = self.container.clock.now()
+        start_at = HexPipelinePlugin._parse_time_local(when, now)
         if not start_at:
             yield event.plain_result(
                 "时间格式错误。示例：'2025-09-02 20:30' 或 '20:30'"
             )
             return
-        if start_at - int(time.time()) < 10 * 60:
+        if start_at - now < 10 * 60:
             yield event.plain_result("预定时间需要在10分钟之后")
             return
         ok, msg = self.container.siege_service.schedule_siege(
@@ -309,6 +343,7 @@ class HexPipelinePlugin(Star):
         yield event.plain_result(msg)
 
     @alliance_group.command("集结")
+    @timed_command
     async def cmd_alliance_rally(self, event: AstrMessageEvent):
         """
         参与当前同盟最近一次攻城计划：slg 同盟 集结
@@ -319,6 +354,7 @@ class HexPipelinePlugin(Star):
         yield event.plain_result(msg)
 
     @alliance_group.command("攻城状态")
+    @timed_command
     async def cmd_alliance_siege_status(self, event: AstrMessageEvent):
         """
         查看攻城状态并在到期时自动结算：slg 同盟 攻城状态
@@ -329,6 +365,7 @@ class HexPipelinePlugin(Star):
         yield event.plain_result(msg if ok else f"查询失败：{msg}")
 
     @alliance_group.command("帮助", alias={"help", "?", "？"})
+    @timed_command
     async def alliance_help(self, event: AstrMessageEvent):
         yield event.plain_result(
             "用法：\n"
@@ -342,6 +379,7 @@ class HexPipelinePlugin(Star):
         )
 
     @slg_group.command("资源", alias={"状态"})
+    @timed_command
     async def slg_resource_status(self, event: AstrMessageEvent):
         """资源状态 → Pillow 图片化输出。
         依赖: Pillow；背景图：picture/resourcebg.png；字体：fonts/ 下可选（无则退回默认字体）。
@@ -356,98 +394,95 @@ class HexPipelinePlugin(Star):
         # 懒结算 & 读取状态
         p = self.res.settle(p)
         s = self.res.status(p)
-        lvb = s["level_by_building"]
-        prod = s["prod_per_min"]
-        cap = s["cap"]
-        cur = s["cur"]
-
-        # 文案行
-        lines = [
-            f"建筑等级：农田{lvb['farm']}  钱庄{lvb['bank']}  采石场{lvb['quarry']}  军营{lvb['barracks']}",
-            f"产出/分钟：粮{prod['grain']}  金{prod['gold']}  石{prod['stone']}  兵{prod['troops']}",
-            f"当前/上限：粮{cur['grain']}/{cap['grain']}  金{cur['gold']}/{cap['gold']}  石{cur['stone']}/{cap['stone']}  兵{cur['troops']}/{cap['troops']}",
-        ]
 
         # === 图片渲染 ===
-        try:
-            from PIL import Image, ImageDraw, ImageFont
-        except Exception:
+        cards = self.container.card_renderer
+        if not cards.available():
             yield event.plain_result("未安装 Pillow。请先安装：pip install Pillow")
             return
+        try:
+            spec = self.container.output_policy.card(event.get_platform_name())
+            png = await self.container.render_farm.resource_card(s, spec)
+        except FileNotFoundError as e:
+            yield event.plain_result(f"找不到背景图：{e.filename}")
+            return
+        except RenderBusy:
+            # 渲染排队已满：直接回文字，不让大群刷屏拖慢其他命令
+            yield event.plain_result(card_text(RESOURCE_CARD, resource_cells(s)))
+            return
+        yield event.chain_result([Comp.Image.fromBytes(png)])
 
-        # 资源路径（插件根目录/picture/resourcebg.png）
-        plugin_root = Path(__file__).resolve().parent
-        bg_path = plugin_root / "picture" / "resourcebg.png"
-        if not bg_path.exists():
-            yield event.plain_result(f"找不到背景图：{bg_path}")
+    @slg_group.command("提醒", alias={"满仓提醒", "notify"})
+    @timed_command
+    async def slg_notify(self, event: AstrMessageEvent, switch: str = ""):
+        """满仓提醒开关：/slg 提醒 开|关；不带参数查看当前状态与预计满仓时间"""
+        uid = str(event.get_sender_id())
+        p = self.res.get_or_none(uid)
+        if not p:
+            yield event.plain_result("还没加入。先用：/slg 加入")
+            return
+        switch = (switch or "").strip()
+        if switch in ("开", "on", "开启"):
+            p = self.res.settle(p)
+            self.notifier.subscribe(p, event.unified_msg_origin)
+        elif switch in ("关", "off", "关闭"):
+            self.notifier.unsubscribe(uid)
+            yield event.plain_result("已关闭满仓提醒。")
+            return
+        elif switch:
+            yield event.plain_result("用法：/slg 提醒 开|关")
             return
 
-        img = Image.open(bg_path).convert("RGBA")
-        draw = ImageDraw.Draw(img)
+        on = self.notifier.is_subscribed(uid)
+        nxt = self.res.full_at(p, after=self.container.clock.now())
+        if nxt is None:
+            eta = "各项资源均已满仓或不再增长"
+        else:
+            eta = f"{RESOURCE_CN[nxt[1]]} 预计 {time.strftime('%m-%d %H:%M', time.localtime(nxt[0]))} 满仓"
+        yield event.plain_result(f"满仓提醒：{'已开启' if on else '未开启'}｜{eta}")
 
-        # 字体：优先使用 LXGWWenKaiMono-Regular.ttf
-        font_dir = plugin_root / "fonts"
-        font_path = font_dir / "LXGWWenKaiMono-Regular.ttf"
-        try:
-            title_font = ImageFont.truetype(str(font_path), 80) if font_path.exists() else ImageFont.load_default()
-            body_font = ImageFont.truetype(str(font_path), 56) if font_path.exists() else ImageFont.load_default()
-        except Exception:
-            title_font = ImageFont.load_default()
-            body_font = ImageFont.load_default()
-
-        # 版式：调整起始坐标和行间距，文字颜色改为白色，描边改为黑色
-        x0, y0 = 60, 80  # 调整起始坐标
-        line_gap = 80  # 调整行间距
-        text_color = (255, 255, 255)  # 白色文字
-        stroke_color = (0, 0, 0)  # 黑色描边
-
-        # 标题
-        draw.text((x0, y0), "资源状态", font=title_font, fill=text_color, stroke_width=5, stroke_fill=stroke_color)
-
-        # 重新组织数据，以便进行动态对齐
-        data_rows = [
-            {"label": "建筑等级：", "items": [f"农田{lvb['farm']}", f"钱庄{lvb['bank']}", f"采石场{lvb['quarry']}", f"军营{lvb['barracks']}"]},
-            {"label": "产出/分钟：", "items": [f"粮{prod['grain']}", f"金{prod['gold']}", f"石{prod['stone']}", f"兵{prod['troops']}"]},
-            {"label": "当前/上限：", "items": [
-                f"粮{cur['grain']}/{cap['grain']}",
-                f"金{cur['gold']}/{cap['gold']}",
-                f"石{cur['stone']}/{cap['stone']}",
-                f"兵{cur['troops']}/{cap['troops']}",
-            ]},
-        ]
+    @slg_group.command("规划", alias={"plan", "升级规划"})
+    @timed_command
+    async def slg_plan(self, event: AstrMessageEvent, target_level: int = 0):
+        """四座建筑都升到目标等级的最快顺序；不带参数则以当前最高等级+1为目标"""
+        uid = str(event.get_sender_id())
+        p = self.res.get_or_none(uid)
+        if not p:
+            yield event.plain_result("还没加入。先用：/slg 加入")
+            return
+        p = self.res.settle(p)
+        planner = self.container.planner
+        levels, _ = planner.player_state(p)
+        target = int(target_level or 0) or min(MAX_LEVEL, max(levels) + 1)
+        if not 1 <= target <= MAX_LEVEL:
+            yield event.plain_result(f"目标等级需在 1~{MAX_LEVEL} 之间")
+            return
+        if min(levels) >= target:
+            yield event.plain_result(f"四座建筑都已达到 {target} 级")
+            return
+        # 搜索可能上百毫秒，放到线程里跑，不卡事件循环
+        plan = await asyncio.to_thread(planner.plan_for, p, target)
+        if plan is None:
+            yield event.plain_result("按当前产出与仓库上限无法达成该目标")
+            return
+        cn_name = {v: k for k, v in BUILDING_ALIASES.items()}
+        best = "最快约" if plan.exact else "约（状态太多，未证明最快）"
+        lines = [f"全部升到 {target} 级：共 {len(plan.steps)} 步，{best} {self._fmt_minutes(plan.total_min)}"]
+        for n, st in enumerate(plan.steps, 1):
+            when = "现在" if st.at_min == 0 else f"+{self._fmt_minutes(st.at_min)}"
+            lines.append(f"{n}. {cn_name[st.building]}→{st.level}级（{when}）")
+        yield event.plain_result("\n".join(lines))
 
-        # 计算每列的最大宽度，用于动态对齐
-        num_cols = 4
-        col_widths = [0] * num_cols
-        for row in data_rows:
-            for i, item in enumerate(row["items"]):
-                bbox = draw.textbbox((0, 0), item, font=body_font)
-                width = bbox[2] - bbox[0]
-                if width > col_widths[i]:
-                    col_widths[i] = width
-
-        # 计算每列的起始X坐标
-        col_x_positions = [x0 + 250] # 第一个资源项的起始X坐标
-        for i in range(1, num_cols):
-            # 确保列之间有足够的间距，例如20px
-            col_x_positions.append(col_x_positions[i-1] + col_widths[i-1] + 50) # 50是列间距
-
-        # 绘制正文
-        current_y = y0 + 120 # 调整正文起始Y坐标
-        for row_data in data_rows:
-            # 绘制行标签
-            draw.text((x0, current_y), row_data["label"], font=body_font, fill=text_color, stroke_width=4, stroke_fill=stroke_color)
-            # 绘制资源项
-            for i, item_text in enumerate(row_data["items"]):
-                draw.text((col_x_positions[i], current_y), item_text, font=body_font, fill=text_color, stroke_width=4, stroke_fill=stroke_color)
-            current_y += line_gap
-
-        # 临时文件 & 发送
-        with tempfile.NamedTemporaryFile(suffix=".png", delete=False) as tmp:
-            img.save(tmp.name, "PNG")
-            yield event.image_result(tmp.name)
+    @staticmethod
+    def _fmt_minutes(m: int) -> str:
+        d, rest = divmod(int(m), 24 * 60)
+        h, mi = divmod(rest, 60)
+        if d:
+            return f"{d}天{h}小时"
+        return f"{h}小时{mi}分" if h else f"{mi}分钟"
 
     @slg_group.command("队伍", alias={"编成", "编队"})
+    @timed_command
     async def slg_team(self, event: AstrMessageEvent, team_no: int = None):
         uid = str(event.get_sender_id())
         event.get_sender_name() or uid
@@ -456,37 +491,36 @@ class HexPipelinePlugin(Star):
             yield event.plain_result("还没加入。先用：/slg 加入")
             return
         self.container.team_service.ensure_teams(uid)
+        ts = self.container.team_service
+        infos = [ts.show_team(uid, team_no)] if team_no else ts.list_teams(uid)
+
+        # 有 Pillow 和背景图就出卡片，否则退回文字
+        cards = self.container.card_renderer
+        if cards.available():
+            try:
+                spec = self.container.output_policy.card(event.get_platform_name())
+                png = await self.container.render_farm.team_card(infos, spec)
+                yield event.chain_result([Comp.Image.fromBytes(png)])
+                return
+            except (FileNotFoundError, RenderBusy):
+                pass
         if team_no:
-            info = self.container.team_service.show_team(uid, team_no)
-            m = "、".join(
-                [
-                    f"[{x['slot']}]{x['name']}Lv{x['level']}"
-                    if x["name"]
-                    else f"[{x['slot']}]空"
-                    for x in info["members"]
-                ]
-            )
+            info = infos[0]
+            m = "、".join(member_str(x) for x in info["members"])
             yield event.plain_result(
                 f"队伍{team_no}：{m}\n兵力 {info['soldiers']}/{info['capacity']}"
             )
         else:
-            infos = self.container.team_service.list_teams(uid)
             lines = []
             for info in infos:
-                m = "、".join(
-                    [
-                        f"[{x['slot']}]{x['name']}Lv{x['level']}"
-                        if x["name"]
-                        else f"[{x['slot']}]空"
-                        for x in info["members"]
-                    ]
-                )
+                m = "、".join(member_str(x) for x in info["members"])
                 lines.append(
                     f"队伍{info['team_no']}：{m} | 兵 {info['soldiers']}/{info['capacity']}"
                 )
             yield event.plain_result("\n".join(lines))
 
     @slg_group.command("上阵", alias={"加入队伍"})
+    @timed_command
     async def slg_assign_char(
         self,
         event: AstrMessageEvent,
@@ -513,6 +547,7 @@ class HexPipelinePlugin(Star):
         yield event.plain_result(msg)
 
     @slg_group.command("补兵")
+    @timed_command
     async def slg_reinforce(self, event: AstrMessageEvent, team_no: int):
         uid = str(event.get_sender_id())
         event.get_sender_name() or uid
@@ -525,9 +560,12 @@ class HexPipelinePlugin(Star):
             return
         self.container.team_service.ensure_teams(uid)
         ok, msg, p2 = self.container.team_service.reinforce(p, team_no)
+        if ok:
+            self.notifier.refresh(p2)
         yield event.plain_result(msg)
 
     @slg_group.command("升级")
+    @timed_command
     async def slg_upgrade(self, event: AstrMessageEvent, target_name: str):
         uid = str(event.get_sender_id())
         event.get_sender_name() or uid
@@ -544,14 +582,19 @@ class HexPipelinePlugin(Star):
         bid = BUILDING_ALIASES.get(key, key)
         if bid in BUILDING_TO_RESOURCE:
             ok, msg, p = self.res.upgrade(p, key)
+            if ok:
+                self.notifier.refresh(p)
             yield event.plain_result(msg)
             return
 
         # 否则按“升级角色”
         ok, msg, p = self.container.team_service.upgrade_char(p, key)
+        if ok:
+            self.notifier.refresh(p)
         yield event.plain_result(msg)
 
     @slg_group.command("抽卡")
+    @timed_command
     async def slg_gacha(self, event: AstrMessageEvent, times: int = 1):
         uid = str(event.get_sender_id())
         event.get_sender_name() or uid
@@ -562,6 +605,8 @@ class HexPipelinePlugin(Star):
 
         times = max(1, min(50, times))  # 别让你一口气 999
         got, spent, done, status = self.container.gacha_service.draw(p, times)
+        if done > 0:
+            self.notifier.refresh(p)
 
         # 根据状态判断
         if status == DrawResultStatus.ALL_CHARACTERS_COLLECTED:
@@ -574,7 +619,7 @@ class HexPipelinePlugin(Star):
         # 结果文本
         lines = []
         if done > 0:
-            names = [f"{c.name}（{c.title}）" if c.title else c.name for c in got]
+            names = [self.container.catalog.display(c.name) for c in got]
             lines.append(f"抽取成功 {done}/{times} 次")
             if names:
                 lines.append("获得：\n- " + "\n- ".join(names))
@@ -605,25 +650,139 @@ class HexPipelinePlugin(Star):
             lines.append(
                 f"下次单抽费用：金{cst['gold']} 粮{cst['grain']} 石{cst['stone']} 兵{cst['troops']}（前5次免费，6-15线性涨，之后恒定）"
             )
+        lines.append(
+            f"保底：已连续 {p.pity} 抽未出 {TOP_RARITY}，第 {PITY_THRESHOLD} 抽必出"
+        )
+        have, total = self.container.gacha_service.collected(uid)
+        lines.append(f"图鉴：{have}/{total}")
 
         yield event.plain_result("\n".join(lines))
 
+    # ====== 运维命令 ======
+
+    @filter.permission_type(filter.PermissionType.ADMIN)
+    @slg_group.command("性能", alias={"metrics", "perf"})
+    async def slg_metrics(self, event: AstrMessageEvent, mode: str = ""):
+        """耗时统计（管理员）：/slg 性能 [prom|重置]"""
+        m = self.container.metrics
+        farm = self.container.render_farm.stats()
+        if mode in ("重置", "reset"):
+            m.reset()
+            if self.container.sql_tracer is not None:
+                self.container.sql_tracer.reset()
+            yield event.plain_result("性能统计已清零")
+            return
+        if mode in ("prom", "prometheus"):
+            gauges = {f"render_{k}": v for k, v in farm.items() if isinstance(v, (int, float))}
+            yield event.plain_result(m.prometheus(gauges))
+            return
+        lines = m.report() if m.enabled else ["计时统计未开启（插件配置 metrics_enabled）"]
+        tracer = self.container.sql_tracer
+        if tracer is not None:
+            rows = sorted(tracer.stats().items(), key=lambda kv: -kv[1]["queries_mean"])
+            lines.append(f"【每条命令的 SQL】慢查询 {len(tracer.slow)} 条（阈值 {tracer.slow_ms:g}ms）")
+            for name, st in rows[:8]:
+                lines.append(
+                    f"  {name}  n={st['n']} 平均 {st['queries_mean']} 条 / 最多 {st['queries_max']} 条，"
+                    f"SQL 耗时 {st['sql_ms_mean']}ms"
+                )
+        lines.append(
+            f"【渲染】进程 {farm['workers']}，排队 {farm['pending']}（峰值 {farm['peak']}），"
+            f"拒绝 {farm['rejected']}，失败 {farm['failed']}"
+        )
+        for kind, v in farm.items():
+            if isinstance(v, dict):
+                lines.append(
+                    f"  {kind}  n={v['n']} 渲染 p50={v['render_p50']}ms p95={v['render_p95']}ms"
+                    f" 含排队 p50={v['total_p50']}ms p95={v['total_p95']}ms"
+                )
+        yield event.plain_result("\n".join(lines))
+
+    @filter.permission_type(filter.PermissionType.ADMIN)
+    @slg_group.command("内存", alias={"memory", "mem"})
+    async def slg_memory(self, event: AstrMessageEvent, mode: str = ""):
+        """内存剖析（管理员）：/slg 内存 [开|关|top|基线|增长|重置]"""
+        mem = self.container.memprof
+        if mode in ("开", "on"):
+            mem.start()
+            yield event.plain_result("已开启 tracemalloc（分配会变慢；渲染进程的峰值需在配置 memprof_enabled 后重启才统计）")
+            return
+        if mode in ("关", "off"):
+            mem.stop()
+            yield event.plain_result("已关闭内存剖析")
+            return
+        if mode in ("重置", "reset"):
+            mem.reset()
+            yield event.plain_result("内存统计已清零")
+            return
+        if mode in ("基线", "mark"):
+            mem.mark()
+            yield event.plain_result("已记录基线快照，之后用 /slg 内存 增长 查看新增分配")
+            return
+        if not mem.enabled:
+            yield event.plain_result("内存剖析未开启：/slg 内存 开，或配置 memprof_enabled")
+            return
+        if mode in ("top", "增长", "diff"):
+            rows = mem.top(10, diff=mode != "top")
+            lines = ["【基线以来增长最多】" if mode != "top" else "【占用最多的分配位置】"]
+            lines += [f"  {r['kb']}KB ×{r['count']}  {r['where']}  {r['code']}" for r in rows]
+            yield event.plain_result("\n".join(lines))
+            return
+
+        cur, peak = mem.traced()
+        rss = rss_peak_kb()
+        lines = [
+            f"Python 堆（tracemalloc）：当前 {cur / 2**20:.1f}MB，峰值 {peak / 2**20:.1f}MB"
+            + (f"；进程 RSS 峰值 {rss / 1024:.1f}MB" if rss else "")
+        ]
+        rows = sorted(mem.stats().items(), key=lambda kv: -kv[1]["peak_kb_max"])
+        if rows:
+            lines.append("【命令峰值增量】")
+            for name, st in rows[:8]:
+                lines.append(
+                    f"  {name}  n={st['n']} 峰值 p50={st['peak_kb_p50']}KB max={st['peak_kb_max']}KB"
+                    f" 累计留存 {st['retained_kb']}KB"
+                    + (f"（与别的命令重叠未记 {st['skipped']} 次）" if st["skipped"] else "")
+                )
+        for kind, v in self.container.render_farm.stats().items():
+            if isinstance(v, dict) and "mem_peak_kb_max" in v:
+                lines.append(f"【渲染 {kind}】峰值 p50={v['mem_peak_kb_p50']}KB max={v['mem_peak_kb_max']}KB")
+        yield event.plain_result("\n".join(lines))
+
     # ====== 地图命令 ======
 
     @filter.command("slg_map")
+    @timed_command
     async def show_big_map(self, event: AstrMessageEvent):
-        """渲染大地图为图片并发送（最小参数集）"""
-        # 还是用你现成的 HTML（含 SVG、样式、说明文字）
-        html = self.container.build_map_html()
-
-        try:
+        """渲染大地图为图片并发送（最小参数集）；战线进度不变时直接复用上次的图"""
+        version = self.container.map_version()
+        if self.container.render_map_png is not None:
+            # 本地光栅化：在渲染进程池里画；繁忙或失败再回退 html_render
+            spec = self.container.output_policy.map(event.get_platform_name())
+            try:
+                png = await self.container.map_cache.get(
+                    f"raster:{spec.fmt}:{spec.quality}:{spec.width}",
+                    version,
+                    lambda: self.container.render_map_png(spec),
+                )
+                yield event.chain_result([Comp.Image.fromBytes(png)])
+                return
+            except Exception as e:
+                print(f"[SLG] 本地地图渲染失败，回退 html_render：{e}")
+
+        async def _render():
+            # 还是用你现成的 HTML（含 SVG、样式、说明文字）
+            html = self.container.build_map_html()
             # 关键点：只传 tmpl + data，别给 options 添乱
-            url = await self.html_render(
+            return await self.html_render(
                 tmpl=html,
                 data={},  # 目前没用到变量，留空即可
                 # 不传 options，走默认。默认一般是 png 且不会带 quality
                 # return_url 默认 True，拿到 URL
             )
+
+        try:
+            url = await self.container.map_cache.get("image", version, _render)
             # 用“图片结果”接口交给平台自己发
             yield event.image_result(url)
         except Exception as e:
@@ -631,17 +790,35 @@ class HexPipelinePlugin(Star):
             yield event.plain_result(f"HTML渲染失败：{e}")
 
     @filter.command("slg_map_url")
+    @timed_command
     async def show_big_map_url(self, event: AstrMessageEvent):
-        html = self.container.build_map_html()
-        img_url = await self.html_render(
-            tmpl=html,
-            data={},
-            return_url=True,
-            options={"type": "png", "full_page": True},
+        async def _render():
+            return await self.html_render(
+                tmpl=self.container.build_map_html(),
+                data={},
+                return_url=True,
+                options={"type": "png", "full_page": True},
+            )
+
+        img_url = await self.container.map_cache.get(
+            "url", self.container.map_version(), _render
         )
         yield event.plain_result(f"渲染URL：{img_url}")
 
+    @filter.permission_type(filter.PermissionType.ADMIN)
+    @filter.command("slg_map_reload")
+    @timed_command
+    async def reload_big_map(self, event: AstrMessageEvent):
+        """重新读取地图 JSON 与 picture/ 素材，并作废地图渲染缓存（管理员）"""
+        try:
+            self.container.reload_map()
+        except Exception as e:
+            yield event.plain_result(f"重载失败：{e}")
+            return
+        yield event.plain_result("地图与素材已重载，下次 /slg_map 将重新渲染")
+
     @filter.command("line")
+    @timed_command
     async def show_city_lines(self, event: AstrMessageEvent, city: str):
         """查看某城的战线与里程碑"""
         c = self.map_svc.get_city(city)
@@ -664,6 +841,7 @@ class HexPipelinePlugin(Star):
         )
 
     @filter.command("line_push")
+    @timed_command
     async def push_line(
         self, event: AstrMessageEvent, city: str, gate: str, delta: int
     ):
@@ -678,8 +856,7 @@ class HexPipelinePlugin(Star):
         if not nb:
             yield event.plain_result(f"{city} 的 {gate} 没有战线")
             return
-        self.state_svc.push_progress(city, gate, max(0, min(100, int(delta))))
-        mi, pr = self.state_svc.get_line_progress(city, gate)
+        mi, pr = self.state_svc.push_progress(city, gate, max(0, min(100, int(delta))))
         yield event.plain_result(
             f"已推进 {city} {gate} → {nb}，现在：{['前沿', '箭楼', '外城门'][mi]} {pr}%"
         )
@@ -687,11 +864,13 @@ class HexPipelinePlugin(Star):
     # ====== 你之前的示例命令保留也行（map、neighbor、path、state_*） ======
 
     @filter.command("map")
+    @timed_command
     async def map_root(self, event: AstrMessageEvent):
         nodes = self.map_svc.list_cities()
         yield event.plain_result("城市: " + ", ".join(nodes))
 
     @filter.command("neighbor")
+    @timed_command
     async def map_neighbor(self, event: AstrMessageEvent, node: str):
         fl = self.map_svc.frontlines(node)
         if not fl:
@@ -701,6 +880,7 @@ class HexPipelinePlugin(Star):
         yield event.plain_result(f"{node} 战线: " + " | ".join(pairs))
 
     @slg_group.command("基地")
+    @timed_command
     async def slg_base(self, event: AstrMessageEvent):
         """查看或自动分配基地（首次进入自动分配到四州之一）"""
         uid = str(event.get_sender_id())
@@ -712,6 +892,7 @@ class HexPipelinePlugin(Star):
         yield event.plain_result(msg)
 
     @slg_group.command("迁城")
+    @timed_command
     async def slg_move_capital(self, event: AstrMessageEvent, city: str):
         """
         迁城到指定城市（每天一次；仅允许 益/扬/冀/兖 四州）
@@ -0,0 +1,63 @@
+# tests/conftest.py
+"""
+测试直接复用 tools/bench.py 的假 AstrBot 和驱动（Bench）：
+临时数据目录、模拟时钟、LLM 桩都由 Bench 准备，测试只管跑命令、对照预算。
+"""
+import asyncio
+import atexit
+import shutil
+import sys
+import tempfile
+from pathlib import Path
+
+import pytest
+
+PKG = "astrbot_plugin_slg"
+ROOT = Path(__file__).resolve().parents[1]
+
+
+def _mount_plugin_package():
+    # 插件用相对导入，必须以包名导入；检出目录不一定叫 astrbot_plugin_slg，就在临时目录里挂个同名软链。
+    # 放进 sys.path 而不是只注册模块：渲染工作进程是 spawn 出来的，会照着 sys.path 重新导入
+    if ROOT.name == PKG:
+        mount = ROOT.parent
+    else:
+        mount = Path(tempfile.mkdtemp(prefix="slg-tests-"))
+        (mount / PKG).symlink_to(ROOT, target_is_directory=True)
+        atexit.register(shutil.rmtree, mount, ignore_errors=True)
+    if str(mount) not in sys.path:
+        sys.path.insert(0, str(mount))
+
+
+_mount_plugin_package()
+
+
+@pytest.fixture
+def run_bench():
+    """
+    run_bench(body, "--render-workers", "0", ...)：建好插件（同一个事件循环里 build + initialize），
+    执行 await body(bench) 并返回其结果，最后 terminate、关掉 tracemalloc、删临时目录。
+    """
+    from astrbot_plugin_slg.tools.bench import Bench, parse_args
+
+    made = []
+
+    def _run(body, *argv):
+        bench = Bench(parse_args(list(argv)))
+        made.append(bench)
+
+        async def go():
+            bench.build()
+            await bench.plugin.initialize()
+            try:
+                return await body(bench)
+            finally:
+                await bench.plugin.terminate()
+
+        return asyncio.run(go())
+
+    yield _run
+    for bench in made:
+        if hasattr(bench, "container"):
+            bench.container.memprof.stop()
+        bench.cleanup()
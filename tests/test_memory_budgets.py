@@ -0,0 +1,28 @@
+# tests/test_memory_budgets.py
+"""小规模压测 + 串行重跑，常驻/单条命令/单次渲染的堆峰值不超过 tools/bench.py 的 MEMORY_BUDGETS_KB"""
+import asyncio
+
+from astrbot_plugin_slg.tools.bench import Bench, parse_args
+
+ROUNDS = 3
+
+
+def test_memory_within_budgets():
+    # 渲染用真的工作进程：卡片/地图的堆峰值在那边量，主进程只接住图片字节
+    bench = Bench(parse_args(["--users", "4", "--ops", "200", "--memprof", "--mem-rounds", str(ROUNDS)]))
+    try:
+        res = asyncio.run(bench.run())
+    finally:
+        if hasattr(bench, "container"):
+            bench.container.memprof.stop()
+        bench.cleanup()
+
+    mem = res["memory"]
+    assert mem["over_budget"] == []
+    assert mem["serial_errors"] == {}
+    # 串行重跑时每条命令都该独占执行，一次都不该因重叠被跳过
+    labels = {label for label, _w, _make in bench.mix("0", ["0"])}
+    assert set(mem["serial"]) == labels
+    for label, st in mem["serial"].items():
+        assert (st["n"], st["skipped"]) == (ROUNDS, 0), label
+    assert {"card", "map"} <= set(mem["renders"])
@@ -0,0 +1,34 @@
+# tests/test_query_budgets.py
+"""每条命令单次执行的 SQL 条数不超过 tools/bench.py 的 QUERY_BUDGETS：重新引入 N+1 会在这里失败"""
+from astrbot_plugin_slg.infra.sql_trace import assert_max_queries
+from astrbot_plugin_slg.tools.bench import QUERY_BUDGETS
+
+USERS = [str(20000 + i) for i in range(12)]  # 两个同盟：12 人里 0 号、10 号建盟
+ROUNDS = 3  # 每种命令跑几轮：首轮常有懒加载/建行，后几轮才是常态
+
+
+async def _checked(bench, uid, text, label):
+    with assert_max_queries(bench.rec.sql, QUERY_BUDGETS[label], label):
+        await bench.run_once(uid, text, label)
+
+
+def test_every_bench_command_has_a_budget(run_bench):
+    async def labels(bench):
+        mix = {label for label, _w, _make in bench.mix(USERS[0], USERS)}
+        return mix | {label for _uid, _text, label in bench.setup_steps(USERS)}
+
+    assert run_bench(labels, "--render-workers", "0") == set(QUERY_BUDGETS)
+
+
+def test_commands_stay_within_query_budgets(run_bench):
+    async def body(bench):
+        for uid, text, label in bench.setup_steps(USERS):
+            await _checked(bench, uid, text, label)
+        # 固定种子下轮流用不同玩家跑一遍命令组合，库里已有同盟、队伍、战线进度
+        for r in range(ROUNDS):
+            uid = USERS[r * 5 % len(USERS)]
+            for label, _w, make in bench.mix(uid, USERS):
+                await _checked(bench, uid, make(), label)
+                bench.clock.advance(seconds=bench.args.tick)
+
+    run_bench(body, "--render-workers", "0", "--seed", "1")
@@ -0,0 +1,630 @@
+# tools/bench.py
+"""
+端到端命令压测：用真实的 build_container + HexPipelinePlugin，跑在临时数据目录上；
+AstrBot 的 Context/事件/消息组件换成本文件里的假实现，LLM 换成按格式回 JSON 的桩。
+N 个并发虚拟用户按权重混合发 /slg 命令，统计吞吐、每条命令的 p50/p95/p99 延迟和 SQL 条数。
+
+    python -m astrbot_plugin_slg.tools.bench --users 50 --ops 5000
+    python -m astrbot_plugin_slg.tools.bench --json bench.json   # 机器可读，便于回归对比
+
+游戏时间用模拟时钟，每条命令推进 --tick 秒，资源会正常累积，升级/抽卡能走到成功分支。
+"""
+from __future__ import annotations
+import argparse
+import asyncio
+import inspect
+import json
+import platform
+import random
+import shutil
+import sys
+import tempfile
+import time
+import types
+from collections import defaultdict
+from pathlib import Path
+from typing import Callable, Dict, List, Sequence, Tuple
+
+from ..infra.memprof import rss_peak_kb
+from ..infra.sql_trace import QueryBudgetExceeded, SqlTracer, assert_max_queries
+
+# 内存预算（KB，tracemalloc 口径的 Python 堆，不含解释器本身和 C 扩展的私有分配）：
+#   resident 压测结束时常驻；command_peak 串行（measure_serial）时单条命令的峰值增量；
+#   render_peak 工作进程里单次渲染的峰值增量（只含 Python 堆，Pillow 像素缓冲看 worker_rss_kb）；"*" 为默认。
+# --memprof 时超出会让退出码为 1，tests/test_memory_budgets.py 也会检查
+MEMORY_BUDGETS_KB: Dict = {
+    # 按实测（10×500 与 20×2000 两档）留余量；实测：常驻 3–6MB，一般命令 < 16KB，
+    # 资源/队伍卡片 470–880KB（随队伍数变化），地图 ~4.3MB，卡片渲染 ≤ 2.5MB，地图渲染 ~4.9MB
+    "resident": 8192,
+    # 卡片/地图命令要接住渲染进程或磁盘缓存传回的整张图（地图按缓存未命中量），峰值主要是图的大小
+    "command_peak": {"*": 64, "资源": 1280, "队伍": 1280, "地图": 6144},
+    "render_peak": {"*": 3584, "map": 7168},
+}
+
+# 每条命令单次执行的 SQL 条数上限（trace 口径：含隐式 BEGIN/COMMIT、executemany 的每一行）。
+# 压测里任何一次超出都会让退出码为 1，tests/test_query_budgets.py 也逐条检查；
+# 改动让条数变多时要么修掉 N+1，要么有意识地调这里
+QUERY_BUDGETS: Dict[str, int] = {
+    "加入": 8,
+    "同盟创建": 9,
+    "同盟加入": 3,
+    "资源": 4,
+    "一键": 13,
+    "升级": 7,
+    "抽卡": 11,
+    "队伍": 8,
+    "上阵": 14,
+    "补兵": 15,
+    "规划": 4,
+    "提醒": 1,
+    "基地": 5,
+    "同盟列表": 1,
+    "攻城状态": 2,
+    "进军": 14,
+    "地图": 2,
+}
+
+# ---------------- 假 AstrBot ----------------
+# 命令路径 → 插件方法名，由假的 filter 装饰器在 import main 时填充
+COMMANDS: Dict[Tuple[str, ...], str] = {}
+
+
+class _Group:
+    """command_group / group 的返回值：记下路径（含别名），子命令注册到每个前缀下"""
+
+    def __init__(self, prefixes: Sequence[Tuple[str, ...]]):
+        self._prefixes = list(prefixes)
+
+    @staticmethod
+    def _names(name: str, alias) -> List[str]:
+        return [name, *sorted(alias or ())]
+
+    def command(self, name: str, alias=None, **_):
+        def deco(fn):
+            for pre in self._prefixes:
+                for n in self._names(name, alias):
+                    COMMANDS[pre + (n,)] = fn.__name__
+            return fn
+
+        return deco
+
+    def group(self, name: str, alias=None, **_):
+        def deco(_fn):
+            return _Group([pre + (n,) for pre in self._prefixes for n in self._names(name, alias)])
+
+        return deco
+
+
+class _Filter:
+    PermissionType = types.SimpleNamespace(ADMIN="admin", MEMBER="member")
+
+    @staticmethod
+    def command_group(name: str, alias=None, **_):
+        return _Group([()]).group(name, alias)
+
+    @staticmethod
+    def command(name: str, alias=None, **_):
+        return _Group([()]).command(name, alias)
+
+    @staticmethod
+    def permission_type(_perm, **_):
+        return lambda fn: fn
+
+
+class BenchEvent:
+    """AstrMessageEvent 的最小替身：结果直接返回元组，不做真实发送"""
+
+    def __init__(self, uid: str, name: str, text: str):
+        self._uid = uid
+        self._name = name
+        self.message_str = text
+        self.unified_msg_origin = f"bench:FriendMessage:{uid}"
+
+    def get_sender_id(self) -> str:
+        return self._uid
+
+    def get_sender_name(self) -> str:
+        return self._name
+
+    def get_platform_name(self) -> str:
+        return "bench"
+
+    def plain_result(self, text: str):
+        return ("plain", text)
+
+    def chain_result(self, chain):
+        return ("chain", chain)
+
+    def image_result(self, url: str):
+        return ("image", url)
+
+
+class _MessageChain:
+    def __init__(self):
+        self.chain = []
+
+    def message(self, text: str):
+        self.chain.append(text)
+        return self
+
+
+class _Image:
+    @staticmethod
+    def fromBytes(data: bytes):
+        return ("image_bytes", len(data))
+
+    @staticmethod
+    def fromURL(url: str):
+        return ("image_url", url)
+
+
+class _Star:
+    def __init__(self, context):
+        self.context = context
+
+    async def html_render(self, *_, **__):
+        raise RuntimeError("bench 不提供 html_render")
+
+
+def install_fake_astrbot():
+    """把假的 astrbot.api.* 塞进 sys.modules（只在本进程生效）"""
+    ev = types.ModuleType("astrbot.api.event")
+    ev.filter = _Filter()
+    ev.AstrMessageEvent = BenchEvent
+    ev.MessageChain = _MessageChain
+    star = types.ModuleType("astrbot.api.star")
+    star.Context = object
+    star.Star = _Star
+    star.register = lambda *a, **k: (lambda cls: cls)
+    comps = types.ModuleType("astrbot.api.message_components")
+    comps.Image = _Image
+    comps.Plain = lambda text: ("plain", text)
+    api = types.ModuleType("astrbot.api")
+    api.event, api.star, api.message_components = ev, star, comps
+    root = types.ModuleType("astrbot")
+    root.api = api
+    sys.modules.update(
+        {
+            "astrbot": root,
+            "astrbot.api": api,
+            "astrbot.api.event": ev,
+            "astrbot.api.star": star,
+            "astrbot.api.message_components": comps,
+        }
+    )
+
+
+class StubProvider:
+    """LLM 桩：按战斗服务要的格式随机回 JSON，可选模拟网络延迟"""
+
+    def __init__(self, latency_s: float, rng: random.Random):
+        self._latency = latency_s
+        self._rng = rng
+        self.calls = 0
+
+    async def text_chat(self, prompt: str = "", session_id=None, contexts=None, **_):
+        from ..domain.services_battle import AXES, JUDGE_MAP, TIE_SYSTEM
+
+        self.calls += 1
+        if self._latency:
+            await asyncio.sleep(self._latency)
+        system = (contexts or [{}])[0].get("content", "")
+        r = self._rng
+        if system == TIE_SYSTEM:
+            body = {"votes": [r.choice("AB") for _ in range(5)]}
+        else:
+            body = {
+                "axes": [{"name": a, "judge": r.choice(list(JUDGE_MAP))} for a in AXES],
+                "phase_votes": {k: r.choice(["A", "B", "平"]) for k in ("opening", "maneuver", "decisive")},
+                "confidence": "中",
+            }
+        return types.SimpleNamespace(completion_text=json.dumps(body, ensure_ascii=False))
+
+
+class BenchContext:
+    def __init__(self, data_dir: Path, provider: StubProvider):
+        self.data_dir = str(data_dir)
+        self._provider = provider
+        self.sent = 0
+
+    def get_provider_by_id(self, _pid):
+        return self._provider
+
+    def get_using_provider(self):
+        return self._provider
+
+    def get_llm_tool_manager(self):
+        return None
+
+    async def send_message(self, _session, _chain):
+        self.sent += 1
+
+
+# ---------------- 计量 ----------------
+class Recorder:
+    def __init__(self, slow_ms: float):
+        self.lat: Dict[str, List[float]] = defaultdict(list)
+        self.queries: Dict[str, List[int]] = defaultdict(list)
+        self.errors: Dict[str, int] = defaultdict(int)
+        self.first_error: Dict[str, str] = {}
+        self.over_budget: Dict[str, int] = defaultdict(int)
+        self.first_over: Dict[str, str] = {}
+        # SQL 按命令计数；慢查询只收集，最后汇总打印
+        self.sql = SqlTracer(slow_ms=slow_ms, log=lambda _msg: None)
+
+    def clear(self):
+        for d in (self.lat, self.queries, self.errors, self.first_error, self.over_budget, self.first_over):
+            d.clear()
+        self.sql.reset()
+
+
+def _pct(xs: Sequence[float], q: float) -> float:
+    if not xs:
+        return 0.0
+    xs = sorted(xs)
+    return xs[min(len(xs) - 1, max(0, int(round(q * len(xs) + 0.5)) - 1))]
+
+
+# ---------------- 驱动 ----------------
+class Bench:
+    def __init__(self, args):
+        self.args = args
+        self.rng = random.Random(args.seed)
+        self.rec = Recorder(args.slow_ms)
+        self.tmp = Path(tempfile.mkdtemp(prefix="slg-bench-"))
+
+    def build(self):
+        install_fake_astrbot()
+        from ..app import container as container_mod
+        from ..domain.clock import SimulatedClock
+        from .. import main as main_mod
+
+        self.clock = SimulatedClock()
+        self.provider = StubProvider(self.args.llm_ms / 1000.0, random.Random(self.args.seed + 1))
+        self.ctx = BenchContext(self.tmp, self.provider)
+        config = {
+            "map_renderer": "pillow",
+            "render_workers": self.args.render_workers,
+            "render_queue": self.args.render_queue,
+            "render_map_workers": self.args.render_map_workers,
+            "render_map_queue": self.args.render_map_queue,
+            "image_format": self.args.image_format,
+            "metrics_enabled": self.args.metrics,
+            "memprof_enabled": self.args.memprof,
+        }
+        # 插件自己调 build_container；这里把模拟时钟带进去
+        real = container_mod.build_container
+        main_mod.build_container = lambda ctx, cfg=None, llm=None: real(ctx, cfg, llm, clock=self.clock)
+        self.plugin = main_mod.HexPipelinePlugin(self.ctx, config)
+        c = self.plugin.container
+        self.container = c
+        # 插件自己的剖析器：@timed_command 按处理器名记峰值，和别的命令重叠的那次不记
+        self.mem = c.memprof
+        self.handler_labels: Dict[str, str] = {}  # 处理器名 -> 压测标签
+        self.footprint = {"after_build_kb": round(self.mem.traced()[0] / 1024, 1)}
+        self.rec.sql.attach(c.res_service._repo)
+        self.rec.sql.attach(c.state_service._repo)
+        self.char_names = list(c.catalog.names())
+
+    def _resolve(self, text: str):
+        parts = text.split()
+        path, args = None, []
+        for n in range(len(parts), 0, -1):
+            if tuple(parts[:n]) in COMMANDS:
+                path, args = tuple(parts[:n]), parts[n:]
+                break
+        if path is None:
+            raise KeyError(f"未注册的命令：{text}")
+        fn = getattr(self.plugin, COMMANDS[path])
+        params = list(inspect.signature(fn).parameters.values())[1:]
+        call = []
+        for p, raw in zip(params, args):
+            call.append(int(raw) if p.annotation in (int, "int") else raw)
+        return fn, call
+
+    async def run_once(self, uid: str, text: str, label: str):
+        """单独跑一条命令：不计入延迟/SQL 条数统计，异常照常抛出（串行测内存和 tests/ 用）"""
+        fn, call = self._resolve(text)
+        self.handler_labels[fn.__name__] = label
+        async for _ in fn(BenchEvent(uid, f"u{uid}", text), *call):
+            pass
+
+    async def run_cmd(self, uid: str, text: str, label: str):
+        fn, call = self._resolve(text)
+        self.handler_labels[fn.__name__] = label
+        budget = QUERY_BUDGETS.get(label) if self.args.budgets else None
+        guard = (
+            assert_max_queries(self.rec.sql, budget, label)
+            if budget is not None
+            else self.rec.sql.scope(label)
+        )
+        t0 = time.perf_counter()
+        try:
+            with guard as sc:
+                try:
+                    async for _ in fn(BenchEvent(uid, f"u{uid}", text), *call):
+                        pass
+                except Exception as e:
+                    self.rec.errors[label] += 1
+                    self.rec.first_error.setdefault(label, f"{type(e).__name__}: {e}")
+                finally:
+                    dt = time.perf_counter() - t0
+        except QueryBudgetExceeded as e:
+            self.rec.over_budget[label] += 1
+            self.rec.first_over.setdefault(label, str(e))
+        self.rec.lat[label].append(dt)
+        self.rec.queries[label].append(sc.count)
+        self.clock.advance(seconds=self.args.tick)
+
+    def mix(self, uid: str, uids: List[str]) -> List[Tuple[str, int, Callable[[], str]]]:
+        r = self.rng
+        return [
+            ("资源", 20, lambda: "slg 资源"),
+            ("一键", 12, lambda: "slg 一键"),
+            ("升级", 14, lambda: f"slg 升级 {r.choice(['农田', '钱庄', '采石场', '军营'])}"),
+            ("抽卡", 10, lambda: f"slg 抽卡 {r.choice([1, 1, 1, 10])}"),
+            ("队伍", 8, lambda: "slg 队伍"),
+            ("上阵", 6, lambda: f"slg 上阵 {r.choice(self.char_names)} 1"),
+            ("补兵", 6, lambda: "slg 补兵 1"),
+            ("规划", 5, lambda: "slg 规划"),
+            ("提醒", 3, lambda: "slg 提醒"),
+            ("基地", 3, lambda: "slg 基地"),
+            ("同盟列表", 3, lambda: "slg 同盟 列表"),
+            ("攻城状态", 2, lambda: "slg 同盟 攻城状态"),
+            ("进军", self.args.march_weight, lambda: f"slg 进军 {r.choice(uids)}"),
+            ("地图", self.args.map_weight, lambda: "slg_map"),
+        ]
+
+    @staticmethod
+    def setup_steps(uids: List[str]) -> List[Tuple[str, str, str]]:
+        """建号与入盟：[(uid, 命令, 标签)]，每 10 人一个同盟"""
+        steps = []
+        for i, uid in enumerate(uids):
+            steps.append((uid, "slg 加入", "加入"))
+            if i % 10 == 0:
+                steps.append((uid, f"slg 同盟 创建 盟{i}", "同盟创建"))
+            else:
+                steps.append((uid, f"slg 同盟 加入 盟{i - i % 10}", "同盟加入"))
+        return steps
+
+    async def setup_users(self, uids: List[str]):
+        for uid, text, label in self.setup_steps(uids):
+            await self.run_cmd(uid, text, label)
+
+    async def user_loop(self, uid: str, uids: List[str], n_ops: int):
+        items = self.mix(uid, uids)
+        weights = [w for _, w, _ in items]
+        think = self.args.think_ms / 1000.0
+        for _ in range(n_ops):
+            label, _, make = self.rng.choices(items, weights)[0]
+            await self.run_cmd(uid, make(), label)
+            await asyncio.sleep(think)  # think=0 也让出一次事件循环，模拟并发交错
+
+    async def run(self) -> Dict:
+        self.build()
+        await self.plugin.initialize()
+        a = self.args
+        uids = [str(10000 + i) for i in range(a.users)]
+        t_setup = time.perf_counter()
+        await self.setup_users(uids)
+        t_setup = time.perf_counter() - t_setup
+        self.rec.clear()
+        self.mem.reset()
+        if self.args.warmup:
+            # 预热：渲染进程池、目录缓存等一次性开销不计入
+            await asyncio.gather(*(self.user_loop(u, uids, a.warmup) for u in uids[: min(4, len(uids))]))
+            self.rec.clear()
+            self.container.metrics.reset()
+            self.mem.reset()
+
+        per_user = max(1, a.ops // max(1, a.users))
+        t0 = time.perf_counter()
+        await asyncio.gather(*(self.user_loop(u, uids, per_user) for u in uids))
+        wall = time.perf_counter() - t0
+        if a.memprof:
+            self.measure_footprint()
+            await self.measure_serial(uids)
+        await self.plugin.terminate()
+        return self.report(wall, t_setup)
+
+    async def measure_serial(self, uids: List[str]):
+        """
+        逐条串行跑一遍命令组合（每种 --mem-rounds 次），量每条命令独占时的堆峰值并对照预算。
+        并发压测里和别的命令重叠的那些次不记，剩下的样本偏向轻量命令，只能当参考。
+        """
+        self.mem.reset()
+        errors: Dict[str, str] = {}
+        uid = uids[0]
+        for _ in range(self.args.mem_rounds):
+            for label, _w, make in self.mix(uid, uids):
+                if label == "地图":
+                    # 量缓存未命中时接住整张图的峰值，而不是命中缓存的几 KB
+                    self.plugin.container.map_cache.invalidate()
+                try:
+                    await self.run_once(uid, make(), label)
+                except Exception as e:
+                    errors.setdefault(label, f"{type(e).__name__}: {e}")
+                self.clock.advance(seconds=self.args.tick)
+        fp = self.footprint
+        fp["serial"] = self._mem_by_label()
+        fp["serial_errors"] = errors
+        b = MEMORY_BUDGETS_KB["command_peak"]
+        for label, st in fp["serial"].items():
+            limit = b.get(label, b["*"])
+            if st["peak_kb_max"] > limit:
+                fp["over_budget"].append(f"命令 {label} 峰值 {st['peak_kb_max']}KB > 预算 {limit}KB")
+
+    def _mem_by_label(self) -> Dict:
+        return {self.handler_labels.get(k, k): v for k, v in self.mem.stats().items()}
+
+    def measure_footprint(self):
+        """压测结束时的常驻占用、渲染峰值，并对照 MEMORY_BUDGETS_KB；命令峰值另见 measure_serial"""
+        cur, peak = self.mem.traced()
+        fp = self.footprint
+        fp["resident_kb"] = round(cur / 1024, 1)
+        fp["traced_peak_kb"] = round(peak / 1024, 1)
+        fp["rss_peak_kb"] = rss_peak_kb()
+        fp["worker_rss_kb"] = self.container.render_farm.stats().get("worker_rss_kb")
+        fp["commands"] = self._mem_by_label()
+        fp["renders"] = {
+            k: {"p50_kb": v["mem_peak_kb_p50"], "max_kb": v["mem_peak_kb_max"]}
+            for k, v in self.container.render_farm.stats().items()
+            if isinstance(v, dict) and "mem_peak_kb_max" in v
+        }
+        fp["top"] = self.mem.top(10)
+        over = []
+        b = MEMORY_BUDGETS_KB
+        if fp["resident_kb"] > b["resident"]:
+            over.append(f"常驻 {fp['resident_kb']}KB > 预算 {b['resident']}KB")
+        for kind, st in fp["renders"].items():
+            limit = b["render_peak"].get(kind, b["render_peak"]["*"])
+            if st["max_kb"] > limit:
+                over.append(f"渲染 {kind} 峰值 {st['max_kb']}KB > 预算 {limit}KB")
+        fp["over_budget"] = over
+
+    def report(self, wall: float, setup_s: float) -> Dict:
+        rec = self.rec
+        total = sum(len(v) for v in rec.lat.values())
+        cmds = {}
+        for label in sorted(rec.lat, key=lambda k: -len(rec.lat[k])):
+            lat, qs = rec.lat[label], rec.queries[label]
+            cmds[label] = {
+                "n": len(lat),
+                "p50_ms": round(_pct(lat, 0.50) * 1000, 3),
+                "p95_ms": round(_pct(lat, 0.95) * 1000, 3),
+                "p99_ms": round(_pct(lat, 0.99) * 1000, 3),
+                "max_ms": round(max(lat) * 1000, 3),
+                "queries_mean": round(sum(qs) / len(qs), 2),
+                "queries_max": max(qs),
+                "errors": rec.errors.get(label, 0),
+                "sql_ms_mean": rec.sql.stats().get(label, {}).get("sql_ms_mean", 0.0),
+                "query_budget": QUERY_BUDGETS.get(label),
+                "over_budget": rec.over_budget.get(label, 0),
+            }
+        a = self.args
+        return {
+            "config": {
+                "users": a.users,
+                "ops": a.ops,
+                "seed": a.seed,
+                "tick_s": a.tick,
+                "llm_ms": a.llm_ms,
+                "render_workers": a.render_workers,
+                "image_format": a.image_format,
+            },
+            "env": {"python": platform.python_version(), "platform": platform.platform()},
+            "setup_s": round(setup_s, 3),
+            "wall_s": round(wall, 3),
+            "ops": total,
+            "ops_per_s": round(total / wall, 1) if wall else 0.0,
+            "llm_calls": self.provider.calls,
+            "sim_hours": round(total * a.tick / 3600, 1),
+            "commands": cmds,
+            "first_errors": dict(rec.first_error),
+            "budget_failures": dict(rec.first_over),
+            "slow_queries": rec.sql.slow[:20],
+            "metrics": self.container.metrics.snapshot() if a.metrics else None,
+            "memory": self.footprint if a.memprof else None,
+            "render": self.container.render_farm.stats(),
+        }
+
+    def cleanup(self):
+        if not self.args.keep:
+            shutil.rmtree(self.tmp, ignore_errors=True)
+
+
+def print_report(res: Dict):
+    print(
+        f"{res['config']['users']} 用户，{res['ops']} 条命令，{res['wall_s']}s，"
+        f"{res['ops_per_s']} 条/秒（游戏内 {res['sim_hours']} 小时，LLM 调用 {res['llm_calls']} 次）"
+    )
+    print(
+        f"{'命令':<10}{'次数':>7}{'p50ms':>9}{'p95ms':>9}{'p99ms':>9}{'maxms':>9}"
+        f"{'SQL均':>8}{'SQL峰':>7}{'预算':>6}{'错误':>6}"
+    )
+    for label, s in res["commands"].items():
+        budget = "-" if s["query_budget"] is None else s["query_budget"]
+        print(
+            f"{label:<10}{s['n']:>7}{s['p50_ms']:>9}{s['p95_ms']:>9}{s['p99_ms']:>9}"
+            f"{s['max_ms']:>9}{s['queries_mean']:>8}{s['queries_max']:>7}{budget:>6}{s['errors']:>6}"
+        )
+    for label, msg in res["first_errors"].items():
+        print(f"  [{label}] {msg}")
+    for q in res["slow_queries"][:5]:
+        print(f"慢查询 {q['ms']}ms [{q['label']}] {q['sql']}" + "".join(f"\n    {p}" for p in q["plan"]))
+    for label, msg in res["budget_failures"].items():
+        print(f"超出 SQL 预算 {msg}")
+    for kind, st in res["render"].items():
+        if isinstance(st, dict):
+            print(
+                f"渲染 {kind:<4} n={st['n']} p50={st['total_p50']}ms p95={st['total_p95']}ms"
+                f"（渲染 p95 {st['render_p95']}ms），排队峰值 {st['peak']}，拒绝 {st['rejected']}，失败 {st['failed']}"
+            )
+    mem = res.get("memory")
+    if mem:
+        print(
+            f"内存：建容器后 {mem['after_build_kb']}KB，压测后常驻 {mem['resident_kb']}KB，"
+            f"堆峰值 {mem['traced_peak_kb']}KB，RSS 峰值 {mem['rss_peak_kb']}KB"
+            + (f"，渲染进程 RSS {mem['worker_rss_kb']}KB" if mem["worker_rss_kb"] else "")
+        )
+        print("  串行单条命令峰值（并发时只记没和别的命令重叠的那些次，见 JSON 的 memory.commands）：")
+        for label, st in sorted(mem["serial"].items(), key=lambda kv: -kv[1]["peak_kb_max"])[:8]:
+            print(f"  {label:<10} 峰值 p50 {st['peak_kb_p50']}KB / max {st['peak_kb_max']}KB")
+        for label, msg in mem["serial_errors"].items():
+            print(f"  [{label}] 串行测量出错 {msg}")
+        for kind, st in mem["renders"].items():
+            print(f"  渲染 {kind:<6} 峰值 p50 {st['p50_kb']}KB / max {st['max_kb']}KB")
+        for r in mem["top"][:5]:
+            print(f"  {r['kb']:>9}KB  {r['where']}  {r['code']}")
+        for msg in mem["over_budget"]:
+            print(f"超出内存预算 {msg}")
+    for kind, rows in (res.get("metrics") or {}).items():
+        if kind == "command":
+            continue
+        print(f"[{kind}] 按总耗时前 5：")
+        for name, s in sorted(rows.items(), key=lambda kv: -kv[1]["total_s"])[:5]:
+            print(f"  {s['total_s']:>8.3f}s  n={s['n']:<6} p95={s['p95_ms']}ms  {name}")
+
+
+def parse_args(argv=None):
+    ap = argparse.ArgumentParser(description="SLG 插件端到端命令压测")
+    ap.add_argument("--users", type=int, default=20, help="并发虚拟用户数")
+    ap.add_argument("--ops", type=int, default=2000, help="总命令数（平均分给各用户）")
+    ap.add_argument("--seed", type=int, default=0)
+    ap.add_argument("--tick", type=int, default=30, help="每条命令推进的游戏时间（秒）")
+    ap.add_argument("--think-ms", type=float, default=0.0, help="用户两条命令之间的间隔")
+    ap.add_argument("--llm-ms", type=float, default=0.0, help="LLM 桩的模拟延迟")
+    ap.add_argument("--warmup", type=int, default=5, help="正式计时前每个预热用户跑几条")
+    ap.add_argument("--mem-rounds", type=int, default=5, help="--memprof 时串行测命令峰值的轮数")
+    ap.add_argument("--render-workers", type=int, default=2)
+    ap.add_argument("--render-queue", type=int, default=8)
+    ap.add_argument("--render-map-workers", type=int, default=1)
+    ap.add_argument("--render-map-queue", type=int, default=4)
+    ap.add_argument("--image-format", default="png")
+    ap.add_argument("--march-weight", type=int, default=2)
+    ap.add_argument("--map-weight", type=int, default=1)
+    ap.add_argument("--metrics", action="store_true", help="开启插件计时统计，并把服务/SQL/LLM 耗时写进结果")
+    ap.add_argument("--slow-ms", type=float, default=50.0, help="慢查询阈值（毫秒），超过的连同 EXPLAIN QUERY PLAN 记入结果")
+    ap.add_argument("--no-budgets", dest="budgets", action="store_false", help="不检查每条命令的 SQL 条数预算")
+    ap.add_argument("--memprof", action="store_true", help="开启 tracemalloc，统计常驻/各命令/渲染峰值并对照内存预算")
+    ap.add_argument("--json", type=Path, default=None, help="结果写成 JSON")
+    ap.add_argument("--keep", action="store_true", help="保留临时数据目录")
+    return ap.parse_args(argv)
+
+
+def main(argv=None) -> int:
+    args = parse_args(argv)
+    bench = Bench(args)
+    try:
+        res = asyncio.run(bench.run())
+    finally:
+        bench.cleanup()
+    print_report(res)
+    if args.json:
+        args.json.write_text(json.dumps(res, ensure_ascii=False, indent=2), encoding="utf-8")
+    mem_over = (res.get("memory") or {}).get("over_budget")
+    return 1 if res["budget_failures"] or mem_over else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
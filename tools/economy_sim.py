@@ -0,0 +1,343 @@
+# tools/economy_sim.py
+"""
+经济数值模拟：成千上万个虚拟玩家按不同策略逐分钟跑 产出→升级建筑→抽卡→升级角色，
+统计满级用时与资源曲线，用来核对 constants.py 里“~2.3 天”之类的调参目标。
+
+    python -m astrbot_plugin_slg.tools.economy_sim --players 10000 --days 7
+    python -m astrbot_plugin_slg.tools.economy_sim --json out.json --curves curves.csv
+
+全部玩家的状态都是 (N, 4) 的 NumPy 数组；时钟逐分钟推进，每分钟只对这一分钟上线的玩家
+做一次向量化的 懒结算→升级/抽卡，产出按闭式 min(上限, 余额 + 产出×分钟) 补上（与 settle 相同）。
+规则直接取自 domain 里的成本表/函数，改了常数重新跑即可。需要 numpy（插件本身不依赖）。
+"""
+from __future__ import annotations
+import argparse
+import json
+import sys
+import time
+from dataclasses import dataclass
+from pathlib import Path
+from typing import Dict, List, Optional, Tuple
+
+try:
+    import numpy as np
+except ImportError:  # 只有这个工具用得到
+    np = None
+
+from ..domain.constants import (
+    BUILDING_TO_RESOURCE,
+    CAPACITY_PER_LEVEL,
+    CHAR_LEVEL_MAX,
+    CHAR_LEVEL_UP_COST_RANGE,
+    MAX_LEVEL,
+    PRODUCTION_PER_MIN,
+    UPGRADE_RESOURCE_COST,
+    UPGRADE_STONE_COST,
+)
+from ..domain.services_gacha import cost_for_draw_index
+from ..domain.services_team import _linear_cost_at_level
+
+BUILDINGS = ("farm", "bank", "quarry", "barracks")
+RESOURCES = tuple(BUILDING_TO_RESOURCE[b] for b in BUILDINGS)  # 列顺序：grain, gold, stone, troops
+_STONE = RESOURCES.index("stone")
+_NEVER = -1
+
+
+@dataclass(frozen=True)
+class Strategy:
+    """
+    bonus       建筑优先级加成：每次挑 (等级 - bonus) 最小的建筑升
+    gacha_gate  最低建筑等级达到它之后才抽卡；None 表示从不抽
+    gacha_first 上线时先抽卡/升角色再升建筑
+    char_level  有角色时是否把角色平均升级
+    """
+
+    name: str
+    bonus: Tuple[int, int, int, int] = (0, 0, 0, 0)
+    gacha_gate: Optional[int] = None
+    gacha_first: bool = False
+    char_level: bool = False
+
+
+STRATEGIES = (
+    Strategy("builder"),
+    Strategy("stone_first", bonus=(0, 0, 2, 0)),
+    Strategy("balanced", gacha_gate=5, char_level=True),
+    Strategy("collector", gacha_gate=1, gacha_first=True, char_level=True),
+)
+# 上线间隔（分钟）：挂机党 / 常看群 / 偶尔看 / 一天几次
+CHECKIN_MINUTES = (5, 30, 120, 480)
+
+
+def _tables(n_chars: int):
+    """规则表 → 数组：产出/上限 (4, L+1)，建筑成本 (4, L+2, 4)，抽卡成本 (n+2, 4)，角色升级成本 (CHAR_MAX+2, 4)"""
+    prod = np.array([PRODUCTION_PER_MIN[r] for r in RESOURCES], dtype=np.int64)
+    cap = np.array([CAPACITY_PER_LEVEL[r] for r in RESOURCES], dtype=np.int64)
+    big = np.iinfo(np.int64).max // 4  # 满级后“买不起”
+    bcost = np.full((4, MAX_LEVEL + 2, 4), big, dtype=np.int64)
+    for i, (b, r) in enumerate(zip(BUILDINGS, RESOURCES)):
+        for lv in range(2, MAX_LEVEL + 1):
+            c = np.zeros(4, dtype=np.int64)
+            c[_STONE] += UPGRADE_STONE_COST[b][lv]
+            c[i] += UPGRADE_RESOURCE_COST[r][lv]
+            bcost[i, lv] = c
+    dcost = np.array(
+        [[cost_for_draw_index(n)[r] for r in RESOURCES] for n in range(n_chars + 2)],
+        dtype=np.int64,
+    )
+    ccost = np.full((CHAR_LEVEL_MAX + 2, 4), big, dtype=np.int64)
+    for lv in range(2, CHAR_LEVEL_MAX + 1):
+        ccost[lv] = [_linear_cost_at_level(lv, *CHAR_LEVEL_UP_COST_RANGE[r]) for r in RESOURCES]
+    return prod, cap, bcost, dcost, ccost
+
+
+def _default_n_chars() -> int:
+    from ..infra.character_provider import CharacterProvider
+
+    path = Path(__file__).resolve().parent.parent / "characters" / "character.json"
+    try:
+        return len(CharacterProvider(path).load_rows())
+    except Exception:
+        return 9
+
+
+def simulate(
+    players: int = 10000,
+    days: float = 7.0,
+    seed: int = 0,
+    n_chars: Optional[int] = None,
+    strategies=STRATEGIES,
+    checkins=CHECKIN_MINUTES,
+    curve_every: int = 60,
+    tick: int = 5,
+) -> Dict:
+    """
+    跑一遍；返回按策略汇总的结果（满级用时、各级里程碑、曲线）。
+    上线时刻对齐到 tick 分钟的网格上（各上线间隔须是它的倍数），这样每个 tick 一批处理几千人，
+    NumPy 的单次调用开销才摊得开；产出靠懒结算按分钟精确补齐，不受 tick 影响。
+    """
+    n_chars = _default_n_chars() if n_chars is None else n_chars
+    if any(c % tick for c in checkins):
+        raise ValueError(f"上线间隔 {checkins} 须都是 tick={tick} 的倍数")
+    rng = np.random.default_rng(seed)
+    prod_t, cap_t, bcost, dcost, ccost = _tables(n_chars)
+    N, T = players, int(days * 24 * 60)
+    rows = np.arange(N)
+    cols = np.arange(4)
+
+    # 玩家画像：策略 + 上线间隔 + 相位
+    strat = rng.integers(0, len(strategies), N)
+    interval = np.asarray(checkins, dtype=np.int64)[rng.integers(0, len(checkins), N)]
+    phase = rng.integers(0, interval // tick) * tick
+    bonus = np.array([s.bonus for s in strategies], dtype=np.int64)[strat]
+    gate = np.array(
+        [MAX_LEVEL + 1 if s.gacha_gate is None else s.gacha_gate for s in strategies]
+    )[strat]
+    gacha_first = np.array([s.gacha_first for s in strategies])[strat]
+    char_level = np.array([s.char_level for s in strategies])[strat]
+
+    # 状态（与新玩家注册时一致：四建筑 1 级、余额 0）
+    lv = np.ones((N, 4), dtype=np.int64)
+    bal = np.zeros((N, 4), dtype=np.int64)
+    draws = np.zeros(N, dtype=np.int64)
+    char_ups = np.zeros(N, dtype=np.int64)  # 角色总共升了几级（按平均升级）
+    prod = prod_t[cols, lv]
+    cap = cap_t[cols, lv]
+    reach = np.full((N, MAX_LEVEL + 1), _NEVER, dtype=np.int64)  # 最低建筑等级首次 ≥L 的分钟
+    reach[:, 1] = 0
+    spent = np.zeros((N, 4), dtype=np.int64)
+    curves: List[Tuple[int, np.ndarray, np.ndarray]] = []
+
+    # 以下三个动作都返回这次成功执行的玩家下标
+    def build(idx):
+        li = lv[idx]
+        key = li - bonus[idx]
+        key[li >= MAX_LEVEL] = 1 << 20
+        b = np.argmin(key, axis=1)
+        nl = li[np.arange(len(idx)), b] + 1
+        cost = bcost[b, nl]
+        ok = (bal[idx] >= cost).all(axis=1)
+        i, b, nl, cost = idx[ok], b[ok], nl[ok], cost[ok]
+        bal[i] -= cost
+        spent[i] += cost
+        lv[i, b] = nl
+        prod[i, b] = prod_t[b, nl]
+        cap[i, b] = cap_t[b, nl]
+        return i
+
+    def gacha(idx):
+        want = (lv[idx].min(axis=1) >= gate[idx]) & (draws[idx] < n_chars)
+        idx = idx[want]
+        cost = dcost[draws[idx] + 1]
+        ok = (bal[idx] >= cost).all(axis=1)
+        i, cost = idx[ok], cost[ok]
+        bal[i] -= cost
+        spent[i] += cost
+        draws[i] += 1  # 池子里只剩没抽到的角色，每抽必出新角色
+        return i
+
+    def train(idx):
+        owned = draws[idx]
+        want = char_level[idx] & (owned > 0) & (char_ups[idx] < owned * (CHAR_LEVEL_MAX - 1))
+        idx, owned = idx[want], owned[want]
+        target = 2 + char_ups[idx] // owned
+        cost = ccost[target]
+        ok = (bal[idx] >= cost).all(axis=1)
+        i, cost = idx[ok], cost[ok]
+        bal[i] -= cost
+        spent[i] += cost
+        char_ups[i] += 1
+        return i
+
+    def settle(idx, minute):
+        # 与 ResourceService.settle 一致：整分钟线性累加并封顶，已超上限的不动
+        dt = (minute - last[idx])[:, None]
+        b = bal[idx]
+        bal[idx] = np.maximum(b, np.minimum(b + prod[idx] * dt, cap[idx]))
+        last[idx] = minute
+
+    # 按 (上线间隔, 相位) 分桶，每分钟直接取出这一分钟上线的玩家
+    buckets = {
+        int(c): {r: rows[(interval == c) & (phase == r)] for r in range(0, int(c), tick)}
+        for c in checkins
+    }
+    last = np.zeros(N, dtype=np.int64)
+    finished = np.zeros(N, dtype=bool)
+
+    t0 = time.perf_counter()
+    for minute in range(tick, T + 1, tick):
+        idx = np.concatenate([b[minute % c] for c, b in buckets.items()])
+        idx = idx[~finished[idx]]
+        if len(idx):
+            settle(idx, minute)
+            before = lv[idx].min(axis=1)
+            act = idx
+            for _ in range(4):  # 一次上线最多连做几轮；下一轮只看上一轮有动作的人
+                first = act[gacha_first[act]]
+                later = act[~gacha_first[act]]
+                done = [gacha(first), train(first), build(act), gacha(later), train(later)]
+                act = np.unique(np.concatenate(done))
+                if not len(act):
+                    break
+            m = lv[idx].min(axis=1)
+            up = m > before
+            for L in range(2, MAX_LEVEL + 1):
+                new = idx[up & (m >= L) & (before < L)]
+                reach[new, L] = minute
+            # 建筑满级、角色抽完且练满的玩家之后什么都不会做，不再参与计算（曲线采样时照常结算）
+            finished[idx] = (
+                (m >= MAX_LEVEL)
+                & ((draws[idx] >= n_chars) | (gate[idx] > MAX_LEVEL))
+                & (~char_level[idx] | (char_ups[idx] >= draws[idx] * (CHAR_LEVEL_MAX - 1)))
+            )
+        if minute % curve_every < tick:
+            settle(rows, minute)
+            curves.append(
+                (
+                    minute,
+                    np.stack([lv[strat == k].mean(axis=0) for k in range(len(strategies))]),
+                    np.stack([bal[strat == k].mean(axis=0) for k in range(len(strategies))]),
+                )
+            )
+    elapsed = time.perf_counter() - t0
+
+    def pct(x, q):
+        return None if len(x) == 0 else round(float(np.percentile(x, q)) / 60, 2)
+
+    summary = {}
+    for k, s in enumerate(strategies):
+        m = strat == k
+        tmax = reach[m, MAX_LEVEL]
+        done = tmax[tmax != _NEVER]
+        summary[s.name] = {
+            "players": int(m.sum()),
+            "reached_max": round(float(len(done)) / max(1, int(m.sum())), 4),
+            "hours_to_max_p10": pct(done, 10),
+            "hours_to_max_p50": pct(done, 50),
+            "hours_to_max_p90": pct(done, 90),
+            "hours_to_level_p50": {
+                L: pct(reach[m, L][reach[m, L] != _NEVER], 50) for L in range(2, MAX_LEVEL + 1)
+            },
+            "by_checkin_p50": {
+                int(c): pct(tmax[(interval[m] == c) & (tmax != _NEVER)], 50) for c in checkins
+            },
+            "mean_draws": round(float(draws[m].mean()), 2),
+            "mean_char_ups": round(float(char_ups[m].mean()), 2),
+            "mean_spent": dict(zip(RESOURCES, spent[m].mean(axis=0).round(1).tolist())),
+        }
+    return {
+        "players": N,
+        "minutes": T,
+        "n_chars": n_chars,
+        "seed": seed,
+        "elapsed_s": round(elapsed, 3),
+        "strategies": summary,
+        "curves": [
+            {
+                "minute": minute,
+                "levels": {s.name: lvs[k].round(3).tolist() for k, s in enumerate(strategies)},
+                "balance": {s.name: bs[k].round(1).tolist() for k, s in enumerate(strategies)},
+            }
+            for minute, lvs, bs in curves
+        ],
+    }
+
+
+def _write_curves(path: Path, result: Dict):
+    head = ["minute", "strategy"] + [f"lv_{b}" for b in BUILDINGS] + [f"bal_{r}" for r in RESOURCES]
+    lines = [",".join(head)]
+    for row in result["curves"]:
+        for name, lvs in row["levels"].items():
+            vals = lvs + row["balance"][name]
+            lines.append(",".join([str(row["minute"]), name] + [str(v) for v in vals]))
+    path.write_text("\n".join(lines) + "\n", encoding="utf-8")
+
+
+def _print_summary(result: Dict):
+    print(
+        f"{result['players']} 名玩家 × {result['minutes'] / 1440:.1f} 天，"
+        f"角色池 {result['n_chars']}，耗时 {result['elapsed_s']}s"
+    )
+    print(f"{'策略':<12}{'人数':>7}{'满级率':>8}{'p10(h)':>9}{'p50(h)':>9}{'p90(h)':>9}{'抽卡':>7}{'角色升级':>9}")
+    for name, s in result["strategies"].items():
+        cells = [s["hours_to_max_p10"], s["hours_to_max_p50"], s["hours_to_max_p90"]]
+        cells = [f"{'-' if v is None else v:>9}" for v in cells]
+        print(
+            f"{name:<12}{s['players']:>7}{s['reached_max']:>8.1%}{''.join(cells)}"
+            f"{s['mean_draws']:>7}{s['mean_char_ups']:>9}"
+        )
+    print("各策略最低建筑等级达到 L 的中位用时（小时）：")
+    for name, s in result["strategies"].items():
+        ms = " ".join(f"L{L}:{'-' if v is None else v}" for L, v in s["hours_to_level_p50"].items())
+        print(f"  {name:<12}{ms}")
+    print("按上线间隔的满级中位用时（小时）：")
+    for name, s in result["strategies"].items():
+        ms = " ".join(f"{c}min:{'-' if v is None else v}" for c, v in s["by_checkin_p50"].items())
+        print(f"  {name:<12}{ms}")
+
+
+def main(argv=None) -> int:
+    ap = argparse.ArgumentParser(description="SLG 经济数值模拟")
+    ap.add_argument("--players", type=int, default=10000)
+    ap.add_argument("--days", type=float, default=7.0)
+    ap.add_argument("--seed", type=int, default=0)
+    ap.add_argument("--chars", type=int, default=None, help="角色池大小，默认读 characters/character.json")
+    ap.add_argument("--curve-every", type=int, default=60, help="曲线采样间隔（分钟）")
+    ap.add_argument("--tick", type=int, default=5, help="上线时刻网格（分钟），上线间隔须是它的倍数")
+    ap.add_argument("--json", type=Path, default=None, help="完整结果（含曲线）写到该文件")
+    ap.add_argument("--curves", type=Path, default=None, help="曲线写成 CSV")
+    args = ap.parse_args(argv)
+    if np is None:
+        print("需要 numpy：pip install numpy", file=sys.stderr)
+        return 1
+    result = simulate(args.players, args.days, args.seed, args.chars, curve_every=args.curve_every, tick=args.tick)
+    _print_summary(result)
+    if args.json:
+        args.json.write_text(json.dumps(result, ensure_ascii=False, indent=2), encoding="utf-8")
+    if args.curves:
+        _write_curves(args.curves, result)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,272 @@
+# tools/gen_world.py
+"""
+合成世界生成器：直接往 players.sqlite3 批量写入 N 个玩家（建筑等级、余额、角色、队伍、基地、
+同盟、攻城），用于规模测试。表结构与角色下标沿用 SQLitePlayerRepository，写入全部走 executemany，
+每张表一个事务；同样的 --seed 和 --now 生成的数据完全一致。
+
+    python -m astrbot_plugin_slg.tools.gen_world --out /tmp/world/players.sqlite3 --players 100000
+    # 再拿去压测：把 players.sqlite3 放到 data/plugin_data/astrbot_plugin_slg/ 下即可
+"""
+from __future__ import annotations
+import argparse
+import json
+import math
+import random
+import sys
+import time
+from pathlib import Path
+from typing import Dict, List, Optional, Sequence
+
+from ..domain.clock import SystemClock
+from ..domain.constants import (
+    ALLIANCE_MAX_MEMBERS,
+    CAPACITY_PER_LEVEL,
+    CHAR_LEVEL_MAX,
+    DEFAULT_RARITY,
+    MAX_LEVEL,
+    PITY_THRESHOLD,
+    SIEGE_EDGE_MINUTES,
+    TEAM_BASE_TROOPS,
+    TEAM_COUNT,
+    TEAM_SLOTS,
+    TROOPS_PER_LEVEL,
+)
+from ..domain.services_base import ALLOWED_PROVINCES
+from ..infra.character_provider import CharacterProvider
+from ..infra.map_json_provider import JsonMapProvider
+from ..infra.sqlite_player_repo import SQLitePlayerRepository
+
+_ROOT = Path(__file__).resolve().parent.parent
+DAY = 86400
+_RES_BY_BUILDING = (("farm_level", "grain"), ("bank_level", "gold"), ("quarry_level", "stone"), ("barracks_level", "troops"))
+
+
+def _chunks(rows: List[tuple], n: int = 50000):
+    for i in range(0, len(rows), n):
+        yield rows[i : i + n]
+
+
+class WorldGenerator:
+    """
+    分布（都是粗略的“像真的”，便于压出真实的数据形状）：
+      - 账号年龄 ~ 指数分布（均值 avg_days，封顶 60 天），建筑等级随年龄饱和增长并带抖动；
+      - 余额在 0..当前上限 之间，最后结算时刻在最近 3 天内；
+      - 拥有角色数随年龄增长，稀有度越高越少见；角色等级 1..CHAR_LEVEL_MAX；
+      - 队伍1 放上已拥有的前几个角色，兵力不超过容量；
+      - 约 alliance_rate 的玩家进同盟，规模 5..ALLIANCE_MAX_MEMBERS；部分同盟有待开战的攻城。
+    """
+
+    def __init__(
+        self,
+        out: Path,
+        players: int,
+        seed: int = 0,
+        now: Optional[int] = None,
+        start_id: int = 20000000,
+        avg_days: float = 6.0,
+        alliance_rate: float = 0.6,
+        siege_rate: float = 0.1,
+        notify_rate: float = 0.05,
+        notify_enabled: bool = False,
+    ):
+        self.out = Path(out)
+        self.players = players
+        self.rng = random.Random(seed)
+        self.now = int(now if now is not None else SystemClock().now())
+        self.start_id = start_id
+        self.avg_days = avg_days
+        self.alliance_rate = alliance_rate
+        self.siege_rate = siege_rate
+        self.notify_rate = notify_rate
+        self.notify_enabled = notify_enabled
+        self.counts: Dict[str, int] = {}
+
+    # ---- 静态数据 ----
+    def _load_refs(self):
+        rows = CharacterProvider(_ROOT / "characters" / "character.json").load_rows()
+        self.char_names = [r[0] for r in rows]
+        # 稀有度越高抽到的越少：按档位给拥有权重
+        tier_w = {"SSR": 1.0, "SR": 3.0, DEFAULT_RARITY: 6.0}
+        self.char_weights = [tier_w.get(r[3], 6.0) for r in rows]
+        g = JsonMapProvider(_ROOT / "map" / "three_kingdoms.json").load()
+        self.cities = [
+            (c.name, *g.positions.get(c.name, (0, 0)))
+            for c in g.cities.values()
+            if c.province in ALLOWED_PROVINCES
+        ] or [(c.name, *g.positions.get(c.name, (0, 0))) for c in g.cities.values()]
+        self.all_cities = list(g.cities)
+
+    def _sample_chars(self, k: int) -> List[str]:
+        # 不放回的加权抽样（Efraimidis–Spirakis）
+        r = self.rng
+        keyed = sorted(
+            ((r.random() ** (1.0 / w), n) for n, w in zip(self.char_names, self.char_weights)),
+            reverse=True,
+        )
+        return [n for _, n in keyed[:k]]
+
+    # ---- 生成 ----
+    def _player_rows(self, idx: Dict[str, int]):
+        r, now = self.rng, self.now
+        players, chars, teams, slots, subs = [], [], [], [], []
+        n_chars = len(self.char_names)
+        for i in range(self.players):
+            uid = str(self.start_id + i)
+            age = min(60.0, r.expovariate(1.0 / self.avg_days))
+            # 等级随年龄饱和增长：老号大多接近满级，新号集中在低级
+            base_lv = 1 + (MAX_LEVEL - 1) * (1 - math.exp(-age / 8.0))
+            levels = [max(1, min(MAX_LEVEL, int(round(base_lv + r.gauss(0, 1.0))))) for _ in range(4)]
+            bal = [r.randint(0, CAPACITY_PER_LEVEL[res][lv]) for (_, res), lv in zip(_RES_BY_BUILDING, levels)]
+            k = min(n_chars, int(age * 0.9 + r.random() * 3))
+            owned = self._sample_chars(k) if k else []
+            bits = 0
+            for n in owned:
+                bits |= 1 << idx[n]
+            draw_count = k + r.randint(0, k)
+            city, x, y = r.choice(self.cities)
+            created = now - int(age * DAY)
+            players.append(
+                (
+                    uid,
+                    f"玩家{uid[-6:]}",
+                    created,
+                    max(created, now - r.randint(0, 3 * DAY)),
+                    *bal,
+                    *levels,
+                    draw_count,
+                    r.randint(0, PITY_THRESHOLD - 1),
+                    SQLitePlayerRepository._bits_to_blob(bits) if bits else None,
+                    city,
+                    int(x),
+                    int(y),
+                    now - r.randint(1, 10) * DAY if r.random() < 0.3 else 0,
+                )
+            )
+            char_lv = {}
+            for n in owned:
+                char_lv[n] = max(1, min(CHAR_LEVEL_MAX, int(1 + r.random() * age / 3)))
+                chars.append((uid, n, char_lv[n]))
+            cap = TEAM_BASE_TROOPS
+            for s in range(1, TEAM_SLOTS + 1):
+                name = owned[s - 1] if s <= len(owned) else None
+                cap += char_lv[name] * TROOPS_PER_LEVEL if name else 0
+                slots.append((uid, 1, s, name))
+            teams.append((uid, 1, r.randint(0, cap)))
+            for t in range(2, TEAM_COUNT + 1):
+                teams.append((uid, t, 0))
+                slots.extend((uid, t, s, None) for s in range(1, TEAM_SLOTS + 1))
+            if r.random() < self.notify_rate:
+                # 会话是假的：默认写成关闭，免得插件在生成的库上给不存在的会话推送
+                subs.append((uid, f"gen:FriendMessage:{uid}", int(self.notify_enabled)))
+        return players, chars, teams, slots, subs
+
+    def _alliance_rows(self):
+        r, now = self.rng, self.now
+        uids = [str(self.start_id + i) for i in range(self.players)]
+        r.shuffle(uids)
+        members = uids[: int(len(uids) * self.alliance_rate)]
+        alliances, memb, sieges, parts = [], [], [], []
+        pos, aid = 0, 0
+        while pos < len(members):
+            size = r.randint(5, ALLIANCE_MAX_MEMBERS)
+            group = members[pos : pos + size]
+            pos += size
+            aid += 1
+            created = now - r.randint(0, 30 * DAY)
+            alliances.append((aid, f"盟{aid:06d}", group[0], created))
+            memb.append((aid, group[0], "leader", created))
+            memb.extend((aid, u, "member", created + r.randint(0, DAY)) for u in group[1:])
+            if r.random() < self.siege_rate:
+                sid = len(sieges) + 1
+                city = r.choice(self.all_cities)
+                start_at = now + r.randint(10 * 60, DAY)
+                sieges.append((sid, aid, city, 1, start_at, group[0], now - r.randint(0, 3600), "scheduled", None))
+                for u in r.sample(group, max(1, len(group) // 2)):
+                    src = r.choice(self.all_cities)
+                    hops = r.randint(0, 6)
+                    path = [src] + [r.choice(self.all_cities) for _ in range(max(0, hops - 1))] + ([city] if hops else [])
+                    eta = now + hops * SIEGE_EDGE_MINUTES * 60
+                    parts.append((sid, u, src, json.dumps(path, ensure_ascii=False), hops, eta, now))
+        return alliances, memb, sieges, parts
+
+    def run(self) -> Dict[str, float]:
+        t0 = time.perf_counter()
+        self.out.parent.mkdir(parents=True, exist_ok=True)
+        repo = SQLitePlayerRepository(self.out)
+        repo.init_schema()
+        conn = repo._conn
+        if conn.execute("SELECT 1 FROM players LIMIT 1").fetchone():
+            raise SystemExit(f"{self.out} 里已有玩家；请换一个 --out 或先删掉")
+        self._load_refs()
+        idx = repo.ensure_char_index(self.char_names)
+        players, chars, teams, slots, subs = self._player_rows(idx)
+        alliances, memb, sieges, parts = self._alliance_rows()
+        t_gen = time.perf_counter() - t0
+
+        # 生成期间不需要崩溃安全；写完恢复默认
+        conn.execute("PRAGMA synchronous=OFF")
+        inserts = [
+            ("players", "INSERT INTO players(user_id,nickname,created_at,last_tick,grain,gold,stone,troops,"
+             "farm_level,bank_level,quarry_level,barracks_level,draw_count,pity,owned_bits,"
+             "base_city,base_x,base_y,last_move_at) VALUES(?,?,?,?,?,?,?,?,?,?,?,?,?,?,?,?,?,?,?)", players),
+            ("player_chars", "INSERT INTO player_chars(user_id,name,level) VALUES(?,?,?)", chars),
+            ("teams", "INSERT INTO teams(user_id,team_no,soldiers) VALUES(?,?,?)", teams),
+            ("team_slots", "INSERT INTO team_slots(user_id,team_no,slot_idx,char_name) VALUES(?,?,?,?)", slots),
+            ("alliances", "INSERT INTO alliances(id,name,leader_user_id,created_at) VALUES(?,?,?,?)", alliances),
+            ("alliance_members", "INSERT INTO alliance_members(alliance_id,user_id,role,joined_at) VALUES(?,?,?,?)", memb),
+            ("sieges", "INSERT INTO sieges(id,alliance_id,city,city_level,start_at,created_by,created_at,state,result)"
+             " VALUES(?,?,?,?,?,?,?,?,?)", sieges),
+            ("siege_participants", "INSERT INTO siege_participants(siege_id,user_id,from_city,path_json,hops,eta,joined_at)"
+             " VALUES(?,?,?,?,?,?,?)", parts),
+            ("notify_subs", "INSERT INTO notify_subs(user_id,session,enabled) VALUES(?,?,?)", subs),
+        ]
+        t1 = time.perf_counter()
+        for table, sql, rows in inserts:
+            with conn:
+                for chunk in _chunks(rows):
+                    conn.executemany(sql, chunk)
+            self.counts[table] = len(rows)
+        conn.execute("PRAGMA synchronous=FULL")
+        t_write = time.perf_counter() - t1
+        conn.execute("ANALYZE")
+        conn.close()
+        return {"generate_s": round(t_gen, 3), "write_s": round(t_write, 3), "total_s": round(time.perf_counter() - t0, 3)}
+
+
+def main(argv: Optional[Sequence[str]] = None) -> int:
+    ap = argparse.ArgumentParser(description="批量生成 SLG 合成世界（players.sqlite3）")
+    ap.add_argument("--out", type=Path, required=True, help="输出的 players.sqlite3 路径（须为空库或不存在）")
+    ap.add_argument("--players", type=int, default=100000)
+    ap.add_argument("--seed", type=int, default=0)
+    ap.add_argument("--now", type=int, default=None, help="基准时刻（epoch 秒），默认当前时间；固定它才能逐字节复现")
+    ap.add_argument("--start-id", type=int, default=20000000, help="user_id 起始编号（纯数字，便于 /slg 进军）")
+    ap.add_argument("--avg-days", type=float, default=6.0, help="平均账号年龄（天）")
+    ap.add_argument("--alliance-rate", type=float, default=0.6)
+    ap.add_argument("--siege-rate", type=float, default=0.1, help="有待开战攻城的同盟比例")
+    ap.add_argument("--notify-rate", type=float, default=0.05, help="有满仓提醒订阅记录的玩家比例")
+    ap.add_argument(
+        "--notify-enabled",
+        action="store_true",
+        help="订阅写成开启（会话是假的，只用于通知调度的压测，别在接了真实平台的插件上用）",
+    )
+    args = ap.parse_args(argv)
+    gen = WorldGenerator(
+        args.out,
+        args.players,
+        seed=args.seed,
+        now=args.now,
+        start_id=args.start_id,
+        avg_days=args.avg_days,
+        alliance_rate=args.alliance_rate,
+        siege_rate=args.siege_rate,
+        notify_rate=args.notify_rate,
+        notify_enabled=args.notify_enabled,
+    )
+    t = gen.run()
+    print(f"已写入 {args.out}：" + "，".join(f"{k} {v}" for k, v in gen.counts.items()))
+    print(f"生成 {t['generate_s']}s，写库 {t['write_s']}s，共 {t['total_s']}s")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())